@@ -0,0 +1,289 @@
+"""
+Tokenizes the volcano records into train and validation token shards.
+
+Records stream through a generator pipeline: render and clean each record
+into one document (see app.corpus.text), drop near-duplicates (see
+app.corpus.dedup), tokenize with <|endoftext|> appended, and write shards.
+Rendering and tokenizing run in batches on a process pool, with a bounded
+number of batches in flight; results come back in input order and only the
+main process writes, so the same records and tokenizer give byte-identical
+shards whatever --workers is. A record goes to the validation split when a
+hash of its id falls below --val-fraction, so the split is stable as the
+dataset grows.
+
+Builds are incremental. Encoded documents are cached in <output>/cache/,
+one directory per tokenizer, under a hash of their cleaned text, so after a
+partial re-scrape only documents whose content changed are tokenized again
+(a new scraped_at alone changes nothing). manifest.json records the documents
+in every shard, and shards whose documents are unchanged are not rewritten.
+Deduplication compares all documents with each other, so it reruns in full
+when enabled; the dropped clusters are listed in dedup_report.json.
+
+    python -m app.corpus.build [--input app/dataset/volcanoes.jsonl] [--output data] [--dedup both] [--workers 4]
+"""
+import os
+import glob
+import json
+import time
+import zlib
+import shutil
+import hashlib
+import argparse
+from itertools import batched
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.corpus import dedup
+from app.corpus.text import RECORDS_FILE, document, iter_records
+from app.transformer.data import DATA_DIR, SHARD_SUFFIX, TOKEN_DTYPE, ShardWriter, shard_path
+from app.transformer.tokenizer import TOKENIZER_FILE, Tokenizer
+
+SHARD_TOKENS = 1 << 24
+VAL_FRACTION = 0.05
+RENDER_BATCH = 256
+ENCODE_BATCH = 256
+DEDUP_REPORT = "dedup_report.json"
+MANIFEST_FILE = "manifest.json"
+CACHE_DIR = "cache"
+
+
+def split_of(record_id, val_fraction=VAL_FRACTION):
+    return "val" if zlib.crc32(str(record_id).encode("utf-8")) / 2**32 < val_fraction else "train"
+
+
+def content_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def file_key(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+class TokenCache:
+    """Encoded documents by content key, one .npy file each."""
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key):
+        try:
+            tokens = np.load(self._path(key))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tokens
+
+    def put(self, key, tokens):
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, tokens)
+        os.replace(tmp, self._path(key))
+
+    def prune(self, keep):
+        """Deletes every cached document not in `keep`, and the caches of other tokenizers."""
+        for name in os.listdir(self.directory):
+            if name.removesuffix(".npy") not in keep:
+                os.remove(os.path.join(self.directory, name))
+        parent = os.path.dirname(self.directory)
+        for name in os.listdir(parent):
+            path = os.path.join(parent, name)
+            if path != self.directory and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class SplitWriter:
+    """
+    Writes one split as a numbered series of shards of about shard_tokens
+    tokens each. A shard's documents are buffered until it is full; if the
+    previous build's manifest lists the same documents for it and the file is
+    still there, it is left as it is.
+    """
+    def __init__(self, directory, split, shard_tokens=SHARD_TOKENS, previous=None):
+        self.directory = directory
+        self.split = split
+        self.shard_tokens = shard_tokens
+        self.previous = previous or {}
+        self.manifest = {}
+        self.shards = 0
+        self.written = 0
+        self.n_tokens = 0
+        self.n_docs = 0
+        self._keys, self._docs, self._tokens = [], [], 0
+
+    def add(self, key, ids):
+        self._keys.append(key)
+        self._docs.append(ids)
+        self._tokens += len(ids)
+        self.n_tokens += len(ids)
+        self.n_docs += 1
+        if self._tokens >= self.shard_tokens:
+            self._flush()
+
+    def _flush(self):
+        path = shard_path(self.directory, self.split, self.shards)
+        name = os.path.basename(path)
+        if self.previous.get(name) != self._keys or not os.path.exists(path):
+            with ShardWriter(path) as writer:
+                for ids in self._docs:
+                    writer.add(ids)
+            self.written += 1
+        self.manifest[name] = self._keys
+        self.shards += 1
+        self._keys, self._docs, self._tokens = [], [], 0
+
+    def close(self):
+        if self._docs:
+            self._flush()
+        # Shards numbered past this build's last one are left over from a larger corpus.
+        for path in glob.glob(os.path.join(self.directory, f"{self.split}-*{SHARD_SUFFIX}")):
+            if os.path.basename(path) not in self.manifest:
+                os.remove(path)
+
+
+_tokenizer = None
+
+
+def _init_worker(tokenizer_path):
+    global _tokenizer
+    _tokenizer = Tokenizer.load(tokenizer_path)
+
+
+def _render_batch(records):
+    docs = []
+    for record in records:
+        text = document(record)
+        docs.append((record["id"], content_key(text), text))
+    return docs
+
+
+def _encode_batch(texts):
+    return [np.array(ids, dtype=TOKEN_DTYPE) for ids in _tokenizer.encode_many(texts, eot=True)]
+
+
+def _ordered(pool, fn, args, window):
+    """fn(arg) for each arg, in order; on `pool` with at most `window` calls in flight, or inline without one."""
+    if pool is None:
+        yield from map(fn, args)
+        return
+    pending = deque()
+    for arg in args:
+        pending.append(pool.submit(fn, arg))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def render_stage(records, pool=None, window=1):
+    """(record id, content key, text) for each record."""
+    for docs in _ordered(pool, _render_batch, batched(records, RENDER_BATCH), window):
+        yield from docs
+
+
+def encode_stage(docs, cache, pool=None, window=1):
+    """(record id, content key, tokens) for each document; cached documents are not tokenized again."""
+    pending = deque()
+
+    def uncached_texts():
+        for batch in batched(docs, ENCODE_BATCH):
+            batch = [(record_id, key, text, cache.get(key)) for record_id, key, text in batch]
+            pending.append(batch)
+            yield [text for _, _, text, tokens in batch if tokens is None]
+
+    for encoded in _ordered(pool, _encode_batch, uncached_texts(), window):
+        encoded = iter(encoded)
+        for record_id, key, _, tokens in pending.popleft():
+            if tokens is None:
+                tokens = next(encoded)
+                cache.put(key, tokens)
+            yield record_id, key, tokens
+
+
+def _load_manifest(path, tokenizer_key):
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest["shards"] if manifest.get("tokenizer") == tokenizer_key else {}
+
+
+def build(input_path=RECORDS_FILE, output_dir=DATA_DIR, tokenizer_path=TOKENIZER_FILE,
+          shard_tokens=SHARD_TOKENS, val_fraction=VAL_FRACTION, dedup_level="both",
+          dedup_threshold=dedup.THRESHOLD, workers=None):
+    workers = workers or os.cpu_count() or 1
+    tokenizer_key = file_key(tokenizer_path)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    previous = _load_manifest(manifest_path, tokenizer_key)
+    cache = TokenCache(os.path.join(output_dir, CACHE_DIR, tokenizer_key))
+    writers = {split: SplitWriter(output_dir, split, shard_tokens, previous) for split in ("train", "val")}
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(tokenizer_path,))
+    else:
+        _init_worker(tokenizer_path)
+    window = 2 * workers
+    try:
+        docs = render_stage(iter_records(input_path), pool, window)
+        if dedup_level != "none":
+            # Every document is compared with every other one, so this stage holds them all.
+            kept, report = dedup.deduplicate([(record_id, text) for record_id, _, text in docs],
+                                             dedup_level, dedup_threshold, workers=workers)
+            dedup.save_report(report, os.path.join(output_dir, DEDUP_REPORT))
+            print(dedup.summary(report))
+            docs = ((record_id, content_key(text), text) for record_id, text in kept)
+        keys = set()
+        for record_id, key, tokens in encode_stage(docs, cache, pool, window):
+            writers[split_of(record_id, val_fraction)].add(key, tokens)
+            keys.add(key)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    for writer in writers.values():
+        writer.close()
+
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"tokenizer": tokenizer_key,
+                   "shards": {name: k for writer in writers.values() for name, k in writer.manifest.items()}}, f)
+    os.replace(tmp, manifest_path)
+    cache.prune(keys)
+    return writers, cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenize the volcano records into token shards.")
+    parser.add_argument("--input", default=RECORDS_FILE, help="JSONL records or a JSON array")
+    parser.add_argument("--output", default=DATA_DIR, help="shard directory")
+    parser.add_argument("--tokenizer", default=TOKENIZER_FILE, help="tokenizer file")
+    parser.add_argument("--shard-tokens", type=int, default=SHARD_TOKENS, help="tokens per shard")
+    parser.add_argument("--val-fraction", type=float, default=VAL_FRACTION)
+    parser.add_argument("--dedup", choices=dedup.LEVELS + ("none",), default="both",
+                        help="drop near-duplicate documents, paragraphs, both or neither")
+    parser.add_argument("--dedup-threshold", type=float, default=dedup.THRESHOLD,
+                        help="estimated Jaccard similarity at which texts count as duplicates")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: every CPU)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    writers, cache = build(args.input, args.output, args.tokenizer, args.shard_tokens, args.val_fraction,
+                           args.dedup, args.dedup_threshold, args.workers)
+    for split, writer in writers.items():
+        print(f"{split}: {writer.n_docs} documents, {writer.n_tokens} tokens in {writer.shards} shards "
+              f"({writer.written} rewritten)")
+    print(f"Tokenized {cache.misses} documents, {cache.hits} from the cache")
+    print(f"Built in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Near-duplicate detection for the training corpus with MinHash and LSH.
+
+A text is reduced to the set of its word n-gram hashes (shingles) and then to
+a MinHash signature: for each of num_perm hash functions, the minimum over the
+shingles. Two signatures agree in a position with probability equal to the
+Jaccard similarity of the shingle sets. Signatures are computed as one
+(shingles x num_perm) array operation per text, in a process pool.
+
+For candidates, the signature is cut into bands of rows; texts whose band
+hashes match in any band land in the same bucket. The band/row split is
+chosen so the chance of becoming a candidate jumps at the threshold.
+Candidates are kept when their estimated similarity reaches the threshold,
+and connected texts form a cluster. The first text of each cluster in corpus
+order is kept, the others are dropped and listed in the report.
+
+Documents are deduplicated whole; at paragraph level, every paragraph after a
+document's first (its title and fact sheet) is checked against all other
+paragraphs, which removes repeated boilerplate from documents that are
+otherwise different.
+
+    python -m app.corpus.dedup [--input app/dataset/volcanoes.jsonl] [--level both] [--threshold 0.8]
+"""
+import os
+import re
+import json
+import time
+import zlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.corpus.text import RECORDS_FILE, document, iter_records
+
+NUM_PERM = 128
+SHINGLE = 5
+THRESHOLD = 0.8
+LEVELS = ("document", "paragraph", "both")
+CHUNK = 256
+SEED = 1
+REPORT_FILE = os.path.join(os.path.dirname(__file__), '../../data/dedup_report.json')
+
+_SHINGLE_BASE = np.uint64(0x100000001B3)
+_BAND_BASE = np.uint64(0x9E3779B97F4A7C15)
+_EMPTY = np.iinfo(np.uint32).max
+
+
+def shingles(text, n=SHINGLE):
+    """Unique 64-bit hashes of the word n-grams of `text` (case-insensitive); texts under n words are one shingle."""
+    words = re.findall(r"\w+", text.casefold())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+    n = min(n, len(hashes))
+    count = len(hashes) - n + 1
+    combined = hashes[:count].copy()
+    for j in range(1, n):
+        combined *= _SHINGLE_BASE
+        combined += hashes[j:j + count]
+    return np.unique(combined)
+
+
+class MinHasher:
+    """MinHash over multiply-shift hash functions ((a * x + b) mod 2^64) >> 32, with fixed seeded a and b."""
+    def __init__(self, num_perm=NUM_PERM, shingle=SHINGLE, seed=SEED):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.seed = seed
+        self.a = rng.integers(0, 2**63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        """uint32 signature of `text`; all _EMPTY for a text without words."""
+        values = shingles(text, self.shingle)
+        signature = np.full(self.num_perm, _EMPTY, dtype=np.uint32)
+        # Blocks of shingles keep the (shingles x num_perm) intermediate small for long texts.
+        for start in range(0, len(values), 4096):
+            block = values[start:start + 4096, None] * self.a + self.b
+            np.minimum(signature, (block >> np.uint64(32)).min(axis=0).astype(np.uint32), out=signature)
+        return signature
+
+    def signatures(self, texts):
+        out = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for i, text in enumerate(texts):
+            out[i] = self.signature(text)
+        return out
+
+
+_hasher = None
+
+
+def _init_hasher(num_perm, shingle, seed):
+    global _hasher
+    _hasher = MinHasher(num_perm, shingle, seed)
+
+
+def _signature_task(texts):
+    return _hasher.signatures(texts)
+
+
+def signatures(texts, hasher, workers=None):
+    """Signatures of `texts` in order, split into chunks over `workers` processes (default: every CPU)."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(texts) <= CHUNK:
+        return hasher.signatures(texts)
+    chunks = [texts[i:i + CHUNK] for i in range(0, len(texts), CHUNK)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_hasher,
+                             initargs=(hasher.num_perm, hasher.shingle, hasher.seed)) as pool:
+        return np.concatenate(list(pool.map(_signature_task, chunks)))
+
+
+def lsh_params(threshold, num_perm=NUM_PERM):
+    """
+    (bands, rows) with bands * rows <= num_perm that minimise the false
+    positive plus false negative area of the candidate curve
+    1 - (1 - s^rows)^bands around the threshold.
+    """
+    s = np.linspace(0.0, 1.0, 1001)
+    below = s < threshold
+    best, best_error = (1, num_perm), np.inf
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        p = 1.0 - (1.0 - s ** rows) ** bands
+        error = np.trapezoid(p[below], s[below]) + np.trapezoid(1.0 - p[~below], s[~below])
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def band_hashes(sigs, bands, rows):
+    """(texts, bands) uint64 hash of each band of rows signature values."""
+    banded = sigs[:, :bands * rows].reshape(len(sigs), bands, rows).astype(np.uint64)
+    hashes = np.zeros(banded.shape[:2], dtype=np.uint64)
+    for r in range(rows):
+        hashes *= _BAND_BASE
+        hashes += banded[:, :, r]
+    return hashes
+
+
+def candidate_pairs(hashes, valid):
+    """
+    (i, j) arrays with i < j: in every band, each text is paired with the
+    first (lowest-index) valid text in its bucket.
+    """
+    pairs_i, pairs_j = [], []
+    index = np.flatnonzero(valid)
+    for band in hashes[index].T:
+        order = np.argsort(band, kind="stable")
+        keys = band[order]
+        starts = np.ones(len(keys), dtype=bool)
+        starts[1:] = keys[1:] != keys[:-1]
+        first = np.maximum.accumulate(np.where(starts, np.arange(len(keys)), 0))
+        members = ~starts
+        pairs_i.append(index[order[first[members]]])
+        pairs_j.append(index[order[members]])
+    if not pairs_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+    unique = np.unique(i * len(hashes) + j)
+    return unique // len(hashes), unique % len(hashes)
+
+
+def similarity(sigs, i, j):
+    """Estimated Jaccard similarity of each pair: the fraction of signature positions that agree."""
+    return (sigs[i] == sigs[j]).mean(axis=1)
+
+
+def components(n, i, j):
+    """Label of each of n items: the smallest index connected to it through the (i, j) edges."""
+    labels = np.arange(n)
+    while len(i):
+        low = np.minimum(labels[i], labels[j])
+        updated = labels.copy()
+        np.minimum.at(updated, i, low)
+        np.minimum.at(updated, j, low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return labels
+
+
+def find_duplicates(texts, threshold=THRESHOLD, num_perm=NUM_PERM, shingle=SHINGLE, workers=None):
+    """
+    (labels, sigs): labels[k] is the index of the text that text k
+    duplicates (k itself for texts that are kept).
+    """
+    hasher = MinHasher(num_perm, shingle)
+    sigs = signatures(list(texts), hasher, workers)
+    valid = sigs[:, 0] != _EMPTY
+    bands, rows = lsh_params(threshold, num_perm)
+    i, j = candidate_pairs(band_hashes(sigs, bands, rows), valid)
+    close = similarity(sigs, i, j) >= threshold
+    return components(len(sigs), i[close], j[close]), sigs
+
+
+def _clusters(labels, sigs, keys, texts):
+    """Report entries for every cluster with more than one member, largest first."""
+    dropped = np.flatnonzero(labels != np.arange(len(labels)))
+    clusters = {}
+    for k in dropped:
+        clusters.setdefault(int(labels[k]), []).append(int(k))
+    entries = []
+    for kept, members in clusters.items():
+        scores = similarity(sigs, np.full(len(members), kept), np.array(members))
+        entries.append({
+            "kept": keys[kept],
+            "sample": texts[kept][:200],
+            "dropped": [{"key": keys[k], "similarity": round(float(s), 3)} for k, s in zip(members, scores)],
+        })
+    return sorted(entries, key=lambda e: -len(e["dropped"]))
+
+
+def _paragraphs(text):
+    return [p for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+
+def deduplicate(docs, level="both", threshold=THRESHOLD, num_perm=NUM_PERM, shingle=SHINGLE, workers=None):
+    """
+    Drops near-duplicate documents and/or paragraphs from `docs`, a list of
+    (key, text). Returns the kept (key, text) list, in order, and a report of
+    the dropped clusters.
+    """
+    if level not in LEVELS:
+        raise ValueError(f"unknown dedup level {level!r}, expected one of {LEVELS}")
+    report = {"level": level, "threshold": threshold, "num_perm": num_perm, "shingle": shingle,
+              "bands_rows": lsh_params(threshold, num_perm), "documents": len(docs)}
+    keys = [str(key) for key, _ in docs]
+    texts = [text for _, text in docs]
+
+    if level in ("document", "both"):
+        labels, sigs = find_duplicates(texts, threshold, num_perm, shingle, workers)
+        keep = labels == np.arange(len(labels))
+        report["document_clusters"] = _clusters(labels, sigs, keys, texts)
+        report["documents_dropped"] = int((~keep).sum())
+        keys = [key for key, k in zip(keys, keep) if k]
+        texts = [text for text, k in zip(texts, keep) if k]
+
+    if level in ("paragraph", "both"):
+        split = [_paragraphs(text) for text in texts]
+        owners, paragraph_keys, paragraphs = [], [], []
+        for d, (key, parts) in enumerate(zip(keys, split)):
+            for p, paragraph in enumerate(parts[1:], start=1):
+                owners.append((d, p))
+                paragraph_keys.append(f"{key}#{p}")
+                paragraphs.append(paragraph)
+        labels, sigs = find_duplicates(paragraphs, threshold, num_perm, shingle, workers)
+        drop = {owners[k] for k in np.flatnonzero(labels != np.arange(len(labels)))}
+        report["paragraph_clusters"] = _clusters(labels, sigs, paragraph_keys, paragraphs)
+        report["paragraphs"] = len(paragraphs)
+        report["paragraphs_dropped"] = len(drop)
+        texts = ["\n\n".join(part for p, part in enumerate(parts) if (d, p) not in drop)
+                 for d, parts in enumerate(split)]
+        # Keep the trailing newline documents end with.
+        texts = [text if text.endswith("\n") else text + "\n" for text in texts]
+
+    return list(zip(keys, texts)), report
+
+
+def save_report(report, path=REPORT_FILE):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def summary(report):
+    lines = [f"dedup ({report['level']}, threshold {report['threshold']}, bands x rows "
+             f"{report['bands_rows'][0]}x{report['bands_rows'][1]}):"]
+    if "documents_dropped" in report:
+        lines.append(f"  {report['documents_dropped']} of {report['documents']} documents dropped "
+                     f"in {len(report['document_clusters'])} clusters")
+    if "paragraphs_dropped" in report:
+        lines.append(f"  {report['paragraphs_dropped']} of {report['paragraphs']} paragraphs dropped "
+                     f"in {len(report['paragraph_clusters'])} clusters")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report near-duplicate documents and paragraphs in the corpus.")
+    parser.add_argument("--input", default=RECORDS_FILE, help="JSONL records or a JSON array")
+    parser.add_argument("--level", choices=LEVELS, default="both")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="estimated Jaccard similarity")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM, help="MinHash signature length")
+    parser.add_argument("--shingle", type=int, default=SHINGLE, help="words per shingle")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: every CPU)")
+    parser.add_argument("--report", default=REPORT_FILE, help="where to write the cluster report")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    docs = [(record["id"], document(record)) for record in iter_records(args.input)]
+    _, report = deduplicate(docs, args.level, args.threshold, args.num_perm, args.shingle, args.workers)
+    save_report(report, args.report)
+    print(summary(report))
+    print(f"Wrote the cluster report to {args.report} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Renders dataset records as plain-text documents for tokenizer and model training.
+"""
+import os
+import re
+import json
+import unicodedata
+
+from app.scraper.checkpoint import iter_jsonl
+
+RECORDS_FILE = os.path.join(os.path.dirname(__file__), '../dataset/volcanoes.jsonl')
+
+_INVISIBLE = re.compile(r"[\x00-\x08\x0b-\x1f\x7f-\x9f\u200b-\u200f\u2028\u2029\ufeff]")
+_SPACES = re.compile(r"[^\S\n]+")
+_LINE_EDGES = re.compile(r" *\n *")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def iter_records(path=RECORDS_FILE):
+    """Records from a JSONL checkpoint, or from a JSON array such as volcanoes.json."""
+    if path.endswith(".jsonl"):
+        yield from iter_jsonl(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def _join(values):
+    return ", ".join(v for v in values if v)
+
+
+def record_text(record):
+    """One document per volcano: a short fact sheet followed by the summary and eruptive history."""
+    location = record.get("location", {})
+    lines = [record["name"]]
+
+    region, country = location.get("region"), location.get("country")
+    place = country if region in (None, "", country) else _join([region, country])
+    lines.append(f"{record['name']} is a volcano in {place}." if place else f"{record['name']} is a volcano.")
+    if record.get("alternate_names"):
+        lines.append(f"Also known as: {_join(record['alternate_names'])}.")
+
+    lat, lon = (location.get("coordinates") or [None, None])[:2]
+    if lat is not None and lon is not None:
+        lines.append(f"Coordinates: {lat:.3f}, {lon:.3f}.")
+    if record.get("elevation_m") is not None:
+        lines.append(f"Elevation: {record['elevation_m']:g} m.")
+    if record.get("volcano_types"):
+        lines.append(f"Type: {_join(record['volcano_types'])}.")
+    if record.get("volcano_landform"):
+        lines.append(f"Landform: {record['volcano_landform']}.")
+    features = record.get("features") or {}
+    named = [(kind, _join(feature.get("name") for feature in items)) for kind, items in features.items()]
+    if any(names for _, names in named):
+        lines.append("Features: " + "; ".join(f"{kind}: {names}" for kind, names in named if names) + ".")
+    if record.get("status"):
+        lines.append(f"Status: {record['status']}.")
+    if record.get("last_known_eruption"):
+        lines.append(f"Last known eruption: {record['last_known_eruption']}.")
+
+    rock_types = record.get("rock_types") or {}
+    if rock_types.get("major"):
+        lines.append(f"Major rock types: {_join(rock_types['major'])}.")
+    if rock_types.get("minor"):
+        lines.append(f"Minor rock types: {_join(rock_types['minor'])}.")
+
+    population = record.get("population") or {}
+    radii = [(key.removeprefix("within_"), value) for key, value in population.items() if value]
+    if radii:
+        lines.append("Population within " + "; ".join(f"{radius}: {value}" for radius, value in radii) + ".")
+
+    if record.get("summary"):
+        lines.append("")
+        lines.append(record["summary"].strip())
+
+    history = record.get("eruption_history") or []
+    if history:
+        lines.append("")
+        lines.append("Eruptive history:")
+        for eruption in history:
+            period = eruption.get("period", {})
+            line = f"- {period.get('date_range') or 'Unknown date'}: {period.get('eruption_type') or 'Eruption'}"
+            if period.get("vei") is not None:
+                line += f", VEI {period['vei']}"
+            if eruption.get("impact"):
+                line += f". {eruption['impact']}"
+            lines.append(line + ".")
+    return "\n".join(lines) + "\n"
+
+
+def clean_text(text):
+    """
+    NFC-normalised text without control or zero-width characters, with runs
+    of spaces collapsed, no spaces around line breaks, at most one blank line
+    in a row and a single trailing newline.
+    """
+    text = _INVISIBLE.sub("", unicodedata.normalize("NFC", text))
+    text = _LINE_EDGES.sub("\n", _SPACES.sub(" ", text))
+    return _BLANK_LINES.sub("\n\n", text).strip() + "\n"
+
+
+def document(record):
+    """The training text of a record: record_text() after clean_text()."""
+    return clean_text(record_text(record))
+
+
+def iter_texts(path=RECORDS_FILE):
+    for record in iter_records(path):
+        yield document(record)
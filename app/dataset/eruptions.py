@@ -0,0 +1,286 @@
+"""
+Columnar store of eruptive periods, episodes and events.
+
+The nested eruption_history of every record is flattened into three tables
+of typed NumPy columns, each row pointing at its parent by row number:
+
+    periods   volcano, start/end year-month-day, continuing, vei, eruption_type, impact
+    episodes  period, volcano, start/end year-month-day, location, evidence
+    events    episode, period, volcano, start/end year-month-day, event_type, remarks
+
+plus per-volcano id, name, country and region. Strings are dictionary-encoded:
+an int32 code column and a sorted `<column>_values` array. Unknown numbers
+are NO_YEAR / 0 (month, day) / -1 (vei); BCE years are negative (5550 BCE
+is -5550). The store is one .npz (no pickles), so a query is a few
+array operations over every volcano instead of a walk over nested JSON.
+
+Records written before episodes kept their events still load; they just
+contribute periods and no events. Re-parse them (scraper pipeline `parse`)
+to fill in the events.
+
+    python -m app.dataset.eruptions build [--records app/dataset/volcanoes.json]
+    python -m app.dataset.eruptions vei-decades [--since 1800]
+    python -m app.dataset.eruptions event-types [--top 8]
+    python -m app.dataset.eruptions last [--limit 20]
+"""
+import os
+import re
+import time
+import argparse
+import functools
+
+import numpy as np
+
+from app.corpus.text import iter_records
+
+RECORDS_FILE = os.path.join(os.path.dirname(__file__), 'volcanoes.json')
+STORE_FILE = os.path.join(os.path.dirname(__file__), 'eruptions.npz')
+VERSION = 1
+
+NO_YEAR = np.iinfo(np.int32).min
+MAX_VEI = 8
+MONTHS = {m: i for i, m in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1)}
+_DATE = re.compile(r"(\d+)(?:\s*(BCE|CE|BC|AD))?(?:\s+([A-Za-z]{3})[a-z]*\.?)?(?:\s+(\d{1,2})\b)?")
+_RANGE_SEPARATOR = re.compile(r"\s+-\s+")
+
+TABLES = {
+    "volcanoes": ("id", "name", "country", "region"),
+    "periods": ("volcano", "start_year", "start_month", "start_day", "end_year", "end_month", "end_day",
+                "continuing", "vei", "eruption_type", "impact"),
+    "episodes": ("period", "volcano", "start_year", "start_month", "start_day", "end_year", "end_month",
+                 "end_day", "location", "evidence"),
+    "events": ("episode", "period", "volcano", "start_year", "start_month", "start_day", "end_year",
+               "end_month", "end_day", "event_type", "remarks"),
+}
+STRING_COLUMNS = {"id", "name", "country", "region", "eruption_type", "impact", "location", "evidence",
+                  "event_type", "remarks"}
+COLUMN_TYPES = {"volcano": np.int32, "period": np.int32, "episode": np.int32, "continuing": bool,
+                "vei": np.int8, "start_month": np.int8, "start_day": np.int8, "end_month": np.int8,
+                "end_day": np.int8, "start_year": np.int32, "end_year": np.int32}
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def parse_date(text):
+    """
+    (year, month, day) from a GVP date like '1780 Feb 26', '1781 Dec',
+    '5550 BCE ± 100 years' or '----'; month and day are 0 when not given,
+    and the result is None when there is no year.
+    """
+    match = _DATE.search(text or "")
+    if not match:
+        return None
+    year = int(match.group(1))
+    if match.group(2) in ("BCE", "BC"):
+        year = -year
+    month = MONTHS.get((match.group(3) or "").lower(), 0)
+    day = int(match.group(4)) if month and match.group(4) else 0
+    return year, month, day if day <= 31 else 0
+
+
+def parse_date_range(text):
+    """(start, end, continuing) from a range like '1780 Feb 26 - 1781 (continuing)'; dates as in parse_date."""
+    text = text or ""
+    parts = _RANGE_SEPARATOR.split(text, maxsplit=1)
+    start = parse_date(parts[0])
+    end = parse_date(parts[1]) if len(parts) > 1 else None
+    return start, end, "continuing" in text.lower()
+
+
+def _date_columns(date):
+    return date if date is not None else (NO_YEAR, 0, 0)
+
+
+class EruptionStore:
+    """The tables as dicts of columns: store.periods["vei"], store.events["event_type"] and so on."""
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for table, columns in TABLES.items():
+            setattr(self, table, {column: arrays[f"{table}.{column}"] for column in columns})
+
+    @classmethod
+    def build(cls, records):
+        rows = {table: [] for table in TABLES}
+        volcanoes, periods, episodes, events = (rows[table] for table in TABLES)
+        for record in records:
+            location = record.get("location") or {}
+            volcano = len(volcanoes)
+            volcanoes.append((str(record.get("id", "")), record.get("name") or "",
+                              location.get("country") or "", location.get("region") or ""))
+            for eruption in record.get("eruption_history") or []:
+                period = eruption.get("period") or {}
+                start, end, continuing = parse_date_range(period.get("date_range"))
+                vei = period.get("vei")
+                period_row = len(periods)
+                periods.append((volcano, *_date_columns(start), *_date_columns(end), continuing,
+                                vei if isinstance(vei, int) and 0 <= vei <= MAX_VEI else -1,
+                                period.get("eruption_type") or "", eruption.get("impact") or ""))
+                for episode in period.get("episodes") or []:
+                    start, end, _ = parse_date_range(episode.get("date_range"))
+                    episode_row = len(episodes)
+                    episodes.append((period_row, volcano, *_date_columns(start), *_date_columns(end),
+                                     episode.get("location") or "", episode.get("evidence") or ""))
+                    for event in episode.get("events") or []:
+                        events.append((episode_row, period_row, volcano,
+                                       *_date_columns(parse_date(event.get("start_date"))),
+                                       *_date_columns(parse_date(event.get("end_date"))),
+                                       event.get("event_type") or "", event.get("remarks") or ""))
+
+        arrays = {"version": np.array(VERSION)}
+        for table, columns in TABLES.items():
+            values = zip(*rows[table]) if rows[table] else [()] * len(columns)
+            for column, column_values in zip(columns, values):
+                key = f"{table}.{column}"
+                if column in STRING_COLUMNS:
+                    strings, codes = np.unique(np.array(column_values, dtype=str), return_inverse=True)
+                    arrays[f"{key}_values"] = strings
+                    arrays[key] = codes.astype(np.int32)
+                else:
+                    arrays[key] = np.array(column_values, dtype=COLUMN_TYPES[column])
+        return cls(arrays)
+
+    @classmethod
+    def from_file(cls, records_path=RECORDS_FILE):
+        return cls.build(iter_records(records_path))
+
+    def save(self, path=STORE_FILE):
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, **self.arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=STORE_FILE):
+        with np.load(path, allow_pickle=False) as f:
+            arrays = {key: f[key] for key in f.files}
+        if int(arrays["version"]) != VERSION:
+            raise ValueError(f"{path} is a version {int(arrays['version'])} store; rebuild it")
+        return cls(arrays)
+
+    def values(self, table, column):
+        """The dictionary of a string column: codes index into it."""
+        return self.arrays[f"{table}.{column}_values"]
+
+    def decode(self, table, column, rows=None):
+        codes = getattr(self, table)[column]
+        return self.values(table, column)[codes if rows is None else codes[rows]]
+
+    def code(self, table, column, value):
+        """The code of `value` in a string column, or -1 if it never occurs."""
+        values = self.values(table, column)
+        i = np.searchsorted(values, value)
+        return int(i) if i < len(values) and values[i] == value else -1
+
+    # -- queries
+
+    def vei_by_decade(self, since=None, until=None):
+        """
+        (decades, counts): counts[i, vei] is the number of periods with that
+        VEI starting in decades[i]. Periods without a year or VEI are left out.
+        """
+        year, vei = self.periods["start_year"], self.periods["vei"]
+        keep = (year != NO_YEAR) & (vei >= 0)
+        if since is not None:
+            keep &= year >= since
+        if until is not None:
+            keep &= year < until
+        decade = year[keep] // 10 * 10
+        decades, index = np.unique(decade, return_inverse=True)
+        counts = np.bincount(index * (MAX_VEI + 1) + vei[keep], minlength=len(decades) * (MAX_VEI + 1))
+        return decades, counts.reshape(len(decades), MAX_VEI + 1)
+
+    def event_types_by(self, column="region"):
+        """
+        (groups, event_types, counts): counts[g, t] is the number of events of
+        event_types[t] at volcanoes whose `column` (region or country) is groups[g].
+        """
+        group = self.volcanoes[column][self.events["volcano"]]
+        groups, types = self.values("volcanoes", column), self.values("events", "event_type")
+        counts = np.bincount(group * len(types) + self.events["event_type"], minlength=len(groups) * len(types))
+        return groups, types, counts.reshape(len(groups), len(types))
+
+    def last_eruption(self):
+        """
+        Row in `periods` of each volcano's latest dated period (by start date),
+        or -1 for volcanoes with none; continuing periods count as latest.
+        """
+        periods = self.periods
+        dated = np.flatnonzero(periods["start_year"] != NO_YEAR)
+        order = dated[np.lexsort((periods["start_day"][dated], periods["start_month"][dated],
+                                  periods["start_year"][dated], periods["continuing"][dated],
+                                  periods["volcano"][dated]))]
+        last = np.full(len(self.volcanoes["id"]), -1, dtype=np.int64)
+        # Sorted by volcano, so each volcano's last row wins the scatter.
+        last[periods["volcano"][order]] = order
+        return last
+
+
+def _print_vei(store, since, until):
+    decades, counts = store.vei_by_decade(since, until)
+    print(f"{'decade':>8} " + " ".join(f"{f'VEI {v}':>6}" for v in range(MAX_VEI + 1)) + f" {'total':>7}")
+    for decade, row in zip(decades, counts):
+        print(f"{decade:>8} " + " ".join(f"{n:>6}" for n in row) + f" {row.sum():>7}")
+
+
+def _print_event_types(store, column, top):
+    groups, types, counts = store.event_types_by(column)
+    order = np.argsort(-counts.sum(axis=0), kind="stable")[:top]
+    print(f"{column:30} " + " ".join(f"{t[:12]:>12}" for t in types[order]))
+    for g in np.argsort(-counts.sum(axis=1), kind="stable"):
+        if counts[g].any():
+            print(f"{(groups[g] or '(unknown)')[:30]:30} " + " ".join(f"{n:>12}" for n in counts[g, order]))
+
+
+def _print_last(store, limit):
+    last = store.last_eruption()
+    have = np.flatnonzero(last >= 0)
+    periods = store.periods
+    rows = last[have]
+    order = np.lexsort((periods["start_month"][rows], periods["start_year"][rows], periods["continuing"][rows]))[::-1]
+    names = store.decode("volcanoes", "name", have)
+    for i in order[:limit]:
+        row = rows[i]
+        year, month = periods["start_year"][row], periods["start_month"][row]
+        date = f"{-year} BCE" if year < 0 else str(year)
+        if month:
+            date += f"-{month:02d}"
+        vei = periods["vei"][row]
+        continuing = " (continuing)" if periods["continuing"][row] else ""
+        print(f"{names[i][:30]:30} {date:>10}{continuing}  VEI {vei if vei >= 0 else '?'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the columnar eruption store.")
+    parser.add_argument("--store", default=STORE_FILE, help="store file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="flatten a records file (JSON array or JSONL)")
+    build.add_argument("--records", default=RECORDS_FILE)
+    vei = sub.add_parser("vei-decades", help="periods per decade and VEI")
+    vei.add_argument("--since", type=int)
+    vei.add_argument("--until", type=int)
+    types = sub.add_parser("event-types", help="event type counts per region or country")
+    types.add_argument("--by", choices=("region", "country"), default="region")
+    types.add_argument("--top", type=int, default=8, help="most frequent event types to show")
+    last = sub.add_parser("last", help="latest eruption per volcano, most recent first")
+    last.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        store = EruptionStore.from_file(args.records)
+        store.save(args.store)
+        print(f"Stored {len(store.volcanoes['id'])} volcanoes, {len(store.periods['volcano'])} periods, "
+              f"{len(store.episodes['period'])} episodes and {len(store.events['episode'])} events "
+              f"in {time.perf_counter() - start:.2f}s -> {args.store}")
+        return
+
+    store = EruptionStore.load(args.store)
+    if args.command == "vei-decades":
+        _print_vei(store, args.since, args.until)
+    elif args.command == "event-types":
+        _print_event_types(store, args.by, args.top)
+    else:
+        _print_last(store, args.limit)
+
+
+if __name__ == "__main__":
+    main()
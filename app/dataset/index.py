@@ -0,0 +1,333 @@
+"""
+Spatial and name index over the volcano dataset.
+
+Every volcano (location.coordinates) and every sub-feature with coordinates
+(features.*) is a point. Points are bucketed into a latitude/longitude grid
+stored CSR-style: sorted by cell, with one start offset per cell, so the
+candidates for a cap on the sphere are a few contiguous slices. Candidates
+are checked exactly with great-circle distances on unit vectors. k-NN grows
+a radius query until it holds k points, which makes it exact as well.
+
+Names and alternate_names are normalised (case, accents, punctuation) into
+an exact-name table and an inverted token index, both as sorted arrays.
+
+Everything is plain NumPy arrays saved with np.savez, so loading is a few
+reads and needs no pickling.
+
+    python -m app.dataset.index build [--records app/dataset/volcanoes.json]
+    python -m app.dataset.index near 37.75 15.0 [--radius 100] [--volcanoes-only]
+    python -m app.dataset.index knn 37.75 15.0 [-k 5]
+    python -m app.dataset.index name Mongibello
+"""
+import os
+import re
+import time
+import argparse
+import unicodedata
+
+import numpy as np
+
+from app.corpus.text import iter_records
+
+RECORDS_FILE = os.path.join(os.path.dirname(__file__), 'volcanoes.json')
+INDEX_FILE = os.path.join(os.path.dirname(__file__), 'volcano_index.npz')
+VERSION = 1
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEG = 1.0
+VOLCANO, FEATURE = 0, 1
+_COORDINATE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*°?\s*([NSEW])?\s*$")
+
+
+def parse_coordinate(value):
+    """Degrees from a number or a GVP string like '37.748°N' / '14.999°W'; None if unreadable."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _COORDINATE.match(str(value))
+    if not match:
+        return None
+    degrees = float(match.group(1))
+    return -degrees if match.group(2) in ("S", "W") else degrees
+
+
+def normalize_name(name):
+    """Case-, accent- and punctuation-insensitive form of a name: 'Mt. Ruapehu' -> 'mt ruapehu'."""
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", stripped))
+
+
+def unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord):
+    """Great-circle distance from the straight-line distance between unit vectors (stable for small angles)."""
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2.0, 1.0))
+
+
+def _csr(keys, n_keys):
+    """(order, starts): `order` sorts the items by key, items with key k are order[starts[k]:starts[k + 1]]."""
+    order = np.argsort(keys, kind="stable")
+    starts = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_keys), out=starts[1:])
+    return order, starts
+
+
+class VolcanoIndex:
+    """
+    Arrays per record (record_ids, record_names), per point (point_record,
+    point_kind, point_label, lat, lon, xyz, all in grid-cell order) and the
+    name tables. Query results are point indices; point_record maps them to
+    records.
+    """
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for key, value in arrays.items():
+            setattr(self, key, value)
+        self.cell_deg = float(arrays["cell_deg"])
+        self.n_lat = int(round(180 / self.cell_deg))
+        self.n_lon = int(round(360 / self.cell_deg))
+
+    @classmethod
+    def build(cls, records, cell_deg=CELL_DEG):
+        record_ids, record_names = [], []
+        point_record, point_kind, point_label, lats, lons = [], [], [], [], []
+        exact, tokens = {}, {}
+
+        for i, record in enumerate(records):
+            record_ids.append(str(record.get("id", "")))
+            record_names.append(record.get("name") or "")
+            coordinates = (record.get("location") or {}).get("coordinates") or [None, None]
+            points = [(VOLCANO, record.get("name") or "", coordinates[0], coordinates[1])]
+            for features in (record.get("features") or {}).values():
+                for feature in features:
+                    points.append((FEATURE, feature.get("name") or "", feature.get("latitude"), feature.get("longitude")))
+            for kind, label, lat, lon in points:
+                lat, lon = parse_coordinate(lat), parse_coordinate(lon)
+                if lat is None or lon is None or not -90 <= lat <= 90:
+                    continue
+                point_record.append(i)
+                point_kind.append(kind)
+                point_label.append(label)
+                lats.append(lat)
+                lons.append((lon + 180.0) % 360.0 - 180.0)
+
+            for name in [record.get("name")] + list(record.get("alternate_names") or []):
+                key = normalize_name(name or "")
+                if not key:
+                    continue
+                exact.setdefault(key, set()).add(i)
+                for token in key.split():
+                    tokens.setdefault(token, set()).add(i)
+
+        lat = np.array(lats, dtype=np.float64)
+        lon = np.array(lons, dtype=np.float64)
+        n_lat, n_lon = int(round(180 / cell_deg)), int(round(360 / cell_deg))
+        rows = np.minimum(((lat + 90.0) / cell_deg).astype(np.int64), n_lat - 1)
+        cols = np.minimum(((lon + 180.0) / cell_deg).astype(np.int64), n_lon - 1)
+        order, cell_starts = _csr(rows * n_lon + cols, n_lat * n_lon)
+
+        arrays = {
+            "version": np.array(VERSION),
+            "cell_deg": np.array(cell_deg),
+            "record_ids": np.array(record_ids, dtype=str),
+            "record_names": np.array(record_names, dtype=str),
+            "point_record": np.array(point_record, dtype=np.int32)[order],
+            "point_kind": np.array(point_kind, dtype=np.int8)[order],
+            "point_label": np.array(point_label, dtype=str)[order],
+            "lat": lat[order],
+            "lon": lon[order],
+            "xyz": unit_vectors(lat, lon)[order],
+            "cell_starts": cell_starts,
+        }
+        for prefix, table in (("exact", exact), ("token", tokens)):
+            keys = sorted(table)
+            postings = [sorted(table[key]) for key in keys]
+            arrays[f"{prefix}_keys"] = np.array(keys, dtype=str)
+            arrays[f"{prefix}_starts"] = np.cumsum([0] + [len(p) for p in postings], dtype=np.int64)
+            arrays[f"{prefix}_records"] = np.array([r for p in postings for r in p], dtype=np.int32)
+        return cls(arrays)
+
+    @classmethod
+    def from_file(cls, records_path=RECORDS_FILE, cell_deg=CELL_DEG):
+        return cls.build(iter_records(records_path), cell_deg)
+
+    def save(self, path=INDEX_FILE):
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, **self.arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        with np.load(path, allow_pickle=False) as f:
+            arrays = {key: f[key] for key in f.files}
+        if int(arrays["version"]) != VERSION:
+            raise ValueError(f"{path} is a version {int(arrays['version'])} index; rebuild it")
+        return cls(arrays)
+
+    def __len__(self):
+        return len(self.record_ids)
+
+    # -- spatial queries
+
+    def _candidates(self, lat, lon, angle):
+        """Point indices in the grid cells that can hold points within `angle` radians of (lat, lon)."""
+        if angle >= np.pi:
+            return np.arange(len(self.lat))
+        dlat = np.degrees(angle)
+        row_lo = max(int((lat - dlat + 90.0) // self.cell_deg), 0)
+        row_hi = min(int((lat + dlat + 90.0) // self.cell_deg), self.n_lat - 1)
+        cos_lat = np.cos(np.radians(lat))
+        if lat - dlat <= -90.0 or lat + dlat >= 90.0 or np.sin(angle) >= cos_lat:
+            col_ranges = [(0, self.n_lon - 1)]  # the cap covers a pole: every longitude
+        else:
+            dlon = np.degrees(np.arcsin(np.sin(angle) / cos_lat))
+            col_lo = int((lon - dlon + 180.0) // self.cell_deg)
+            col_hi = int((lon + dlon + 180.0) // self.cell_deg)
+            if col_hi - col_lo + 1 >= self.n_lon:
+                col_ranges = [(0, self.n_lon - 1)]
+            elif col_lo < 0:
+                col_ranges = [(0, col_hi), (col_lo + self.n_lon, self.n_lon - 1)]
+            elif col_hi >= self.n_lon:
+                col_ranges = [(col_lo, self.n_lon - 1), (0, col_hi - self.n_lon)]
+            else:
+                col_ranges = [(col_lo, col_hi)]
+        starts = self.cell_starts
+        slices = []
+        for row in range(row_lo, row_hi + 1):
+            base = row * self.n_lon
+            for lo, hi in col_ranges:
+                a, b = starts[base + lo], starts[base + hi + 1]
+                if b > a:
+                    slices.append(np.arange(a, b))
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def _within(self, lat, lon, radius_km, kind):
+        angle = radius_km / EARTH_RADIUS_KM
+        candidates = self._candidates(lat, lon, angle)
+        if kind is not None:
+            candidates = candidates[self.point_kind[candidates] == kind]
+        chord = np.linalg.norm(self.xyz[candidates] - unit_vectors(lat, lon), axis=1)
+        km = chord_to_km(chord)
+        keep = km <= radius_km
+        candidates, km = candidates[keep], km[keep]
+        order = np.argsort(km, kind="stable")
+        return candidates[order], km[order]
+
+    def radius(self, lats, lons, radius_km, kind=None):
+        """
+        For each query point, (point indices, distances in km) of every point
+        within radius_km, nearest first. `kind` limits the points to VOLCANO
+        or FEATURE; radius_km may be one value or one per query.
+        """
+        lats, lons = np.atleast_1d(lats).astype(float), np.atleast_1d(lons).astype(float)
+        radii = np.broadcast_to(np.asarray(radius_km, dtype=float), lats.shape)
+        return [self._within(lat, lon, r, kind) for lat, lon, r in zip(lats, lons, radii)]
+
+    def knn(self, lats, lons, k=5, kind=None, start_km=50.0):
+        """
+        (indices, distances) arrays of shape (queries, k) for the k nearest
+        points to each query, nearest first; missing neighbours (fewer than
+        k points) are -1 / inf.
+        """
+        lats, lons = np.atleast_1d(lats).astype(float), np.atleast_1d(lons).astype(float)
+        indices = np.full((len(lats), k), -1, dtype=np.int64)
+        distances = np.full((len(lats), k), np.inf)
+        max_km = np.pi * EARTH_RADIUS_KM
+        for q, (lat, lon) in enumerate(zip(lats, lons)):
+            radius = start_km
+            while True:
+                found, km = self._within(lat, lon, radius, kind)
+                # Every point within `radius` is in `found`, so once it holds k points they are the k nearest.
+                if len(found) >= k or radius >= max_km:
+                    break
+                radius *= 4
+            n = min(k, len(found))
+            indices[q, :n], distances[q, :n] = found[:n], km[:n]
+        return indices, distances
+
+    # -- name queries
+
+    def _postings(self, prefix, key):
+        keys = self.arrays[f"{prefix}_keys"]
+        i = np.searchsorted(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return np.empty(0, dtype=np.int32)
+        starts = self.arrays[f"{prefix}_starts"]
+        return self.arrays[f"{prefix}_records"][starts[i]:starts[i + 1]]
+
+    def lookup(self, name):
+        """Record indices whose name or an alternate name equals `name`, ignoring case, accents and punctuation."""
+        return self._postings("exact", normalize_name(name))
+
+    def search(self, text, limit=10):
+        """
+        Record indices ranked by how many of the words in `text` appear in
+        their names and alternate names, exact name matches first.
+        """
+        tokens = normalize_name(text).split()
+        if not tokens:
+            return np.empty(0, dtype=np.int32)
+        hits = np.concatenate([self._postings("token", token) for token in tokens])
+        if not len(hits):
+            return hits
+        records, counts = np.unique(hits, return_counts=True)
+        exact = np.isin(records, self.lookup(text))
+        order = np.lexsort((records, -counts, ~exact))
+        return records[order][:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the volcano spatial and name index.")
+    parser.add_argument("--index", default=INDEX_FILE, help="index file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="index a records file (JSON array or JSONL)")
+    build.add_argument("--records", default=RECORDS_FILE)
+    build.add_argument("--cell-deg", type=float, default=CELL_DEG, help="grid cell size in degrees")
+    for name in ("near", "knn"):
+        query = sub.add_parser(name, help="points within a radius" if name == "near" else "k nearest points")
+        query.add_argument("lat", type=float)
+        query.add_argument("lon", type=float)
+        query.add_argument("--volcanoes-only", action="store_true", help="ignore sub-features")
+        if name == "near":
+            query.add_argument("--radius", type=float, default=100.0, help="km")
+        else:
+            query.add_argument("-k", type=int, default=5)
+    lookup = sub.add_parser("name", help="records matching a name or alternate name")
+    lookup.add_argument("query")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = VolcanoIndex.from_file(args.records, args.cell_deg)
+        index.save(args.index)
+        print(f"Indexed {len(index)} records, {len(index.lat)} points and {len(index.token_keys)} name tokens "
+              f"in {time.perf_counter() - start:.2f}s -> {args.index}")
+        return
+
+    index = VolcanoIndex.load(args.index)
+    if args.command == "name":
+        exact = set(index.lookup(args.query).tolist())
+        for i in index.search(args.query):
+            print(f"{index.record_ids[i]:>8}  {index.record_names[i]}{'' if i in exact else '  (partial)'}")
+        return
+
+    kind = VOLCANO if args.volcanoes_only else None
+    if args.command == "near":
+        (found, km), = index.radius(args.lat, args.lon, args.radius, kind)
+    else:
+        found, km = index.knn(args.lat, args.lon, args.k, kind)
+        found, km = found[0][found[0] >= 0], km[0][found[0] >= 0]
+    for point, distance in zip(found, km):
+        record = index.point_record[point]
+        label = "" if index.point_kind[point] == VOLCANO else f" / {index.point_label[point]}"
+        print(f"{distance:9.2f} km  {index.record_ids[record]:>8}  {index.record_names[record]}{label}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Validates volcano records against volcano.schema.json.
+
+The schema is compiled once into nested closures, one per schema node, so a
+record is checked by plain function calls and dict lookups with no schema
+interpretation per record. Paths are only turned into strings for values that
+fail. Covers the draft-07 keywords the schema uses; `format` is an annotation,
+as in draft-07, and is not asserted.
+
+    python -m app.dataset.validator app/dataset/volcanoes.jsonl [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter, defaultdict
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), 'volcano.schema.json')
+RECORDS_FILE = os.path.join(os.path.dirname(__file__), 'volcanoes.jsonl')
+
+# Exact types only: bool is not a number and datetime, set or bytes values match nothing.
+JSON_TYPES = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+    "null": (type(None),)
+}
+
+# Keywords that only document the schema.
+ANNOTATIONS = {"$schema", "$id", "title", "description", "format", "default", "examples", "$comment"}
+SUPPORTED = {
+    "type", "properties", "required", "additionalProperties", "items",
+    "minItems", "maxItems", "minimum", "maximum", "minLength", "enum"
+}
+
+
+def format_path(path):
+    """Renders a path built by the compiled checks, e.g. eruption_history[3].period.vei."""
+    parts = []
+    while path:
+        path, key = path
+        parts.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return "".join(reversed(parts)).lstrip(".")
+
+
+def field_name(path):
+    """Path with array indices dropped, used to group failures across records."""
+    parts = []
+    while path:
+        path, key = path
+        parts.append("[]" if isinstance(key, int) else f".{key}")
+    return "".join(reversed(parts)).lstrip(".") or "<record>"
+
+
+def _type_name(value):
+    for name, classes in JSON_TYPES.items():
+        if type(value) in classes:
+            return name
+    return type(value).__name__
+
+
+def _allowed_types(types):
+    types = [types] if isinstance(types, str) else types
+    allowed = set()
+    for name in types:
+        if name not in JSON_TYPES:
+            raise ValueError(f"unknown JSON type {name!r}")
+        allowed.update(JSON_TYPES[name])
+    return frozenset(allowed), " or ".join(types), "integer" in types and "number" not in types
+
+
+def _type_error(value, path, errors, expected, integer_only):
+    """Reports a type mismatch; 3.0 still counts as an integer, as in draft-07."""
+    if integer_only and type(value) is float and value.is_integer():
+        return False
+    errors.append((path, f"expected {expected}, got {_type_name(value)}"))
+    return True
+
+
+def _leaf(schema):
+    """Type test for a node that carries nothing but a type, so its parent can inline it."""
+    if "type" in schema and not set(schema) - ANNOTATIONS - {"type"}:
+        return _allowed_types(schema["type"])
+    return None
+
+
+def compile_schema(schema):
+    """
+    Returns check(value, path, errors) for a schema node. It appends a
+    (path, message) pair to `errors` for each violation; `path` is a
+    (parent, key) chain ending in (). Each node compiles to one closure and
+    type-only children are tested inline by their parent, so a valid record
+    costs one call per object or array and no allocations for leaves.
+    """
+    unknown = set(schema) - ANNOTATIONS - SUPPORTED
+    if unknown:
+        raise ValueError(f"unsupported schema keywords: {sorted(unknown)}")
+
+    allowed, expected, integer_only = _allowed_types(schema["type"]) if "type" in schema else (None, "", False)
+
+    required = tuple(schema.get("required", ()))
+    leaves, nested = [], []
+    for key, sub in schema.get("properties", {}).items():
+        leaf = _leaf(sub)
+        if leaf:
+            leaves.append((key,) + leaf)
+        else:
+            nested.append((key, compile_schema(sub)))
+    leaves, nested = tuple(leaves), tuple(nested)
+    additional = schema.get("additionalProperties", True)
+    known = frozenset(schema.get("properties", {}))
+    extra = compile_schema(additional) if isinstance(additional, dict) else None
+    is_object = bool(required or leaves or nested or additional is not True)
+
+    items = schema.get("items")
+    if items is not None and not isinstance(items, dict):
+        raise ValueError("only a single schema is supported for items")
+    item_leaf = _leaf(items) if items is not None else None
+    item_check = compile_schema(items) if items is not None and not item_leaf else None
+    min_items = schema.get("minItems", 0)
+    max_items = schema.get("maxItems", float("inf"))
+    is_array = items is not None or "minItems" in schema or "maxItems" in schema
+
+    minimum = schema.get("minimum", float("-inf"))
+    maximum = schema.get("maximum", float("inf"))
+    has_range = "minimum" in schema or "maximum" in schema
+    min_length = schema.get("minLength")
+    enum = schema.get("enum")
+
+    def check(value, path, errors):
+        kind = type(value)
+        if allowed is not None and kind not in allowed:
+            if _type_error(value, path, errors, expected, integer_only):
+                return
+
+        if kind is dict and is_object:
+            for key in required:
+                if key not in value:
+                    errors.append(((path, key), "required field missing"))
+            for key, types, key_expected, key_integer in leaves:
+                if key in value:
+                    v = value[key]
+                    if type(v) not in types:
+                        _type_error(v, (path, key), errors, key_expected, key_integer)
+            for key, sub in nested:
+                if key in value:
+                    sub(value[key], (path, key), errors)
+            if additional is not True:
+                for key in value.keys() - known:
+                    if extra is None:
+                        errors.append(((path, key), "unexpected field"))
+                    else:
+                        extra(value[key], (path, key), errors)
+
+        elif kind is list and is_array:
+            if not min_items <= len(value) <= max_items:
+                errors.append((path, f"expected {min_items}..{max_items} items, got {len(value)}"))
+            if item_leaf:
+                types, item_expected, item_integer = item_leaf
+                for item in value:
+                    if type(item) not in types:
+                        for i, item in enumerate(value):
+                            if type(item) not in types:
+                                _type_error(item, (path, i), errors, item_expected, item_integer)
+                        break
+            elif item_check is not None:
+                for i, item in enumerate(value):
+                    item_check(item, (path, i), errors)
+
+        elif has_range and (kind is int or kind is float):
+            if not minimum <= value <= maximum:
+                errors.append((path, f"{value} outside [{minimum}, {maximum}]"))
+
+        elif min_length is not None and kind is str and len(value) < min_length:
+            errors.append((path, f"shorter than {min_length} characters"))
+
+        if enum is not None and value not in enum:
+            errors.append((path, f"{value!r} is not one of {enum}"))
+    return check
+
+
+class Validator:
+    """A schema compiled for repeated use; validate() returns a list of (path, message) pairs."""
+    def __init__(self, schema):
+        self.schema = schema
+        self._check = compile_schema(schema)
+
+    def errors(self, record):
+        """Raw (path chain, message) pairs, for callers that group by field."""
+        errors = []
+        self._check(record, (), errors)
+        return errors
+
+    def validate(self, record):
+        return [(format_path(path), message) for path, message in self.errors(record)]
+
+    def is_valid(self, record):
+        return not self.errors(record)
+
+
+def load_validator(schema_file=SCHEMA_FILE):
+    with open(schema_file, encoding="utf-8") as f:
+        return Validator(json.load(f))
+
+
+def _iter_records(path):
+    """Records from a JSONL file, or from a JSON array such as volcanoes.json."""
+    if path.endswith(".jsonl"):
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def validate_file(path, validator=None, examples=3):
+    """
+    Validates every record in a dataset file in one pass. Returns a report with
+    totals and, per field, the failure count, messages and a few record ids.
+    """
+    validator = validator or load_validator()
+    fields = defaultdict(lambda: {"count": 0, "messages": Counter(), "examples": []})
+    total = invalid = 0
+    for record in _iter_records(path):
+        total += 1
+        errors = validator.errors(record)
+        if not errors:
+            continue
+        invalid += 1
+        record_id = record.get("id") if type(record) is dict else None
+        for err_path, message in errors:
+            field = fields[field_name(err_path)]
+            field["count"] += 1
+            field["messages"][message] += 1
+            if len(field["examples"]) < examples and record_id not in field["examples"]:
+                field["examples"].append(record_id)
+
+    by_count = sorted(fields.items(), key=lambda item: -item[1]["count"])
+    return {
+        "file": path,
+        "records": total,
+        "invalid": invalid,
+        "fields": {name: dict(info, messages=dict(info["messages"].most_common())) for name, info in by_count}
+    }
+
+
+def format_report(report):
+    lines = [f"{report['records']} records, {report['invalid']} invalid ({report['file']})"]
+    if report["fields"]:
+        width = max(len(name) for name in report["fields"])
+        for name, info in report["fields"].items():
+            message = next(iter(info["messages"]))
+            ids = ", ".join(str(i) for i in info["examples"])
+            lines.append(f"  {name:<{width}}  {info['count']:>6}  {message}  (e.g. {ids})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a volcano dataset against volcano.schema.json.")
+    parser.add_argument("path", nargs="?", default=RECORDS_FILE, help="JSONL records or a JSON array")
+    parser.add_argument("--schema", default=SCHEMA_FILE, help="schema file")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = validate_file(args.path, load_validator(args.schema))
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+        print(f"validated in {elapsed:.2f}s")
+    sys.exit(1 if report["invalid"] else 0)
+
+
+if __name__ == "__main__":
+    main()
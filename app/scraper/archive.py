@@ -0,0 +1,246 @@
+"""
+Append-only compressed archive of fetched pages.
+
+Every entry is a standalone gzip member holding a one-line JSON header (key,
+url, HTTP status, fetch time) followed by the raw body, so the archive as a
+whole is still a valid .gz stream. The sidecar `.idx` file is a JSONL index of
+key -> (offset, length); readers memory-map the archive and inflate only the
+entry they ask for. Re-fetching a key appends a new entry and the latest wins.
+
+    python -m app.scraper.archive get 211060/page
+    python -m app.scraper.archive list
+    python -m app.scraper.archive import-raw app/dataset/raw
+    python -m app.scraper.archive reindex
+"""
+import os
+import sys
+import json
+import mmap
+import zlib
+import argparse
+import threading
+from datetime import datetime, timezone
+
+from app.scraper.checkpoint import trim_partial_line
+
+ARCHIVE_FILE = os.environ.get("VOLCANOZ_ARCHIVE", os.path.join(os.path.dirname(__file__), '../dataset/pages.arc.gz'))
+COMPRESS_LEVEL = 6
+
+
+def page_key(gvp_id, tab):
+    """Archive key for one page of a volcano, e.g. page_key("211060", "history")."""
+    return f"{gvp_id}/{tab}"
+
+
+def _index_path(path):
+    return path + ".idx"
+
+
+def _load_index(path):
+    index = {}
+    try:
+        f = open(_index_path(path), "rb")
+    except FileNotFoundError:
+        return index
+    with f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            entry = json.loads(line)
+            index[entry["key"]] = entry
+    return index
+
+
+def _trim_torn_tail(path):
+    """
+    Undoes a write a crash interrupted: drops a half-written last index line,
+    then any archive bytes past the last indexed member (a member whose index
+    line never made it), so the next entry starts on a clean line and member.
+    """
+    trim_partial_line(_index_path(path))
+    end = max((entry["offset"] + entry["size"] for entry in _load_index(path).values()), default=0)
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        if f.seek(0, os.SEEK_END) > end:
+            f.truncate(end)
+
+
+class ArchiveWriter:
+    """Thread-safe appender; compression happens outside the lock."""
+    def __init__(self, path=ARCHIVE_FILE, level=COMPRESS_LEVEL):
+        self.path = path
+        self.level = level
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(_index_path(path)):
+            _trim_torn_tail(path)
+        self.keys = set(_load_index(path))
+        self._data = open(path, "ab")
+        self._index = open(_index_path(path), "ab")
+        self._lock = threading.Lock()
+
+    def add(self, key, body, url="", status=200, fetched_at=None, content_type=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        header = {
+            "key": key,
+            "url": url,
+            "status": status,
+            "fetched_at": fetched_at or datetime.now(timezone.utc).isoformat(),
+            "content_type": content_type,
+            "length": len(body)
+        }
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        member = compressor.compress(json.dumps(header).encode("utf-8") + b"\n" + body) + compressor.flush()
+
+        with self._lock:
+            offset = self._data.seek(0, os.SEEK_END)
+            self._data.write(member)
+            self._data.flush()
+            entry = dict(header, offset=offset, size=len(member))
+            self._index.write((json.dumps(entry) + "\n").encode("utf-8"))
+            self._index.flush()
+            self.keys.add(key)
+        return entry
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader:
+    """Random access to archive entries by key through a read-only mmap."""
+    def __init__(self, path=ARCHIVE_FILE):
+        self.path = path
+        self.index = _load_index(path)
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def meta(self, key):
+        return self.index[key]
+
+    def get(self, key):
+        """Returns the raw body bytes stored under `key` (KeyError if absent)."""
+        entry = self.index[key]
+        data = zlib.decompress(self._mm[entry["offset"]:entry["offset"] + entry["size"]], 31)
+        return data[data.index(b"\n") + 1:]
+
+    def get_text(self, key):
+        return self.get(key).decode("utf-8")
+
+    def get_json(self, key):
+        return json.loads(self.get(key))
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def rebuild_index(path=ARCHIVE_FILE):
+    """Recreates the .idx file by walking the gzip members, stopping at a torn tail."""
+    entries = []
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        offset = 0
+        while offset < size:
+            inflater = zlib.decompressobj(31)
+            pos, payload = offset, b""
+            try:
+                while not inflater.eof and pos < size:
+                    chunk = mm[pos:pos + (1 << 20)]
+                    pos += len(chunk)
+                    payload += inflater.decompress(chunk)
+            except zlib.error:
+                break
+            if not inflater.eof:
+                break
+            end = pos - len(inflater.unused_data)
+            header = json.loads(payload[:payload.index(b"\n")])
+            entries.append(dict(header, offset=offset, size=end - offset))
+            offset = end
+        if size:
+            mm.close()
+
+    tmp = _index_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    os.replace(tmp, _index_path(path))
+    return len(entries)
+
+
+def import_raw_dir(raw_dir, path=ARCHIVE_FILE):
+    """Moves a directory of loose raw pages (the old fetch layout) into the archive."""
+    count = 0
+    with ArchiveWriter(path) as writer:
+        for gvp_id in sorted(os.listdir(raw_dir)):
+            src = os.path.join(raw_dir, gvp_id)
+            meta_path = os.path.join(src, "meta.json")
+            if not os.path.exists(meta_path):
+                continue
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            for tab, name in (("page", "page.html"), ("history", "history.html")):
+                info = meta["pages"][name]
+                with open(os.path.join(src, name), "rb") as f:
+                    writer.add(page_key(gvp_id, tab), f.read(), info["url"], info["status"], meta["fetched_at"])
+            with open(os.path.join(src, "wiki.json"), "rb") as f:
+                writer.add(page_key(gvp_id, "wiki"), f.read(), fetched_at=meta["fetched_at"],
+                           content_type="application/json")
+            writer.add(page_key(gvp_id, "meta"), json.dumps(meta), fetched_at=meta["fetched_at"],
+                       content_type="application/json")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or maintain the raw page archive.")
+    parser.add_argument("--archive", default=ARCHIVE_FILE, help="archive path")
+    sub = parser.add_subparsers(dest="command", required=True)
+    get = sub.add_parser("get", help="print the body stored under a key, e.g. 211060/history")
+    get.add_argument("key")
+    sub.add_parser("list", help="list keys with url, status and fetch time")
+    imp = sub.add_parser("import-raw", help="import a directory of loose raw pages")
+    imp.add_argument("raw_dir")
+    sub.add_parser("reindex", help="rebuild the .idx file from the archive")
+    args = parser.parse_args()
+
+    if args.command == "get":
+        with ArchiveReader(args.archive) as reader:
+            sys.stdout.buffer.write(reader.get(args.key))
+    elif args.command == "list":
+        with ArchiveReader(args.archive) as reader:
+            for key in reader.keys():
+                meta = reader.meta(key)
+                print(f"{key}\t{meta['status']}\t{meta['fetched_at']}\t{meta['url']}")
+    elif args.command == "import-raw":
+        print(f"Imported {import_raw_dir(args.raw_dir, args.archive)} volcanoes into {args.archive}")
+    else:
+        print(f"Indexed {rebuild_index(args.archive)} entries")
+
+
+if __name__ == "__main__":
+    main()
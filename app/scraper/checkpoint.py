@@ -0,0 +1,121 @@
+import os
+import json
+import threading
+
+
+class JsonlWriter:
+    """
+    Appends one JSON object per line. Each line goes out in a single write and
+    is flushed and fsynced before write() returns, so a crash loses at most the
+    record in flight. A torn last line left by a previous crash is trimmed on open.
+    """
+    def __init__(self, path, append=True, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if append:
+            trim_partial_line(path)
+        self._file = open(path, "ab" if append else "wb")
+
+    def write(self, obj):
+        line = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def trim_partial_line(path):
+    """Truncates a file after its last newline, dropping a line a crash left half-written."""
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        pos = size
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl != -1:
+                pos = pos - step + nl + 1
+                break
+            pos -= step
+        if pos != size:
+            f.truncate(pos)
+
+
+def iter_jsonl(path, with_offsets=False):
+    """Yields the objects in a JSONL file, skipping a torn last line. Missing files yield nothing."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        offset = 0
+        for line in f:
+            start, offset = offset, offset + len(line)
+            if not line.endswith(b"\n"):
+                break
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                continue
+            yield (start, obj) if with_offsets else obj
+
+
+def load_progress(records_path, failed_path):
+    """Returns (ids that succeeded, {id: last error} for ids that failed and never succeeded)."""
+    done = {record["id"] for record in iter_jsonl(records_path)}
+    failed = {}
+    for failure in iter_jsonl(failed_path):
+        if failure["id"] not in done:
+            failed[failure["id"]] = failure.get("error", "")
+    return done, failed
+
+
+def compact(records_path, output_path, order=None):
+    """
+    Writes the final JSON array from the JSONL checkpoint, keeping the latest
+    record per id. Records follow `order` (a list of ids) when given, then any
+    remaining ids in file order. Only line offsets are held in memory, and the
+    output is written to a temp file and renamed into place. Without a
+    checkpoint there is nothing to compact: it returns 0 and leaves any
+    existing output as it is.
+    """
+    if not os.path.exists(records_path):
+        return 0
+    offsets = {}
+    for offset, record in iter_jsonl(records_path, with_offsets=True):
+        offsets[record["id"]] = offset
+
+    ids = [i for i in (order or []) if i in offsets]
+    seen = set(ids)
+    ids += [i for i in offsets if i not in seen]
+
+    tmp = output_path + ".tmp"
+    with open(records_path, "rb") as src, open(tmp, "w", encoding="utf-8") as out:
+        out.write("[")
+        for n, record_id in enumerate(ids):
+            src.seek(offsets[record_id])
+            record = json.loads(src.readline())
+            out.write(",\n  " if n else "\n  ")
+            out.write(json.dumps(record, indent=2).replace("\n", "\n  "))
+        out.write("\n]" if ids else "]")
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, output_path)
+    return len(ids)
@@ -0,0 +1,251 @@
+"""
+Timing and counter hooks for scraper runs.
+
+Stages (page fetches, the parse_* functions, validation, serialization)
+record latency histograms; the HTTP session records, per host, requests,
+bytes, status codes, retries, errors, cache hits and time spent waiting on
+the rate limiter. Everything is off until METRICS.enable(): a disabled hook is
+one attribute check, so the hooks stay in the code paths permanently.
+
+Stage times are inclusive and summed over all threads, so with several
+workers they add up to more than the wall time; compare the fetch.* and
+parse.* totals with each other to see whether a run is network- or
+parse-bound.
+"""
+import os
+import json
+import time
+import threading
+import functools
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Histogram bucket upper bounds in seconds: 10 µs doubling up to ~168 s, plus an overflow bucket.
+BUCKETS = tuple(1e-5 * 2 ** i for i in range(25))
+HOST_COUNTERS = ("requests", "bytes", "retries", "errors", "cache_hits", "revalidated")
+
+_DISABLED = nullcontext()
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimate of the q-quantile, interpolated within its bucket."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= target:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                value = lower + (upper - lower) * (target - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count, "total": self.total, "min": self.min if self.count else 0.0, "max": self.max,
+            "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99),
+            "buckets": self.counts,
+        }
+
+    def merge(self, d):
+        self.counts = [a + b for a, b in zip(self.counts, d["buckets"])]
+        self.count += d["count"]
+        self.total += d["total"]
+        if d["count"]:
+            self.min = min(self.min, d["min"])
+            self.max = max(self.max, d["max"])
+
+
+class _Host:
+    __slots__ = HOST_COUNTERS + ("statuses", "latency", "throttle")
+
+    def __init__(self):
+        for key in HOST_COUNTERS:
+            setattr(self, key, 0)
+        self.statuses = {}
+        self.latency = Histogram()
+        self.throttle = Histogram()
+
+    def to_dict(self):
+        d = {key: getattr(self, key) for key in HOST_COUNTERS}
+        d.update(statuses=dict(self.statuses), latency=self.latency.to_dict(), throttle=self.throttle.to_dict())
+        return d
+
+    def merge(self, d):
+        for key in HOST_COUNTERS:
+            setattr(self, key, getattr(self, key) + d[key])
+        for status, n in d["statuses"].items():
+            self.statuses[status] = self.statuses.get(status, 0) + n
+        self.latency.merge(d["latency"])
+        self.throttle.merge(d["throttle"])
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.hosts = {}
+            self.started = time.perf_counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        if enabled:
+            self.reset()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = Histogram()
+            hist.add(seconds)
+
+    def timer(self, stage):
+        """Context manager that records the time spent inside it under `stage`."""
+        return _Timer(self, stage) if self.enabled else _DISABLED
+
+    def timed(self, stage):
+        """Decorator form of timer()."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def _host(self, host):
+        entry = self.hosts.get(host)
+        if entry is None:
+            entry = self.hosts[host] = _Host()
+        return entry
+
+    def request(self, host, seconds, nbytes, status):
+        """One HTTP attempt: its latency, body size and status (None if it raised)."""
+        with self._lock:
+            entry = self._host(host)
+            entry.requests += 1
+            entry.bytes += nbytes
+            entry.latency.add(seconds)
+            key = str(status)
+            entry.statuses[key] = entry.statuses.get(key, 0) + 1
+
+    def count(self, host, key, n=1):
+        with self._lock:
+            entry = self._host(host)
+            setattr(entry, key, getattr(entry, key) + n)
+
+    def throttled(self, host, seconds):
+        with self._lock:
+            self._host(host).throttle.add(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "wall_seconds": time.perf_counter() - self.started,
+                "bucket_bounds": list(BUCKETS),
+                "stages": {stage: hist.to_dict() for stage, hist in sorted(self.stages.items())},
+                "hosts": {host: entry.to_dict() for host, entry in sorted(self.hosts.items())},
+            }
+
+    def drain(self):
+        """Snapshot and reset; what a worker process hands back to be merged."""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        with self._lock:
+            for stage, d in snapshot["stages"].items():
+                self.stages.setdefault(stage, Histogram()).merge(d)
+            for host, d in snapshot["hosts"].items():
+                self._host(host).merge(d)
+
+    def report(self):
+        snapshot = self.snapshot()
+        lines = [f"{'stage':28} {'calls':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} "
+                 f"{'p99 ms':>8} {'max ms':>8}"]
+        totals = {}
+        for stage, h in snapshot["stages"].items():
+            group = stage.split(".", 1)[0]
+            totals[group] = totals.get(group, 0.0) + h["total"]
+            lines.append(f"{stage:28} {h['count']:>7} {h['total']:>9.2f} {h['total'] / h['count'] * 1000:>9.2f} "
+                         f"{h['p50'] * 1000:>8.2f} {h['p95'] * 1000:>8.2f} {h['p99'] * 1000:>8.2f} "
+                         f"{h['max'] * 1000:>8.2f}")
+        if snapshot["hosts"]:
+            lines.append("")
+            lines.append(f"{'host':28} {'requests':>8} {'MB':>8} {'retries':>7} {'errors':>6} {'cached':>6} "
+                         f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'throttled s':>11}")
+            for host, d in snapshot["hosts"].items():
+                latency = d["latency"]
+                lines.append(f"{host:28} {d['requests']:>8} {d['bytes'] / 1e6:>8.2f} {d['retries']:>7} "
+                             f"{d['errors']:>6} {d['cache_hits'] + d['revalidated']:>6} "
+                             f"{latency['p50'] * 1000:>8.2f} {latency['p95'] * 1000:>8.2f} "
+                             f"{latency['p99'] * 1000:>8.2f} {d['throttle']['total']:>11.2f}")
+        summary = ", ".join(f"{group} {total:.2f}s" for group, total in sorted(totals.items()))
+        lines.append("")
+        lines.append(f"wall {snapshot['wall_seconds']:.2f}s; stage totals across threads: {summary}")
+        return "\n".join(lines)
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, path)
+
+
+METRICS = Metrics()
+timer = METRICS.timer
+timed = METRICS.timed
+
+
+def finish(path=None):
+    """Prints the summary table and writes the metrics file, if metrics are on."""
+    if not METRICS.enabled:
+        return
+    print(METRICS.report())
+    if path:
+        METRICS.save(path)
+        print(f"Wrote scrape metrics to {path}")
@@ -0,0 +1,173 @@
+"""
+Two-stage scrape: `fetch` downloads raw GVP and Wikipedia pages into the page
+archive, `parse` turns them into records on a process pool. Parsing needs no
+network, so after a parser fix the whole corpus can be re-parsed offline.
+
+    python -m app.scraper.pipeline fetch --workers 8 [--resume] [--metrics [PATH]]
+    python -m app.scraper.pipeline parse [--processes N] [--metrics [PATH]]
+"""
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from app.scraper import scraper
+from app.scraper.archive import ARCHIVE_FILE, ArchiveReader, ArchiveWriter, page_key
+from app.scraper.checkpoint import JsonlWriter, compact
+from app.scraper.metrics import METRICS, finish, timer
+
+LIST_KEY = "volcano_list"
+
+
+def fetch_volcano(volcano, writer):
+    """
+    Archives the GVP page, its Eruptive History tab and the Wikipedia page for
+    one volcano. The meta entry is written last and marks the volcano as fetched.
+    """
+    gvp_id = volcano["gvp_id"]
+    print(f"fetching {volcano['name']}...")
+
+    pages = {}
+    for tab, url in (("page", scraper.gvp_url(gvp_id)), ("history", scraper.gvp_url(gvp_id, tab=1))):
+        with timer("fetch.gvp_page" if tab == "page" else "fetch.gvp_history"):
+            resp = scraper._get(url)
+        if resp.status_code != 200:
+            raise RuntimeError(f"HTTP {resp.status_code} for {url}")
+        with timer("serialize.archive"):
+            entry = writer.add(page_key(gvp_id, tab), resp.text, url, resp.status_code, content_type="text/html")
+        pages[tab] = {"url": url, "status": resp.status_code, "fetched_at": entry["fetched_at"]}
+    wiki_page = scraper.fetch_wikipedia_page(volcano["name"])
+    url, status = scraper.wiki().source(volcano["name"])
+    with timer("serialize.archive"):
+        entry = writer.add(page_key(gvp_id, "wiki"), json.dumps(wiki_page), url, status,
+                           content_type="application/json")
+    pages["wiki"] = {"url": url, "status": status, "fetched_at": entry["fetched_at"]}
+
+    meta = dict(volcano, pages=pages, fetched_at=datetime.now(timezone.utc).isoformat())
+    writer.add(page_key(gvp_id, "meta"), json.dumps(meta), content_type="application/json")
+
+
+def fetch_stage(workers=scraper.DEFAULT_WORKERS, resume=False, archive=ARCHIVE_FILE):
+    """Downloads raw pages for every volcano in the GVP list into the archive."""
+    volcano_list = scraper.get_volcano_list()
+    with ArchiveWriter(archive) as writer:
+        writer.add(LIST_KEY, json.dumps(volcano_list), content_type="application/json")
+        todo = [v for v in volcano_list if not (resume and page_key(v["gvp_id"], "meta") in writer.keys)]
+        with timer("fetch.wikipedia_prefetch"):
+            scraper.wiki().prefetch([volcano["name"] for volcano in todo])
+        failures = []
+
+        def fetch_one(volcano):
+            try:
+                fetch_volcano(volcano, writer)
+            except Exception as e:
+                print(f"Failed {volcano['name']}: {e!r}")
+                failures.append(volcano["gvp_id"])
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            list(pool.map(fetch_one, todo))
+
+    print(f"Fetched {len(todo) - len(failures)} of {len(todo)} volcanoes into {archive}")
+    print(scraper.session().report())
+
+
+_reader = None
+
+def _open_reader(archive, metrics=False):
+    global _reader
+    _reader = ArchiveReader(archive)
+    METRICS.enable(metrics)
+
+
+def parse_volcano(gvp_id, reader):
+    """Builds the dataset record for one volcano from its archived pages. No network access."""
+    meta = reader.get_json(page_key(gvp_id, "meta"))
+    html = reader.get_text(page_key(gvp_id, "page"))
+    history_html = reader.get_text(page_key(gvp_id, "history"))
+    wiki_page = reader.get_json(page_key(gvp_id, "wiki"))
+
+    volcano = {"name": meta["name"], "gvp_id": meta["gvp_id"]}
+    gvp = scraper.get_gvp_data(volcano, html, history_html)
+    wiki = scraper.parse_wikipedia_data(wiki_page)
+    return scraper.build_record(volcano, gvp, wiki, scraped_at=meta["fetched_at"])
+
+
+def _parse_task(gvp_id):
+    """(gvp_id, record, failure, metrics): metrics is this task's snapshot when they are on, else None."""
+    record = failure = None
+    try:
+        record = parse_volcano(gvp_id, _reader)
+    except Exception as e:
+        failure = {"id": gvp_id, "error": repr(e), "stage": "parse",
+                   "failed_at": datetime.now(timezone.utc).isoformat()}
+    if record is not None:
+        with timer("validate"):
+            errors = scraper.validator().validate(record)
+        if errors:
+            record, failure = None, scraper.schema_failure(record, errors)
+    return gvp_id, record, failure, METRICS.drain() if METRICS.enabled else None
+
+
+def parse_stage(processes=None, archive=ARCHIVE_FILE, chunksize=8):
+    """Parses and schema-checks every fetched volcano across a process pool and writes the dataset."""
+    with ArchiveReader(archive) as reader:
+        volcano_list = reader.get_json(LIST_KEY)
+        ids = [v["gvp_id"] for v in volcano_list if page_key(v["gvp_id"], "meta") in reader]
+
+    parsed = failed = 0
+    with JsonlWriter(scraper.RECORDS_FILE, append=False, fsync=False) as records, \
+            JsonlWriter(scraper.FAILED_FILE, append=False, fsync=False) as failures, \
+            ProcessPoolExecutor(max_workers=processes, initializer=_open_reader,
+                                initargs=(archive, METRICS.enabled)) as pool:
+        for gvp_id, record, failure, metrics in pool.map(_parse_task, ids, chunksize=chunksize):
+            if metrics:
+                METRICS.merge(metrics)
+            if failure:
+                print(f"Failed to parse {gvp_id}: {failure['error']}")
+                failures.write(failure)
+                failed += 1
+            else:
+                with timer("serialize.record"):
+                    records.write(record)
+                parsed += 1
+
+    with timer("serialize.compact"):
+        count = compact(scraper.RECORDS_FILE, scraper.OUTPUT_FILE, order=[v["gvp_id"] for v in volcano_list])
+    print(f"Parsed {parsed} volcanoes ({failed} failed, {len(volcano_list) - len(ids)} not fetched)")
+    print(f"Saved {count} volcanoes to {scraper.OUTPUT_FILE}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch raw volcano pages, or parse them into the dataset.")
+    sub = parser.add_subparsers(dest="stage", required=True)
+
+    fetch = sub.add_parser("fetch", help="download raw GVP and Wikipedia pages")
+    fetch.add_argument("--workers", type=int, default=scraper.DEFAULT_WORKERS, help="volcanoes fetched concurrently")
+    fetch.add_argument("--gvp-rate", type=float, default=scraper.GVP_RATE, help="max requests per second to GVP")
+    fetch.add_argument("--wiki-rate", type=float, default=scraper.WIKI_RATE, help="max requests per second to Wikipedia")
+    fetch.add_argument("--resume", action="store_true", help="skip volcanoes already fetched")
+
+    parse = sub.add_parser("parse", help="parse raw pages into the dataset (offline)")
+    parse.add_argument("--processes", type=int, default=None, help="parser processes (default: all cores)")
+
+    for p in (fetch, parse):
+        p.add_argument("--archive", default=ARCHIVE_FILE, help="page archive path")
+        p.add_argument("--metrics", nargs="?", const=scraper.METRICS_FILE, default=None, metavar="PATH",
+                       help="time each stage, print a summary and write it as JSON")
+    args = parser.parse_args()
+
+    METRICS.enable(args.metrics is not None)
+
+    if args.stage == "fetch":
+        scraper.session().set_pool_size(max(args.workers, 1))
+        scraper.rate_limiter().set_rate(urlsplit(scraper.GVP_BASE).netloc, args.gvp_rate)
+        scraper.rate_limiter().set_rate(scraper.WIKI_HOST, args.wiki_rate)
+        fetch_stage(workers=args.workers, resume=args.resume, archive=args.archive)
+    else:
+        parse_stage(processes=args.processes, archive=args.archive)
+    finish(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,87 @@
 import os
 import json
-import time
-import requests
-import wikipediaapi
-from bs4 import BeautifulSoup
+import argparse
+import threading
+import functools
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, UTC, timezone
 from pathlib import Path, PurePath
+from urllib.parse import urlsplit
 import re
 
-GVP_BASE = "https://volcano.si.edu"
-WIKI_API = wikipediaapi.Wikipedia(user_agent = "volcanoz-bot/0.1 (https://yourdomain.com; contact@example.com)", language='en' )
+from app.dataset.validator import load_validator
+from app.scraper.checkpoint import JsonlWriter, compact, load_progress
+from app.scraper.metrics import METRICS, finish, timed, timer
+from app.scraper.throttle import HostRateLimiter
+from app.scraper.wiki import WIKI_API_URL, WikiClient
+
+GVP_BASE = os.environ.get("VOLCANOZ_GVP_BASE", "https://volcano.si.edu")
+WIKI_HOST = urlsplit(WIKI_API_URL).netloc
 
 OUTPUT_FILE = os.path.join(os.path.dirname(__file__), '../dataset/volcanoes.json')
+RECORDS_FILE = os.path.join(os.path.dirname(__file__), '../dataset/volcanoes.jsonl')
+FAILED_FILE = os.path.join(os.path.dirname(__file__), '../dataset/volcanoes.failed.jsonl')
+METRICS_FILE = os.path.join(os.path.dirname(__file__), '../dataset/scrape_metrics.json')
+CACHE_DIR = os.environ.get("VOLCANOZ_CACHE_DIR", os.path.join(os.path.dirname(__file__), '../dataset/http_cache'))
 
 
 HEADERS = {"User-Agent": "volcanoz-bot/0.1 (https://yourdomain.com; contact@example.com)"}
 
+# Requests per second allowed per host; GVP and Wikipedia are throttled independently.
+GVP_RATE = 2.0
+WIKI_RATE = 10.0
+DEFAULT_WORKERS = 8
+
+# "lxml" is faster if installed; the strainers limit tree building to the subtrees the parsers read.
+HTML_PARSER = os.environ.get("VOLCANOZ_HTML_PARSER", "html.parser")
+GVP_PAGE_STRAINER = SoupStrainer(["div", "table"], attrs={"class": ["volcano-info-table", "tabbed-content", "DivTable"]})
+HISTORY_STRAINER = SoupStrainer("div", attrs={"class": "eruption-accordion"})
+# Event type -> impact line, in priority order.
+IMPACTS = (
+    ("Ashfall", "Ashfall affecting nearby areas"),
+    ("Property Damage", "Property damage reported"),
+    ("Evacuation", "Evacuations reported"),
+    ("Lava flow", "Lava flows impacting local areas"),
+    ("Lava fountains", "Lava flows impacting local areas"),
+    ("Explosion", "Explosive activity reported"),
+)
+SYNONYMS_TABLE_TITLE = "Synonyms and Subfeatures table for this volcano"
+
+
+def _lazy(factory):
+    """Builds factory() on the first call only and returns that same object afterwards (thread-safe)."""
+    lock = threading.Lock()
+    built = []
+
+    @functools.wraps(factory)
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(factory())
+        return built[0]
+    return get
+
+# The HTTP clients and the schema validator are created on first use, so importing this
+# module (the parse stage, the CLI) does not load requests or open connection pools.
+@_lazy
+def rate_limiter():
+    return HostRateLimiter({urlsplit(GVP_BASE).netloc: GVP_RATE, WIKI_HOST: WIKI_RATE})
+
+@_lazy
+def session():
+    from app.scraper.session import CachedSession
+    return CachedSession(CACHE_DIR, headers=HEADERS, rate_limiter=rate_limiter(), pool_size=DEFAULT_WORKERS)
+
+@_lazy
+def wiki():
+    return WikiClient(session())
+
+@_lazy
+def validator():
+    return load_validator()
+
 def init_data():
     return {
         "name": "",
@@ -58,11 +124,20 @@ class DateTimeEncoder(json.JSONEncoder):
             return o.isoformat() + "Z"
         return super().default(o)
 
+def _get(url):
+    """GET through the shared pooled session and response cache."""
+    return session().get(url)
+
 def get_volcano_list() -> list:
-    volcanoes = []
     url = f"{GVP_BASE}/volcanolist_holocene.cfm?sortnum=4"
-    resp = requests.get(url, headers=HEADERS)
-    soup = BeautifulSoup(resp.text, 'html.parser')
+    with timer("fetch.volcano_list"):
+        resp = _get(url)
+    return parse_volcano_list(resp.text)
+
+@timed("parse.volcano_list")
+def parse_volcano_list(html) -> list:
+    volcanoes = []
+    soup = BeautifulSoup(html, 'html.parser')
     
     table = soup.find('div', attrs={'class':'TableSearchResults'})
     if not table:
@@ -92,40 +167,109 @@ def get_volcano_list() -> list:
     print(f"Found {len(volcanoes)} volcanoes.")
     return volcanoes
 
+def _parse_basic_row(cells, data):
+    """Maps the <strong> labels of a two-cell Basic Data row to their values."""
+    label_cell, value_cell = cells
+    labels = [strong.get_text(strip=True) for strong in label_cell.find_all("strong") if strong.get_text(strip=True)]
+    values = [v.strip() for v in value_cell.get_text().split("\n") if v.strip()]
+    
+    # Map labels to values for Basic Data
+    if labels and values and len(labels) == len(values):
+        for label, value in zip(labels, values):
+            if label == "Elevation":
+                data["elevation_m"] = _parse_elevation(value)
+            elif label == "Last Known Eruption":
+                data["last_known_eruption"] = value
+            elif label == "Latitude":
+                lat = _parse_coordinate(value)
+                if lat is not None:
+                    data["location"]["coordinates"][0] = lat
+            elif label == "Longitude":
+                lon = _parse_coordinate(value)
+                if lon is not None:
+                    data["location"]["coordinates"][1] = lon
+            elif label == "Within 5 km":
+                data["population"]["within_5km"] = value
+            elif label == "Within 10 km":
+                data["population"]["within_10km"] = value 
+            elif label == "Within 30 km":
+                data["population"]["within_30km"] = value
+            elif label == "Within 100 km":
+                data["population"]["within_100km"] = value
+
+def _labelled_cell(cells):
+    """Returns (label, text) for a colspan=2 cell that starts with a <strong> label, else None."""
+    cell = next((c for c in cells if c.get("colspan") == "2"), None)
+    if cell:
+        strong = cell.find("strong")
+        if strong:
+            label = strong.get_text(strip=True)
+            return label, cell.get_text(strip=True).replace(label, "").strip()
+    return None
+
+def _parse_rock_types_row(cells, data):
+    labelled = _labelled_cell(cells)
+    if labelled:
+        label, text = labelled
+        if label == "Major":
+            data["rock_types"]["major"] = [t.strip() for t in text.split("\n") if t.strip()]
+        elif label == "Minor":
+            data["rock_types"]["minor"] = [t.strip() for t in text.split("\n") if t.strip()]
+
+def _parse_morphology_row(cells, data):
+    labelled = _labelled_cell(cells)
+    if labelled:
+        label, text = labelled
+        if label == "Volcano Landform":
+            data["volcano_landform"] = text
+        elif label == "Volcano Types":
+            types = [t.strip() for t in text.split("\n") if t.strip()]
+            data["volcano_types"] = types
+
+# Sections of the Basic Data table whose content sits in the two rows after their <h5> heading.
+SECTION_ROW_PARSERS = {
+    "Rock Types": _parse_rock_types_row,
+    "Morphology": _parse_morphology_row
+}
+
+def _section_rows(rows, section):
+    """Yields the (up to) two rows following each row whose <h5> mentions `section`."""
+    for i, row in enumerate(rows):
+        if row.find("h5", string=lambda x: x and section in x):
+            yield from rows[i + 1:i + 3]
+
+@timed("parse.fact_table")
+def parse_fact_table(fact_table, data):
+    """
+    Single-pass equivalent of parse_basic_data, parse_rock_types and
+    parse_morphology: walks the Basic Data rows once and hands each row to
+    the Basic Data handler and to any section whose heading it follows.
+    """
+    active = []
+    for row in fact_table.select("tbody tr"):
+        cells = row.find_all("td")
+        if len(cells) == 2:
+            _parse_basic_row(cells, data)
+        for pending in active:
+            pending[0](cells, data)
+            pending[1] -= 1
+        active = [pending for pending in active if pending[1]]
+
+        headings = [h5.string for h5 in row.find_all("h5")]
+        for section, handler in SECTION_ROW_PARSERS.items():
+            if any(h and section in h for h in headings):
+                active.append([handler, 2])
+
+@timed("parse.basic_data")
 def parse_basic_data(fact_table, data):
     """Extracts elevation_m, last_known_eruption, latitude, longitude, population."""
     for row in fact_table.select("tbody tr"):
             cells = row.find_all("td")
             if len(cells) == 2:
-                label_cell, value_cell = cells
-                labels = [strong.get_text(strip=True) for strong in label_cell.find_all("strong") if strong.get_text(strip=True)]
-                values = [v.strip() for v in value_cell.get_text().split("\n") if v.strip()]
-                
-                # Map labels to values for Basic Data
-                if labels and values and len(labels) == len(values):
-                    for label, value in zip(labels, values):
-                        if label == "Elevation":
-                            data["elevation_m"] = _parse_elevation(value)
-                        elif label == "Last Known Eruption":
-                            data["last_known_eruption"] = value
-                        elif label == "Latitude":
-                            lat = _parse_coordinate(value)
-                            if lat is not None:
-                                data["location"]["coordinates"][0] = lat
-                        elif label == "Longitude":
-                            lon = _parse_coordinate(value)
-                            if lon is not None:
-                                data["location"]["coordinates"][1] = lon
-                        elif label == "Within 5 km":
-                            data["population"]["within_5km"] = value
-                        elif label == "Within 10 km":
-                            data["population"]["within_10km"] = value 
-                        elif label == "Within 30 km":
-                            data["population"]["within_30km"] = value
-                        elif label == "Within 100 km":
-                            data["population"]["within_100km"] = value
+                _parse_basic_row(cells, data)
                     
     
+@timed("parse.geological_summary")
 def parse_geological_summary(fact_table, data):
     """Extracts summary from Geological Summary."""
     rows = fact_table.select("tbody tr")
@@ -141,48 +285,25 @@ def parse_geological_summary(fact_table, data):
                         data["summary"]= p_tag.get_text(strip=True)
             
 
+@timed("parse.rock_types")
 def parse_rock_types(fact_table, data):
     """Extracts major and minor rock types from Rock Types section."""
-    rows = fact_table.select("tbody tr")
-    for i, row in enumerate(rows):
-        if row.find("h5", string=lambda x: x and "Rock Types" in x):
-            # Check next rows for Major and Minor
-            for j in range(i + 1, min(i + 3, len(rows))):  # Look at next 2 rows
-                next_row = rows[j]
-                cell = next_row.find("td", attrs={"colspan": "2"})
-                if cell:
-                    strong = cell.find("strong")
-                    if strong:
-                        label = strong.get_text(strip=True)
-                        text = cell.get_text(strip=True).replace(label, "").strip()
-                        if label == "Major":
-                            data["rock_types"]["major"] = [t.strip() for t in text.split("\n") if t.strip()]
-                        elif label == "Minor":
-                            data["rock_types"]["minor"] = [t.strip() for t in text.split("\n") if t.strip()]
+    for row in _section_rows(fact_table.select("tbody tr"), "Rock Types"):
+        _parse_rock_types_row(row.find_all("td"), data)
     
+@timed("parse.morphology")
 def parse_morphology(fact_table, data):
     """Extracts volcano_landform and volcano_types from Morphology section."""
-    rows = fact_table.select("tbody tr")
-    for i, row in enumerate(rows):
-        if row.find("h5", string=lambda x: x and "Morphology" in x):
-            # Check next rows for Volcano Landform and Volcano Types
-            for j in range(i + 1, min(i + 3, len(rows))):  # Look at next 2 rows
-                next_row = rows[j]
-                cell = next_row.find("td", attrs={"colspan": "2"})
-                if cell:
-                    strong = cell.find("strong")
-                    if strong:
-                        label = strong.get_text(strip=True)
-                        text = cell.get_text(strip=True).replace(label, "").strip()
-                        if label == "Volcano Landform":
-                            data["volcano_landform"] = text
-                        elif label == "Volcano Types":
-                            types = [t.strip() for t in text.split("\n") if t.strip()]
-                            data["volcano_types"] = types
+    for row in _section_rows(fact_table.select("tbody tr"), "Morphology"):
+        _parse_morphology_row(row.find_all("td"), data)
  
-def parse_synonyms(soup, data):
+def find_synonyms_table(soup):
+    return soup.find("table", class_="DivTable", attrs={"title": SYNONYMS_TABLE_TITLE})
+
+@timed("parse.synonyms")
+def parse_synonyms(soup, data, synonyms_table=None):
     """Extracts alternate_names from Synonyms section."""
-    synonyms_table = soup.find("table", class_="DivTable", attrs={"title": "Synonyms and Subfeatures table for this volcano"})
+    synonyms_table = synonyms_table or find_synonyms_table(soup)
     if not synonyms_table:
         return
 
@@ -198,10 +319,11 @@ def parse_synonyms(soup, data):
                     data["alternate_names"] = synonyms
 
 
-def parse_features(soup, data):
+@timed("parse.features")
+def parse_features(soup, data, synonyms_table=None):
     """Extracts features (Cones, Craters, Domes, Thermal Features) from Subfeatures section."""
     data["features"] = {"Cones": [], "Craters": [], "Domes": [], "Thermal Features": []}
-    synonyms_table = soup.find("table", class_="DivTable", attrs={"title": "Synonyms and Subfeatures table for this volcano"})
+    synonyms_table = synonyms_table or find_synonyms_table(soup)
     if not synonyms_table:
         return
 
@@ -236,6 +358,7 @@ def parse_features(soup, data):
                 data["features"][current_category].append(feature)
 
 
+@timed("parse.volcano_info_table")
 def parse_volcano_info_table(soup, data):
     """Extracts country and volcanic_region from volcano-info-table."""
     info_table = soup.find("div", class_="volcano-info-table")
@@ -249,12 +372,24 @@ def parse_volcano_info_table(soup, data):
             if volcanic_region:
                 data["location"]["region"] = volcanic_region
 
-def parse_eruption_history(volcano, data):
-    """Extracts detailed eruption history from Eruptive History section."""
-    history_url = f"{GVP_BASE}/volcano.cfm?vn={volcano['gvp_id']}&tab=1"
-    time.sleep(1)
-    resp = requests.get(history_url, headers=HEADERS)
-    soup = BeautifulSoup(resp.text, 'html.parser')
+def gvp_url(gvp_id, tab=None):
+    url = f"{GVP_BASE}/volcano.cfm?vn={gvp_id}"
+    return f"{url}&tab={tab}" if tab is not None else url
+
+def infer_impact(event_types):
+    """The impact line for a period: that of the first event type in IMPACTS that occurred, or None."""
+    return next((impact for event_type, impact in IMPACTS if event_type in event_types), None)
+
+@timed("parse.eruption_history")
+def parse_eruption_history(volcano, data, html=None):
+    """
+    Extracts detailed eruption history from Eruptive History section.
+    The page is fetched unless its HTML is passed in.
+    """
+    history_url = gvp_url(volcano['gvp_id'], tab=1)
+    if html is None:
+        html = fetch_history_page(volcano)
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=HISTORY_STRAINER)
     
     eruption_accordion = soup.find("div", class_="eruption-accordion")
     if not eruption_accordion:
@@ -267,35 +402,23 @@ def parse_eruption_history(volcano, data):
             "vei": None,
             "episodes": []
         }
-        impact = None
         event_types = set()
 
-        # Extract period details
+        # Extract period details: the date range, then a type span and/or a "Max VEI" span
         period_text = header.get_text(strip=True)
         spans = header.find_all("span")
-
-        if spans:
-            eruption_type_raw = spans[0].get_text(strip=True)
-            if eruption_type_raw:
-                # Safe split using non-empty separator
-                date_range = period_text.split(eruption_type_raw)[0].strip()
-                period["eruption_type"] = eruption_type_raw.replace("Confirmed Eruption ", "").strip("()")
-            else:
-                # Fallback: treat the whole text as date range
-                date_range = period_text.strip()
-                period["eruption_type"] = ""
-        else:
-            # No spans found: fallback again
-            date_range = period_text.strip()
-            period["eruption_type"] = ""
-
-        period["date_range"] = date_range
-
-        # VEI
-        vei_text = spans[1].get_text(strip=True) if len(spans) > 1 else ""
-        vei_match = re.search(r"VEI: (\d+)", vei_text)
-        if vei_match:
-            period["vei"] = int(vei_match.group(1))
+        date_range = period_text
+        for span in spans:
+            span_text = span.get_text(strip=True)
+            if not span_text:
+                continue
+            date_range = date_range.split(span_text)[0]
+            vei_match = re.search(r"VEI: (\d+)", span_text)
+            if vei_match:
+                period["vei"] = int(vei_match.group(1))
+            elif not period["eruption_type"]:
+                period["eruption_type"] = span_text.replace("Confirmed Eruption ", "").strip("()")
+        period["date_range"] = date_range.strip()
 
         # Find corresponding content
         content = header.find_next_sibling("div", class_="EruptionAccordionContent")
@@ -335,8 +458,9 @@ def parse_eruption_history(volcano, data):
 
             # Extract events
             events_table = episode_table.find("div", class_="EventsTable")
-            if events_table:
-                for row in events_table.find("tbody").find_all("tr"):
+            tbody = events_table.find("tbody") if events_table else None
+            if tbody:
+                for row in tbody.find_all("tr"):
                     cells = row.find_all("td")
                     if len(cells) >= 5:
                         event = {
@@ -348,37 +472,34 @@ def parse_eruption_history(volcano, data):
                         episode["events"].append(event)
                         event_types.add(event["event_type"])
 
-            period["episodes"].append({
-                "summary": episode_table.get_text(strip=True)
-            })
-
-        # Infer impact
-        if "Ashfall" in event_types:
-            impact = "Ashfall affecting nearby areas"
-        elif "Property Damage" in event_types:
-            impact = "Property damage reported"
-        elif "Evacuation" in event_types:
-            impact = "Evacuations reported"
-        elif any(t in event_types for t in ["Lava flow", "Lava fountains"]):
-            impact = "Lava flows impacting local areas"
-        elif "Explosion" in event_types:
-            impact = "Explosive activity reported"
+            period["episodes"].append(episode)
 
         data["eruption_history"].append({
             "period": period,
-            "impact": impact,
+            "impact": infer_impact(event_types),
             "sources": [history_url]
         })
         
-def get_gvp_data(volcano):
-    gvp_url = f"{GVP_BASE}/volcano.cfm?vn={volcano['gvp_id']}"
-    resp = requests.get(gvp_url, headers=HEADERS)
-    soup = BeautifulSoup(resp.text, 'html.parser')
+def fetch_history_page(volcano):
+    with timer("fetch.gvp_history"):
+        return _get(gvp_url(volcano['gvp_id'], tab=1)).text
+
+def get_gvp_data(volcano, html=None, history_html=None):
+    """
+    Builds the GVP part of a record from the volcano page and its Eruptive
+    History tab. Pages are fetched unless their HTML is passed in.
+    """
+    url = gvp_url(volcano['gvp_id'])
+    if html is None:
+        with timer("fetch.gvp_page"):
+            html = _get(url).text
+    with timer("parse.gvp_soup"):
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=GVP_PAGE_STRAINER)
     
     data = init_data()
     data["name"] = volcano.get("name")
     data["gvp_id"] = volcano.get("gvp_id")
-    data["source"] = gvp_url
+    data["source"] = url
 
     parse_volcano_info_table(soup, data)
     # Find all tabbed-content divs
@@ -387,19 +508,22 @@ def get_gvp_data(volcano):
         print(f"No tabbed-content found for {volcano["name"]}")
         return data
     
-    basic_table = get_fact_table_by_heading(content_areas, "Basic Data")
+    fact_tables = get_fact_tables(content_areas, ("Basic Data", "Geological Summary"))
+    basic_table = fact_tables.get("Basic Data")
     if basic_table:
-        parse_basic_data(basic_table, data)
-        parse_rock_types(basic_table, data)
-        parse_morphology(basic_table, data)
+        parse_fact_table(basic_table, data)
     
-    summary_table = get_fact_table_by_heading(content_areas, "Geological Summary")
+    summary_table = fact_tables.get("Geological Summary")
     if summary_table:
         parse_geological_summary(summary_table, data)
     
-    parse_synonyms(soup, data)
-    parse_features(soup, data)
-    parse_eruption_history(volcano, data)
+    synonyms_table = find_synonyms_table(soup)
+    parse_synonyms(soup, data, synonyms_table)
+    parse_features(soup, data, synonyms_table)
+    # Fetched here rather than inside parse_eruption_history so its parse time excludes the download.
+    if history_html is None:
+        history_html = fetch_history_page(volcano)
+    parse_eruption_history(volcano, data, history_html)
     
     return data
 
@@ -415,22 +539,61 @@ def get_fact_table_by_heading(content_areas, heading: str):
             if h5 and heading.lower() in h5.text.strip().lower():
                 return table
     return None    
+
+def get_fact_tables(content_areas, headings):
+    """
+    Single-pass version of get_fact_table_by_heading for several headings.
+    Returns {heading: first matching <table>} for the headings that were found.
+    """
+    found = {}
+    for content_area in content_areas:
+        for table in content_area.find_all("table", class_="DivTable", attrs={'role':'presentation'}):
+            h5 = table.find("h5")
+            if not h5:
+                continue
+            text = h5.text.strip().lower()
+            for heading in headings:
+                if heading not in found and heading.lower() in text:
+                    found[heading] = table
+            if len(found) == len(headings):
+                return found
+    return found
             
+@timed("fetch.wikipedia")
+def fetch_wikipedia_page(volcano_name):
+    """
+    Returns the raw Wikipedia content get_wikipedia_data parses: the page
+    wikitext and plain-text summary. Served from memory after wiki().prefetch.
+    """
+    return wiki().page(volcano_name)
+
+def _template_end(wikitext, start):
+    """Index just past the {{template}} opening at `start`, skipping nested templates."""
+    depth = 0
+    for match in re.finditer(r"\{\{|\}\}", wikitext[start:]):
+        depth += 1 if match.group() == "{{" else -1
+        if depth == 0:
+            return start + match.end()
+    return len(wikitext)
+
 def get_wikipedia_data(volcano_name):
-    page = WIKI_API.page(volcano_name)
-    if not page.exists():
+    return parse_wikipedia_data(fetch_wikipedia_page(volcano_name))
+
+@timed("parse.wikipedia")
+def parse_wikipedia_data(page):
+    """Extracts summary, coordinates, elevation and status from fetch_wikipedia_page output."""
+    if not page["exists"]:
         return {"summary": "", "volcano_type": "unknown", "status": "unknown", "location": {"coordinates": [0.0, 0.0]}, "elevation_m": None}
     
     infobox = {}
-    wikitext = page.text
+    wikitext = page["text"]
     infobox_start = wikitext.find("{{Infobox")
     if infobox_start != -1:
-        infobox_end = wikitext.find("}}", infobox_start)
-        infobox_text = wikitext[infobox_start:infobox_end + 2]
+        infobox_text = wikitext[infobox_start:_template_end(wikitext, infobox_start)]
         for line in infobox_text.split("\n"):
             if "=" in line:
                 key, value = line.split("=", 1)
-                key = key.strip().replace("|", "").lower()
+                key = key.replace("|", "").strip().lower()
                 value = value.strip()
                 infobox[key] = value
     
@@ -464,67 +627,123 @@ def get_wikipedia_data(volcano_name):
             pass
     
     return {
-        "summary": page.summary,
+        "summary": page["summary"],
         "volcano_type": volcano_type,
         "status": status,
         "location": {"coordinates": coordinates},
         "elevation_m": elevation_m
     }
     
-def scrape_all():
-    volcanoes = []
+def schema_failure(record, errors):
+    """Failure log entry for a record that does not match the dataset schema."""
+    return {
+        "id": record.get("id"),
+        "name": record.get("name"),
+        "error": f"{len(errors)} schema violation(s)",
+        "stage": "validate",
+        "errors": [f"{path}: {message}" for path, message in errors],
+        "failed_at": datetime.now(timezone.utc).isoformat()
+    }
+
+def scrape_volcano(volcano):
+    """Scrapes GVP and Wikipedia for one volcano and merges them into a dataset record."""
+    print(f"scraping {volcano["name"]}...")
+
+    gvp = get_gvp_data(volcano)
+    wiki = get_wikipedia_data(volcano["name"])
+    return build_record(volcano, gvp, wiki)
+
+def build_record(volcano, gvp, wiki, scraped_at=None):
+    """
+    Merges parsed GVP and Wikipedia data into a dataset record. scraped_at
+    (an ISO 8601 UTC time, now by default) is written with a Z suffix.
+    """
+    scraped_at = (scraped_at or datetime.now(timezone.utc).isoformat()).replace("+00:00", "Z")
+    volcano_data = {
+        "id" : volcano["gvp_id"],
+        "name": volcano["name"],
+        "alternate_names": gvp["alternate_names"],
+        "summary": wiki["summary"] or gvp["summary"],
+        "location": {
+            "country": gvp["location"]["country"],
+            "region": gvp["location"]["region"],
+            "coordinates": wiki["location"]["coordinates"] if wiki["location"]["coordinates"] != [0.0, 0.0] else gvp["location"]["coordinates"]
+        },
+        "elevation_m": wiki["elevation_m"] if wiki["elevation_m"] is not None else gvp["elevation_m"],
+        "status": wiki["status"],
+        "last_known_eruption": gvp["last_known_eruption"],
+        "population": gvp["population"],
+        "rock_types": gvp["rock_types"],
+        "volcano_types": gvp["volcano_types"],
+        "volcano_landform": gvp["volcano_landform"],
+        "features": gvp["features"],
+        "eruption_history": gvp["eruption_history"],
+        "sources": [gvp["source"]],
+        "scraped_at": scraped_at
+        }
+    return volcano_data
+
+def scrape_all(workers=1, resume=False, retry_failed=False):
+    """
+    Scrapes every Holocene volcano. Each record is appended to RECORDS_FILE as
+    soon as it is built and passes the schema check; failures and records
+    that violate volcano.schema.json go to FAILED_FILE, so an interrupted run
+    can be resumed: with resume=True volcanoes that already succeeded are
+    skipped, and retry_failed=True limits the run to the ones that failed.
+    With workers > 1 volcanoes are scraped on a thread pool under the per-host
+    rate limits. The final OUTPUT_FILE is compacted in volcano-list order, so
+    it matches a sequential run.
+    """
     volcano_list = get_volcano_list()
 
-    for volcano in volcano_list:
-        print(f"scraping {volcano["name"]}...")
-        
-        gvp = get_gvp_data(volcano)
-        wiki = get_wikipedia_data(volcano["name"])
-        
-        volcano_data = {
-            "id" : volcano["gvp_id"],
-            "name": volcano["name"],
-            "alternate_names": gvp["alternate_names"],
-            "summary": wiki["summary"] or gvp["summary"],
-            "location": {
-                "country": gvp["location"]["country"],
-                "region": gvp["location"]["region"],
-                "coordinates": wiki["location"]["coordinates"] if wiki["location"]["coordinates"] != [0.0, 0.0] else gvp["location"]["coordinates"]
-            },
-            "elevation_m": wiki["elevation_m"] if wiki["elevation_m"] is not None else gvp["elevation_m"],
-            "status": wiki["status"],
-            "last_known_eruption": gvp["last_known_eruption"],
-            "population": gvp["population"],
-            "rock_types": gvp["rock_types"],
-            "volcano_types": gvp["volcano_types"],
-            "volcano_landform": gvp["volcano_landform"],
-            "features": gvp["features"],
-            "eruption_history": gvp["eruption_history"],
-            "sources": [gvp["source"]],
-            "scraped_at": datetime.now(timezone.utc).isoformat() + "Z"
-            }
-        def check_serializable(obj, path=""):
-            if isinstance(obj, (datetime, set, bytes)):
-                print(f"Found non-serializable {type(obj).__name__} at {path}: {obj}")
-            elif isinstance(obj, dict):
-                for key, value in obj.items():
-                    check_serializable(value, f"{path}.{key}" if path else key)
-            elif isinstance(obj, list):
-                for i, value in enumerate(obj):
-                    check_serializable(value, f"{path}[{i}]" if path else f"[{i}]")
-        
-        check_serializable(volcano_data)
-        
-        volcanoes.append(volcano_data)
-        time.sleep(1)
-    
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(volcanoes, f, indent=2)
-    
-    print(f"Saved {len(volcanoes)} volcanoes to {OUTPUT_FILE}")
- 
- 
- 
+    todo = volcano_list
+    if resume or retry_failed:
+        done, failed = load_progress(RECORDS_FILE, FAILED_FILE)
+        todo = [v for v in volcano_list if v["gvp_id"] not in done]
+        if retry_failed:
+            todo = [v for v in todo if v["gvp_id"] in failed]
+        print(f"Resuming: {len(done)} done, {len(failed)} failed, {len(todo)} to scrape.")
+    with timer("fetch.wikipedia_prefetch"):
+        wiki().prefetch([volcano["name"] for volcano in todo])
+
+    append = resume or retry_failed
+    with JsonlWriter(RECORDS_FILE, append=append) as records, JsonlWriter(FAILED_FILE, append=append) as failures:
+        def scrape_one(volcano):
+            try:
+                record = scrape_volcano(volcano)
+            except Exception as e:
+                print(f"Failed {volcano['name']}: {e!r}")
+                failures.write({
+                    "id": volcano["gvp_id"],
+                    "name": volcano["name"],
+                    "error": repr(e),
+                    "failed_at": datetime.now(timezone.utc).isoformat()
+                })
+                return
+            with timer("validate"):
+                errors = validator().validate(record)
+            if errors:
+                print(f"Invalid {volcano['name']}: {errors[0][0]}: {errors[0][1]}")
+                failures.write(schema_failure(record, errors))
+                return
+            with timer("serialize.record"):
+                records.write(record)
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(scrape_one, todo))
+        else:
+            for volcano in todo:
+                scrape_one(volcano)
+
+    with timer("serialize.compact"):
+        count = compact(RECORDS_FILE, OUTPUT_FILE, order=[v["gvp_id"] for v in volcano_list])
+    _, failed = load_progress(RECORDS_FILE, FAILED_FILE)
+    print(f"Saved {count} volcanoes to {OUTPUT_FILE} ({len(failed)} failed, see {FAILED_FILE})")
+    print(session().report())
+
+
+
 def _parse_coordinate(coor_str):
     """
     Converts a coordinate like '37.748°N' to float 37.748, or '14.999°E' to 14.999
@@ -553,5 +772,33 @@ def _parse_elevation(ele_str):
     except ValueError:
         return None
         
+def main():
+    parser = argparse.ArgumentParser(description="Scrape Holocene volcanoes from GVP and Wikipedia.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="volcanoes scraped concurrently (1 = sequential)")
+    parser.add_argument("--gvp-rate", type=float, default=GVP_RATE, help="max requests per second to GVP")
+    parser.add_argument("--wiki-rate", type=float, default=WIKI_RATE, help="max requests per second to Wikipedia")
+    parser.add_argument("--offline", action="store_true", help="serve pages from the response cache only")
+    parser.add_argument("--resume", action="store_true", help="skip volcanoes already saved in the JSONL checkpoint")
+    parser.add_argument("--retry-failed", action="store_true", help="only re-scrape volcanoes that failed last time")
+    parser.add_argument("--compact", action="store_true", help="only rebuild the JSON output from the JSONL checkpoint")
+    parser.add_argument("--metrics", nargs="?", const=METRICS_FILE, default=None, metavar="PATH",
+                        help=f"time each stage, print a summary and write it as JSON (default {METRICS_FILE})")
+    args = parser.parse_args()
+
+    if args.compact:
+        if not os.path.exists(RECORDS_FILE):
+            raise SystemExit(f"No checkpoint at {RECORDS_FILE}; run a scrape first")
+        count = compact(RECORDS_FILE, OUTPUT_FILE)
+        print(f"Saved {count} volcanoes to {OUTPUT_FILE}")
+        return
+
+    session().offline = args.offline
+    session().set_pool_size(max(args.workers, 1))
+    rate_limiter().set_rate(urlsplit(GVP_BASE).netloc, args.gvp_rate)
+    rate_limiter().set_rate(WIKI_HOST, args.wiki_rate)
+    METRICS.enable(args.metrics is not None)
+    scrape_all(workers=args.workers, resume=args.resume, retry_failed=args.retry_failed)
+    finish(args.metrics)
+
 if __name__ == "__main__":
-    scrape_all()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from app.scraper.metrics import METRICS
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Session counters that are also kept per host when metrics are on.
+HOST_METRICS = {"hits": "cache_hits", "revalidated": "revalidated", "errors": "errors"}
+
+
+class OfflineCacheMiss(Exception):
+    """Raised in offline mode when a URL has never been cached."""
+
+
+class CachedResponse:
+    """The subset of requests.Response the parsers use, backed by the disk cache."""
+    def __init__(self, url, status_code, content, encoding=None, headers=None, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers or {}
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class CachedSession:
+    """
+    Pooled HTTP session with a persistent per-URL response cache.
+
+    Cached pages are revalidated with If-None-Match / If-Modified-Since and a 304
+    is answered from disk. In offline mode cached pages are served without any
+    network access at all. Hits, misses and errors are counted for the run.
+    """
+    def __init__(self, cache_dir, headers=None, rate_limiter=None, pool_size=10,
+                 offline=False, max_retries=3, timeout=30):
+        self.cache_dir = cache_dir
+        self.rate_limiter = rate_limiter
+        self.offline = offline
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        self.set_pool_size(pool_size)
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def set_pool_size(self, pool_size):
+        """Keeps up to `pool_size` connections alive per host (one per worker thread)."""
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _count(self, key, url):
+        with self._lock:
+            self.stats[key] += 1
+        if METRICS.enabled and key in HOST_METRICS:
+            METRICS.count(urlsplit(url).netloc, HOST_METRICS[key])
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".body", base + ".json"
+
+    def _load(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def _store(self, url, resp, body):
+        body_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        meta = {
+            "url": url,
+            "status": resp.status_code,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_type": resp.headers.get("Content-Type"),
+            "encoding": resp.encoding or resp.apparent_encoding,
+            "fetched_at": datetime.now(timezone.utc).isoformat()
+        }
+        # Body first, metadata last: a page only counts as cached once both exist.
+        for path, data, mode in ((body_path, body, "wb"), (meta_path, json.dumps(meta), "w")):
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, mode) as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return meta
+
+    def _request(self, url, headers):
+        host = urlsplit(url).netloc if METRICS.enabled else None
+        for attempt in range(self.max_retries + 1):
+            if attempt and host:
+                METRICS.count(host, "retries")
+            if self.rate_limiter:
+                waited = time.perf_counter()
+                self.rate_limiter.acquire(url)
+                if host:
+                    METRICS.throttled(host, time.perf_counter() - waited)
+            start = time.perf_counter()
+            try:
+                resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if host:
+                    METRICS.request(host, time.perf_counter() - start, 0, type(e).__name__)
+                if attempt == self.max_retries:
+                    self._count("errors", url)
+                    raise
+            else:
+                if host:
+                    METRICS.request(host, time.perf_counter() - start, len(resp.content), resp.status_code)
+                if resp.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return resp
+            time.sleep(2 ** attempt)
+
+    def get(self, url):
+        meta, body = self._load(url)
+        if meta and self.offline:
+            self._count("hits", url)
+            return CachedResponse(url, meta["status"], body, meta["encoding"], from_cache=True)
+        if self.offline:
+            raise OfflineCacheMiss(url)
+
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        resp = self._request(url, headers)
+        if resp.status_code == 304 and meta:
+            self._count("revalidated", url)
+            return CachedResponse(url, meta["status"], body, meta["encoding"], from_cache=True)
+
+        self._count("misses", url)
+        if resp.status_code != 200:
+            self._count("errors", url)
+            return CachedResponse(url, resp.status_code, resp.content, resp.encoding, resp.headers)
+        meta = self._store(url, resp, resp.content)
+        return CachedResponse(url, resp.status_code, resp.content, meta["encoding"], resp.headers)
+
+    def report(self):
+        s = self.stats
+        served = s["hits"] + s["revalidated"]
+        total = served + s["misses"]
+        rate = served / total * 100 if total else 0.0
+        return (f"HTTP cache: {served} served from disk ({s['revalidated']} revalidated with 304, "
+                f"{s['hits']} offline), {s['misses']} downloaded, {s['errors']} errors "
+                f"({rate:.1f}% hit rate)")
@@ -0,0 +1,57 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows `rate` acquisitions per second with bursts
+    of up to `capacity`. Callers that find the bucket empty reserve a token and
+    sleep outside the lock, so waiting threads are served in arrival order.
+    """
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Keeps one TokenBucket per host so each site is throttled independently."""
+    def __init__(self, rates: dict | None = None, default_rate: float = 1.0, burst: float = 1.0):
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def set_rate(self, host: str, rate: float):
+        with self._lock:
+            self.rates[host] = rate
+            self._buckets.pop(host, None)
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rates.get(host, self.default_rate), self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url_or_host: str):
+        """Blocks until a request to the given URL (or bare host) is allowed."""
+        host = urlsplit(url_or_host).netloc if "://" in url_or_host else url_or_host
+        self.bucket(host).acquire()
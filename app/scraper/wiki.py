@@ -0,0 +1,226 @@
+import os
+import json
+import threading
+from urllib.parse import urlencode
+
+WIKI_API_URL = os.environ.get("VOLCANOZ_WIKI_API", "https://en.wikipedia.org/w/api.php")
+TITLE_CACHE_FILE = os.path.join(os.path.dirname(__file__), '../dataset/wiki_titles.json')
+
+# MediaWiki accepts up to 50 titles per query, but extracts are capped at 20 pages per request.
+RESOLVE_BATCH = 50
+CONTENT_BATCH = 20
+# What a failed query raises: HTTP errors after the session's retries, connection errors
+# (requests' are OSErrors) and bodies that are not JSON.
+QUERY_ERRORS = (RuntimeError, OSError, ValueError)
+# Summary and wikitext of the pages in "titles".
+CONTENT_QUERY = {
+    "prop": "extracts|revisions",
+    "exintro": 1,
+    "explaintext": 1,
+    "exlimit": "max",
+    "rvprop": "content",
+    "rvslots": "main"
+}
+
+
+def title_candidates(name):
+    """Titles tried for a volcano name, in order of preference."""
+    return [name, f"{name} (volcano)", f"Mount {name}"]
+
+
+def _missing_page(title):
+    return {"title": title, "exists": False, "text": "", "summary": ""}
+
+
+class WikiClient:
+    """
+    Batched MediaWiki client. Volcano names are resolved to canonical page
+    titles many per query (following redirects, skipping disambiguation
+    pages) and summaries plus wikitext are fetched in bulk. The name -> title
+    mapping, misses included, persists in TITLE_CACHE_FILE so a name is only
+    looked up once across runs. prefetch() survives failed queries: their
+    names and titles are left out of both caches and looked up again by page().
+    """
+    def __init__(self, session, api_url=WIKI_API_URL, cache_file=TITLE_CACHE_FILE):
+        self.session = session
+        self.api_url = api_url
+        self.cache_file = cache_file
+        self.titles = {}
+        self.pages = {}
+        self.failed_batches = 0
+        # title -> HTTP status of the request page() made for it; prefetched pages have none.
+        self.statuses = {}
+        self._lock = threading.Lock()
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, encoding="utf-8") as f:
+                self.titles = json.load(f)
+
+    def save(self):
+        if not self.cache_file:
+            return
+        with self._lock:
+            data = json.dumps(self.titles, ensure_ascii=False, indent=0, sort_keys=True)
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, self.cache_file)
+
+    def _url(self, params, cont=None):
+        params = dict(params, action="query", format="json", formatversion=2)
+        return f"{self.api_url}?{urlencode(dict(params, **(cont or {})))}"
+
+    def content_url(self, title):
+        """The API query that returns the summary and wikitext of one page, as page() sends it."""
+        return self._url({"titles": title, **CONTENT_QUERY})
+
+    def _query(self, params):
+        """Runs one query, following `continue` until the batch is complete."""
+        pages, normalized, redirects = {}, [], []
+        cont = {}
+        while True:
+            resp = self.session.get(self._url(params, cont))
+            if resp.status_code != 200:
+                raise RuntimeError(f"Wikipedia API returned HTTP {resp.status_code}")
+            body = json.loads(resp.text)
+            query = body.get("query", {})
+            normalized += query.get("normalized", [])
+            redirects += query.get("redirects", [])
+            for page in query.get("pages", []):
+                merged = pages.setdefault(page["title"], {})
+                for key, value in page.items():
+                    if value or key not in merged:
+                        merged[key] = value
+            if "continue" not in body:
+                return pages, normalized, redirects
+            cont = body["continue"]
+
+    def _resolve_batch(self, titles):
+        pages, normalized, redirects = self._query({
+            "titles": "|".join(titles),
+            "redirects": 1,
+            "prop": "pageprops",
+            "ppprop": "disambiguation"
+        })
+        norm = {n["from"]: n["to"] for n in normalized}
+        redir = {r["from"]: r["to"] for r in redirects}
+        resolved = {}
+        for title in titles:
+            target = norm.get(title, title)
+            for _ in range(len(redir)):
+                if target not in redir:
+                    break
+                target = redir[target]
+            page = pages.get(target)
+            missing = (not page or page.get("missing") or page.get("invalid")
+                       or "disambiguation" in page.get("pageprops", {}))
+            resolved[title] = None if missing else page["title"]
+        return resolved
+
+    def _query_failed(self, titles, error):
+        with self._lock:
+            self.failed_batches += 1
+        print(f"Wikipedia query for {len(titles)} titles failed ({error!r}); they will be looked up again")
+
+    def resolve(self, names, skip_errors=False):
+        """
+        Maps each name to its canonical page title, or None if no candidate
+        title exists. With skip_errors a failed query is reported instead of
+        raised, and its names map to None without being cached as missing.
+        """
+        result = {}
+        pending = [name for name in dict.fromkeys(names) if "|" not in name]
+        for attempt in range(len(title_candidates(""))):
+            lookups = {}
+            for name in pending:
+                if name in self.titles:
+                    result[name] = self.titles[name]
+                else:
+                    lookups[name] = title_candidates(name)[attempt]
+            batch = list(dict.fromkeys(lookups.values()))
+            found, failed = {}, set()
+            for i in range(0, len(batch), RESOLVE_BATCH):
+                titles = batch[i:i + RESOLVE_BATCH]
+                try:
+                    found.update(self._resolve_batch(titles))
+                except QUERY_ERRORS as e:
+                    if not skip_errors:
+                        raise
+                    self._query_failed(titles, e)
+                    failed.update(titles)
+            pending = []
+            for name, title in lookups.items():
+                if title in failed:
+                    # Unknown, not missing: a less preferred candidate must not win by default.
+                    continue
+                if found.get(title):
+                    result[name] = found[title]
+                    with self._lock:
+                        self.titles[name] = found[title]
+                else:
+                    pending.append(name)
+        with self._lock:
+            for name in pending:
+                self.titles[name] = None
+                result[name] = None
+        for name in names:
+            result.setdefault(name, None)
+        return result
+
+    def _fetch_batch(self, titles):
+        pages, _, _ = self._query({"titles": "|".join(titles), **CONTENT_QUERY})
+        content = {}
+        for title in titles:
+            page = pages.get(title)
+            if not page or page.get("missing"):
+                content[title] = _missing_page(title)
+                continue
+            revisions = page.get("revisions") or [{}]
+            wikitext = revisions[0].get("slots", {}).get("main", {}).get("content", "")
+            content[title] = {"title": title, "exists": True, "text": wikitext, "summary": page.get("extract", "")}
+        return content
+
+    def prefetch(self, names):
+        """
+        Resolves and downloads pages for many names; later page() calls are
+        served from memory. A failed query only costs its own batch.
+        """
+        resolved = self.resolve(names, skip_errors=True)
+        titles = [t for t in dict.fromkeys(resolved.values()) if t and t not in self.pages]
+        for i in range(0, len(titles), CONTENT_BATCH):
+            try:
+                batch = self._fetch_batch(titles[i:i + CONTENT_BATCH])
+            except QUERY_ERRORS as e:
+                self._query_failed(titles[i:i + CONTENT_BATCH], e)
+                continue
+            with self._lock:
+                self.pages.update(batch)
+        self.save()
+        return resolved
+
+    def page(self, name):
+        """
+        Returns {"title", "exists", "text", "summary"} for a volcano name, where
+        `text` is the page wikitext and `summary` the plain-text intro.
+        """
+        title = self.titles[name] if name in self.titles else self.resolve([name])[name]
+        if title is None:
+            return _missing_page(name)
+        if title not in self.pages:
+            batch = self._fetch_batch([title])
+            with self._lock:
+                # _query returns only after an HTTP 200.
+                self.statuses[title] = 200
+                self.pages.update(batch)
+        return self.pages[title]
+
+    def source(self, name):
+        """
+        (url, status) of what page(name) returned: the API query for that page
+        and the HTTP status of page()'s own request for it. The status is None
+        when the page came from the prefetch cache, and the url is the bare API
+        endpoint when the name has no page.
+        """
+        title = self.titles.get(name)
+        if title is None:
+            return self.api_url, None
+        return self.content_url(title), self.statuses.get(title)
@@ -0,0 +1,166 @@
+"""
+Trains the VolcanoZ model on the token shards in ./data
+(built by `python -m app.corpus.build`).
+
+    python -m app.train [--steps 2000] [--batch-size 16] [--seq-len 256] [--attn-block 64]
+                        [--workers 4] [--accum-steps 1]
+
+With --workers N the global batch is split across N processes that share the
+model through shared memory (app.transformer.parallel); --accum-steps adds
+micro-batches per optimizer step for a larger effective batch.
+
+Checkpoints go to ./models every --checkpoint-interval steps, written in the
+background, and a new run resumes from the latest one unless --fresh is given.
+"""
+import time
+import argparse
+
+import numpy as np
+
+from app.transformer.checkpoint import MODELS_DIR, CheckpointWriter, latest_checkpoint
+from app.transformer.data import DATA_DIR, BatchSampler, load_shards
+from app.transformer.optim import AdamW, clip_grad_norm, cosine_lr
+from app.transformer.parallel import DataParallel, accumulate_gradients
+from app.transformer.tokenizer import TOKENIZER_FILE, Tokenizer
+from app.transformer.transformer import GPT, Config
+
+# Settings that determine the data order; a resumed run takes them from the checkpoint.
+RESUME_ARGS = ("batch_size", "seq_len", "accum_steps", "seed")
+
+
+def load_data(data_dir, batch_size, seq_len, seed):
+    """Returns (train sampler, validation sampler or None) over the memory-mapped shards."""
+    train_shards = load_shards(data_dir, "train")
+    if not train_shards:
+        raise SystemExit(f"no training shards in {data_dir}; run python -m app.corpus.build first")
+    val_shards = load_shards(data_dir, "val")
+    train = BatchSampler(train_shards, batch_size, seq_len, seed)
+    val = BatchSampler(val_shards, batch_size, seq_len, seed) if val_shards else None
+    if val and not val.steps_per_epoch():
+        val = None
+    return train, val
+
+
+def evaluate(model, sampler, batches):
+    losses = []
+    for step, (x, y) in enumerate(sampler.epoch(0)):
+        if step == batches:
+            break
+        losses.append(model.loss(x, y))
+    return float(np.mean(losses)) if losses else float("nan")
+
+
+def save_checkpoint(writer, step, model, optimizer, position, args):
+    """Queues a background save of the parameters, optimizer state and data position after `step`."""
+    state = optimizer.state_dict()
+    writer.save(step, {"params": model.params.data, "m": state["m"], "v": state["v"]}, {
+        "t": state["t"],
+        "position": list(position),
+        "config": model.config.to_dict(),
+        "args": {key: getattr(args, key) for key in RESUME_ARGS},
+    })
+
+
+def local_step(model, optimizer, batches, accum_steps, grad_clip):
+    """The single-process counterpart of DataParallel.step: returns step(lr) -> (loss, grad norm)."""
+    def step(lr):
+        model.zero_grad()
+        loss = accumulate_gradients(model, batches, accum_steps)
+        if accum_steps > 1:
+            model.grads.data *= 1.0 / accum_steps
+        norm = clip_grad_norm(model.grads.data, grad_clip)
+        optimizer.step(model.grads.data, lr)
+        return loss, norm
+    return step
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the VolcanoZ language model.")
+    parser.add_argument("--data", default=DATA_DIR, help="token shard directory")
+    parser.add_argument("--tokenizer", default=TOKENIZER_FILE, help="tokenizer file (for the vocabulary size)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seq-len", type=int, default=256)
+    parser.add_argument("--n-layer", type=int, default=4)
+    parser.add_argument("--n-head", type=int, default=4)
+    parser.add_argument("--n-embd", type=int, default=256)
+    parser.add_argument("--attn-block", type=int, default=64, help="blockwise attention tile size (0: always full)")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--lr", type=float, default=3e-4)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--grad-clip", type=float, default=1.0)
+    parser.add_argument("--eval-interval", type=int, default=200)
+    parser.add_argument("--eval-batches", type=int, default=20)
+    parser.add_argument("--log-interval", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="data-parallel worker processes")
+    parser.add_argument("--accum-steps", type=int, default=1, help="micro-batches per optimizer step")
+    parser.add_argument("--models", default=MODELS_DIR, help="checkpoint directory")
+    parser.add_argument("--checkpoint-interval", type=int, default=200, help="steps between checkpoints (0: never)")
+    parser.add_argument("--keep", type=int, default=3, help="checkpoints to keep")
+    parser.add_argument("--fresh", action="store_true", help="start over instead of resuming from the latest checkpoint")
+    args = parser.parse_args()
+
+    checkpoint = None if args.fresh else latest_checkpoint(args.models)
+    if checkpoint:
+        # The data order depends on these, so a resumed run keeps the checkpoint's values.
+        for key, value in checkpoint.meta["args"].items():
+            setattr(args, key, value)
+        print(f"Resuming from {checkpoint.path}")
+    train, val = load_data(args.data, args.batch_size, args.seq_len, args.seed)
+    if checkpoint:
+        config = Config(**checkpoint.meta["config"])
+    else:
+        config = Config(
+            vocab_size=Tokenizer.load(args.tokenizer).vocab_size,
+            block_size=args.seq_len,
+            n_layer=args.n_layer,
+            n_head=args.n_head,
+            n_embd=args.n_embd,
+            attn_block=args.attn_block or None
+        )
+    first_step = checkpoint.step + 1 if checkpoint else 1
+    position = tuple(checkpoint.meta["position"]) if checkpoint else (0, 0)
+    if args.workers > 1:
+        trainer = DataParallel(config, args.workers, args.data, args.batch_size, args.seq_len, args.accum_steps,
+                               args.grad_clip, args.seed, position, optimizer={"lr": args.lr})
+        model, optimizer, train_step = trainer.model, trainer, trainer.step
+    else:
+        trainer = None
+        model = GPT(config, seed=args.seed)
+        optimizer = AdamW(model.params, lr=args.lr)
+        train_step = local_step(model, optimizer, train.batches(*position), args.accum_steps, args.grad_clip)
+    if checkpoint:
+        model.params.data[...] = checkpoint["params"]
+        optimizer.load_state_dict({"m": checkpoint["m"], "v": checkpoint["v"], "t": checkpoint.meta["t"]})
+    n_tokens = sum(shard.n_tokens for shard in train.shards)
+    tokens_per_step = args.batch_size * args.seq_len * args.accum_steps
+    print(f"{model.n_params / 1e6:.2f}M parameters, {n_tokens} training tokens, "
+          f"{train.steps_per_epoch() // args.accum_steps} steps per epoch, "
+          f"{tokens_per_step} tokens per step on {args.workers} worker(s)")
+
+    writer = CheckpointWriter(args.models, args.keep)
+    start = last = time.perf_counter()
+    try:
+        for step in range(first_step, args.steps + 1):
+            lr = cosine_lr(step - 1, args.lr, args.warmup, args.steps)
+            loss, norm = train_step(lr)
+            position = train.advance(*position, args.accum_steps)
+
+            if step % args.log_interval == 0:
+                now = time.perf_counter()
+                tokens_per_sec = args.log_interval * tokens_per_step / (now - last)
+                last = now
+                print(f"step {step}: loss {loss:.4f}, grad norm {norm:.2f}, lr {lr:.2e}, {tokens_per_sec:.0f} tok/s")
+            if val and step % args.eval_interval == 0:
+                print(f"step {step}: val loss {evaluate(model, val, args.eval_batches):.4f}")
+            if args.checkpoint_interval and (step % args.checkpoint_interval == 0 or step == args.steps):
+                save_checkpoint(writer, step, model, optimizer, position, args)
+    finally:
+        writer.close()
+        if trainer:
+            trainer.close()
+    print(f"Trained {args.steps - first_step + 1} steps in {time.perf_counter() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Training checkpoints in ./models.
+
+A checkpoint is a directory step-XXXXXXXX holding one .npy file per flat
+array (parameters and AdamW moments) and meta.json with everything else: the
+step, the optimizer step count, the data-loader position, the model config and
+the settings needed to replay the data order. The arrays load with
+np.load(mmap_mode="r"), so resuming reads each page once, straight into the
+model's buffer.
+
+CheckpointWriter copies the arrays into snapshot buffers (a memcpy) and writes
+them on a background thread while training carries on. Everything goes to a
+.tmp directory that is fsynced and renamed into place, so a checkpoint is
+either complete or absent; latest_checkpoint() also skips any that fail to
+load.
+"""
+import os
+import json
+import time
+import shutil
+import threading
+
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), '../../models')
+PREFIX = "step-"
+META_FILE = "meta.json"
+
+
+def _checkpoint_dirs(directory):
+    """(step, path) of every finished checkpoint directory, newest first."""
+    found = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        if name.startswith(PREFIX) and name[len(PREFIX):].isdigit():
+            found.append((int(name[len(PREFIX):]), os.path.join(directory, name)))
+    return sorted(found, reverse=True)
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Checkpoint:
+    """A saved checkpoint: `meta` from meta.json, arrays memory-mapped on access."""
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.step = self.meta["step"]
+
+    def __getitem__(self, name):
+        spec = self.meta["arrays"][name]
+        array = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        if list(array.shape) != spec["shape"] or array.dtype.str != spec["dtype"]:
+            raise ValueError(f"{self.path}/{name}.npy does not match {META_FILE}")
+        return array
+
+    def verify(self):
+        for name in self.meta["arrays"]:
+            self[name]
+        return self
+
+
+def latest_checkpoint(directory=MODELS_DIR):
+    """The newest checkpoint in `directory` that loads cleanly, or None."""
+    for _, path in _checkpoint_dirs(directory):
+        try:
+            return Checkpoint(path).verify()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Skipping unreadable checkpoint {path}: {e}")
+    return None
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints in the background, one at a time. save() only waits if
+    the previous checkpoint is still being written (its snapshot buffers are
+    reused); errors from the writer thread are raised by the next save() or
+    close(). Only the newest `keep` checkpoints are kept.
+    """
+    def __init__(self, directory=MODELS_DIR, keep=3):
+        self.directory = directory
+        self.keep = keep
+        self._snapshot = {}
+        self._thread = None
+        self._error = None
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith(PREFIX) and name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    def save(self, step, arrays, meta):
+        """Snapshots `arrays` (name -> flat array) and writes them with `meta` as checkpoint `step`."""
+        self.wait()
+        for name, array in arrays.items():
+            buffer = self._snapshot.get(name)
+            if buffer is None or buffer.shape != array.shape or buffer.dtype != array.dtype:
+                buffer = self._snapshot[name] = np.empty_like(array)
+            np.copyto(buffer, array)
+        meta = dict(meta, step=step, saved_at=time.time(), arrays={
+            name: {"shape": list(array.shape), "dtype": array.dtype.str} for name, array in arrays.items()
+        })
+        self._thread = threading.Thread(target=self._run, args=(step, meta), name="checkpoint-writer")
+        self._thread.start()
+
+    def _run(self, step, meta):
+        try:
+            self._write(step, meta)
+        except BaseException as e:
+            self._error = e
+
+    def _write(self, step, meta):
+        final = os.path.join(self.directory, f"{PREFIX}{step:08d}")
+        tmp = final + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in meta["arrays"]:
+            with open(os.path.join(tmp, f"{name}.npy"), "wb") as f:
+                np.save(f, self._snapshot[name])
+                f.flush()
+                os.fsync(f.fileno())
+        with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_dir(tmp)
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.replace(tmp, final)
+        _fsync_dir(self.directory)
+        for _, path in _checkpoint_dirs(self.directory)[self.keep:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("writing the checkpoint failed") from error
+
+    def close(self):
+        self.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,218 @@
+"""
+Token shards and the training batch sampler.
+
+A shard is one flat file: a 32-byte header, the tokens of every document back
+to back as little-endian uint16, padding to 8 bytes, then n_docs + 1 uint64
+document start offsets. Readers memory-map both arrays, so opening a shard
+costs the same whatever its size and only the pages a batch touches are read.
+
+    python -m app.transformer.data [--split train] [--batch-size 16] [--seq-len 256]
+"""
+import os
+import glob
+import time
+import struct
+import argparse
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../../data')
+SHARD_SUFFIX = ".tok"
+
+MAGIC = b"VTOK"
+VERSION = 1
+# magic, version, bytes per token, token count, document count, padded to HEADER_SIZE
+HEADER = struct.Struct("<4sHHQQ")
+HEADER_SIZE = 32
+TOKEN_DTYPE = np.dtype("<u2")
+OFFSET_DTYPE = np.dtype("<u8")
+
+
+def shard_path(directory, split, index):
+    return os.path.join(directory, f"{split}-{index:05d}{SHARD_SUFFIX}")
+
+
+def _offsets_position(n_tokens):
+    end = HEADER_SIZE + n_tokens * TOKEN_DTYPE.itemsize
+    return end + (-end % OFFSET_DTYPE.itemsize)
+
+
+class ShardWriter:
+    """
+    Streams documents into a shard. Tokens go straight to disk; only the
+    document offsets are kept until close(), which writes the index and header
+    and renames the finished shard into place.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.n_tokens = 0
+        self.offsets = [0]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._tmp = path + ".tmp"
+        self._file = open(self._tmp, "wb")
+        self._file.write(bytes(HEADER_SIZE))
+
+    def add(self, ids):
+        tokens = np.asarray(ids)
+        if tokens.size and (tokens.min() < 0 or tokens.max() > np.iinfo(TOKEN_DTYPE).max):
+            raise ValueError("token ids must fit in uint16")
+        self._file.write(tokens.astype(TOKEN_DTYPE, copy=False).tobytes())
+        self.n_tokens += tokens.size
+        self.offsets.append(self.n_tokens)
+
+    def close(self):
+        f = self._file
+        f.write(bytes(_offsets_position(self.n_tokens) - f.tell()))
+        f.write(np.array(self.offsets, dtype=OFFSET_DTYPE).tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, TOKEN_DTYPE.itemsize, self.n_tokens, len(self.offsets) - 1))
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.replace(self._tmp, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp)
+
+
+class TokenShard:
+    """Read-only view of a shard; `tokens` and `offsets` are memmaps."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, token_bytes, n_tokens, n_docs = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or token_bytes != TOKEN_DTYPE.itemsize:
+            raise ValueError(f"{path} is not a version {VERSION} token shard")
+        self.n_tokens = n_tokens
+        self.n_docs = n_docs
+        self.tokens = np.memmap(path, dtype=TOKEN_DTYPE, mode="r", offset=HEADER_SIZE, shape=(n_tokens,))
+        self.offsets = np.memmap(path, dtype=OFFSET_DTYPE, mode="r", offset=_offsets_position(n_tokens),
+                                 shape=(n_docs + 1,))
+
+    def __len__(self):
+        return self.n_docs
+
+    def doc(self, i):
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+
+def load_shards(directory=DATA_DIR, split="train"):
+    paths = sorted(glob.glob(os.path.join(directory, f"{split}-*{SHARD_SUFFIX}")))
+    return [TokenShard(path) for path in paths]
+
+
+class BatchSampler:
+    """
+    Samples (batch_size, seq_len) input/target windows from a list of shards.
+
+    An epoch cuts every shard into non-overlapping seq_len + 1 token windows,
+    starting from a per-epoch offset, and visits them in a permutation drawn
+    from (seed, epoch), so any epoch and step can be reproduced without
+    replaying earlier ones. A batch is gathered with one fancy-index per shard
+    from a strided window view of the memmap; x and y are views of that single
+    (batch_size, seq_len + 1) array.
+    """
+    def __init__(self, shards, batch_size, seq_len, seed=0):
+        self.shards = shards
+        self.batch_size = batch_size
+        self.seq_len = seq_len
+        self.seed = seed
+        self._views = [
+            np.lib.stride_tricks.sliding_window_view(shard.tokens, seq_len + 1) if shard.n_tokens > seq_len else None
+            for shard in shards
+        ]
+
+    def _window_counts(self, epoch):
+        rng = np.random.default_rng((self.seed, epoch))
+        shift = int(rng.integers(self.seq_len))
+        sizes = np.array([shard.n_tokens for shard in self.shards], dtype=np.int64)
+        return rng, shift, np.maximum((sizes - shift - 1) // self.seq_len, 0)
+
+    def windows(self, epoch):
+        """(shard index, start token) of every window in this epoch, in visiting order."""
+        rng, shift, counts = self._window_counts(epoch)
+        order = rng.permutation(int(counts.sum()))
+        bounds = np.cumsum(counts)
+        shard_ids = np.searchsorted(bounds, order, side="right")
+        local = order - (bounds - counts)[shard_ids]
+        return shard_ids, shift + local * self.seq_len
+
+    def steps_per_epoch(self, epoch=0):
+        return int(self._window_counts(epoch)[2].sum()) // self.batch_size
+
+    def advance(self, epoch, step, batches):
+        """The (epoch, step) position `batches` batches after (epoch, step), as batches() would reach it."""
+        step += batches
+        while step >= (steps := self.steps_per_epoch(epoch)):
+            epoch, step = epoch + 1, step - steps
+        return epoch, step
+
+    def gather(self, shard_ids, starts):
+        batch = np.empty((len(starts), self.seq_len + 1), dtype=TOKEN_DTYPE)
+        for s in np.unique(shard_ids):
+            mask = shard_ids == s
+            batch[mask] = self._views[s][starts[mask]]
+        return batch[:, :-1], batch[:, 1:]
+
+    def epoch(self, epoch, start_step=0, rows=None):
+        """
+        Yields (x, y) for every full batch of an epoch, from start_step on.
+        `rows` (a slice of range(batch_size)) gathers only part of each batch,
+        which is how data-parallel workers split one global batch.
+        """
+        shard_ids, starts = self.windows(epoch)
+        rows = rows or slice(0, self.batch_size)
+        for step in range(start_step, len(starts) // self.batch_size):
+            base = step * self.batch_size
+            batch = slice(base + rows.start, base + rows.stop)
+            yield self.gather(shard_ids[batch], starts[batch])
+
+    def batches(self, epoch=0, step=0, rows=None):
+        """Endless (epoch, step, x, y) from the given position on, rolling over into the next epoch."""
+        if not self.steps_per_epoch():
+            raise ValueError(f"not enough tokens for a batch of {self.batch_size} x {self.seq_len}")
+        while True:
+            for i, (x, y) in enumerate(self.epoch(epoch, step, rows), step):
+                yield epoch, i, x, y
+            epoch, step = epoch + 1, 0
+
+    def __iter__(self):
+        for _, _, x, y in self.batches():
+            yield x, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect token shards and time the batch sampler.")
+    parser.add_argument("--data", default=DATA_DIR, help="shard directory")
+    parser.add_argument("--split", default="train")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seq-len", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=1000)
+    args = parser.parse_args()
+
+    shards = load_shards(args.data, args.split)
+    if not shards:
+        raise SystemExit(f"no {args.split} shards in {args.data}; run python -m app.corpus.build first")
+    n_tokens = sum(shard.n_tokens for shard in shards)
+    print(f"{len(shards)} shards, {sum(len(s) for s in shards)} documents, {n_tokens} tokens")
+
+    sampler = BatchSampler(shards, args.batch_size, args.seq_len)
+    print(f"{sampler.steps_per_epoch()} batches per epoch")
+    start = time.perf_counter()
+    steps = 0
+    for steps, (x, y) in enumerate(sampler, 1):
+        if steps == args.steps:
+            break
+    elapsed = time.perf_counter() - start
+    print(f"{steps / elapsed:.0f} batches/s, {steps * x.size / elapsed / 1e6:.1f}M tokens/s")
+
+
+if __name__ == "__main__":
+    main()
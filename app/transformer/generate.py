@@ -0,0 +1,252 @@
+"""
+Incremental generation with a per-layer key/value cache.
+
+A KVCache holds preallocated (slots, heads, max_len, head_dim) key and value
+arrays per layer, plus the current length of every slot. prefill() runs the
+prompts of some slots through the model once and stores their keys and
+values; decode() then advances every slot by one token, attending over the
+cached prefix instead of recomputing it. Slots have independent lengths, so a
+batch of prompts of different lengths is right-padded for prefill and each row
+masks out keys beyond its own length.
+
+    python -m app.transformer.generate "Mount Etna" [--max-new-tokens 200] [--temperature 0.8] [--top-k 40]
+"""
+import math
+import time
+import argparse
+
+import numpy as np
+
+from app.transformer.checkpoint import MODELS_DIR, latest_checkpoint
+from app.transformer.tokenizer import TOKENIZER_FILE, Tokenizer
+from app.transformer.transformer import DTYPE, GPT, Config, Workspace, causal_mask, softmax_
+
+
+class KVCache:
+    def __init__(self, config, slots, max_len=None):
+        max_len = max_len or config.block_size
+        if max_len > config.block_size:
+            raise ValueError(f"max_len {max_len} exceeds block_size {config.block_size}")
+        H = config.n_head
+        D = config.n_embd // H
+        shape = (slots, H, max_len, D)
+        self.k = [np.zeros(shape, dtype=DTYPE) for _ in range(config.n_layer)]
+        self.v = [np.zeros(shape, dtype=DTYPE) for _ in range(config.n_layer)]
+        self.lengths = np.zeros(slots, dtype=np.intp)
+        self.slots = slots
+        self.max_len = max_len
+        self.ws = Workspace()
+        # decode() scratch, allocated once for the longest prefix. Each step takes a
+        # contiguous leading view of it; strided [..., :L] views make matmul copy.
+        self.mask = np.empty(slots * max_len, dtype=DTYPE)
+        self.att = np.empty(slots * H * max_len, dtype=DTYPE)
+
+    def reset(self, slots=None):
+        if slots is None:
+            self.lengths[:] = 0
+        else:
+            self.lengths[slots] = 0
+
+
+def _layer_norm(x, p, prefix, eps=1e-5):
+    mean = x.mean(axis=-1, keepdims=True)
+    xc = x - mean
+    var = np.einsum("...c,...c->...", xc, xc)[..., None] / x.shape[-1]
+    xc *= 1.0 / np.sqrt(var + eps)
+    xc *= p[f"{prefix}.g"]
+    xc += p[f"{prefix}.b"]
+    return xc
+
+
+def _mlp(x, p, prefix):
+    h = x @ p[f"{prefix}.w_fc"]
+    h += p[f"{prefix}.b_fc"]
+    t = np.tanh(math.sqrt(2.0 / math.pi) * (h + 0.044715 * h * h * h))
+    h *= 0.5 * (1.0 + t)
+    out = h @ p[f"{prefix}.w_out"]
+    out += p[f"{prefix}.b_out"]
+    return out
+
+
+def prefill(model, cache, slots, prompts):
+    """
+    Runs `prompts` (lists of token ids) into the given cache slots and returns
+    the next-token logits for each, shape (len(slots), vocab_size).
+    """
+    p, config = model.params, model.config
+    slots = np.asarray(slots, dtype=np.intp)
+    lengths = np.array([len(prompt) for prompt in prompts], dtype=np.intp)
+    if lengths.min() < 1 or lengths.max() > cache.max_len:
+        raise ValueError(f"prompt lengths must be between 1 and {cache.max_len}")
+    n, P = len(prompts), int(lengths.max())
+    C, H = config.n_embd, config.n_head
+    D = C // H
+
+    idx = np.zeros((n, P), dtype=np.intp)
+    for row, prompt in enumerate(prompts):
+        idx[row, :len(prompt)] = prompt
+    x = p["wte"][idx] + p["wpe"][:P]
+    # Right padding sits after every real token, so the causal mask already hides it.
+    mask = causal_mask(P)
+    for i in range(config.n_layer):
+        prefix = f"h{i}"
+        qkv = _layer_norm(x, p, f"{prefix}.ln1") @ p[f"{prefix}.attn.w_qkv"]
+        qkv += p[f"{prefix}.attn.b_qkv"]
+        q, k, v = qkv.reshape(n, P, 3, H, D).transpose(2, 0, 3, 1, 4)
+        cache.k[i][slots, :, :P] = k
+        cache.v[i][slots, :, :P] = v
+        att = (q * (1.0 / math.sqrt(D))) @ k.swapaxes(-1, -2)
+        att += mask
+        y = softmax_(att) @ v
+        x = x + y.transpose(0, 2, 1, 3).reshape(n, P, C) @ p[f"{prefix}.attn.w_proj"] + p[f"{prefix}.attn.b_proj"]
+        x = x + _mlp(_layer_norm(x, p, f"{prefix}.ln2"), p, f"{prefix}.mlp")
+
+    cache.lengths[slots] = lengths
+    last = x[np.arange(n), lengths - 1]
+    return _layer_norm(last, p, "ln_f") @ p["wte"].T
+
+
+def decode(model, cache, tokens):
+    """
+    Appends one token per slot (tokens has shape (cache.slots,)) and returns
+    next-token logits (cache.slots, vocab_size). Attention reads the cached
+    keys and values up to the longest slot; shorter slots mask the rest.
+    Slots that are not in use simply compute throwaway values, so callers
+    reset them to keep them from filling up: a slot already at max_len has no
+    room for another token and raises ValueError.
+    """
+    p, config, ws = model.params, model.config, cache.ws
+    S = cache.slots
+    C, H = config.n_embd, config.n_head
+    D = C // H
+    pos = cache.lengths
+    if pos.max() >= cache.max_len:
+        full = np.flatnonzero(pos >= cache.max_len).tolist()
+        raise ValueError(f"cache slots {full} are full ({cache.max_len} tokens)")
+    L = int(pos.max()) + 1
+    rows = np.arange(S)
+
+    mask = cache.mask[:S * L].reshape(S, 1, 1, L)
+    np.copyto(mask, np.where(np.arange(L) <= pos[:, None], 0.0, -np.inf)[:, None, None, :])
+    att = cache.att[:S * H * L].reshape(S, H, 1, L)
+    y = ws.get("y", (S, H, 1, D))
+
+    x = p["wte"][tokens] + p["wpe"][pos]
+    for i in range(config.n_layer):
+        prefix = f"h{i}"
+        qkv = _layer_norm(x, p, f"{prefix}.ln1") @ p[f"{prefix}.attn.w_qkv"]
+        qkv += p[f"{prefix}.attn.b_qkv"]
+        q, k, v = qkv.reshape(S, 3, H, D).transpose(1, 0, 2, 3)
+        cache.k[i][rows, :, pos] = k
+        cache.v[i][rows, :, pos] = v
+        q = q[:, :, None, :] * (1.0 / math.sqrt(D))
+        np.matmul(q, cache.k[i][:, :, :L].swapaxes(-1, -2), out=att)
+        att += mask
+        softmax_(att)
+        np.matmul(att, cache.v[i][:, :, :L], out=y)
+        x = x + y.reshape(S, C) @ p[f"{prefix}.attn.w_proj"] + p[f"{prefix}.attn.b_proj"]
+        x = x + _mlp(_layer_norm(x, p, f"{prefix}.ln2"), p, f"{prefix}.mlp")
+
+    cache.lengths += 1
+    return _layer_norm(x, p, "ln_f") @ p["wte"].T
+
+
+def sample(logits, rng, temperature=1.0, top_k=None, top_p=None):
+    """
+    Picks one token per row of logits (rows, vocab). temperature=0 is greedy;
+    top_k keeps the k most likely tokens and top_p the smallest set whose
+    probability reaches p, before sampling from what is left.
+    """
+    if temperature == 0:
+        return logits.argmax(axis=-1)
+    logits = logits / temperature
+    V = logits.shape[-1]
+    if top_k and top_k < V:
+        kth = np.partition(logits, V - top_k, axis=-1)[:, V - top_k, None]
+        logits[logits < kth] = -np.inf
+    probs = softmax_(logits)
+    if top_p is not None and top_p < 1.0:
+        order = np.argsort(-probs, axis=-1)
+        ranked = np.take_along_axis(probs, order, axis=-1)
+        # Drop a token once the tokens ranked above it already reach top_p; the first always stays.
+        ranked[np.cumsum(ranked, axis=-1) - ranked >= top_p] = 0.0
+        probs = np.zeros_like(probs)
+        np.put_along_axis(probs, order, ranked, axis=-1)
+    cdf = np.cumsum(probs, axis=-1)
+    u = rng.random((len(probs), 1)) * cdf[:, -1:]
+    return np.minimum((cdf < u).sum(axis=-1), V - 1)
+
+
+def generate(model, prompts, max_new_tokens, temperature=1.0, top_k=None, top_p=None, eos_id=None, seed=None):
+    """
+    Continues each prompt (a list of token ids) by up to max_new_tokens and
+    returns the new tokens per prompt, stopping a row at eos_id. Prompts too
+    long to leave room for the completion keep only their last tokens.
+    """
+    block_size = model.config.block_size
+    if not 0 < max_new_tokens < block_size:
+        raise ValueError(f"max_new_tokens must be between 1 and {block_size - 1}")
+    prompts = [list(prompt)[-(block_size - max_new_tokens):] for prompt in prompts]
+    max_len = max(len(prompt) for prompt in prompts) + max_new_tokens
+    rng = np.random.default_rng(seed)
+
+    cache = KVCache(model.config, len(prompts), max_len)
+    logits = prefill(model, cache, range(len(prompts)), prompts)
+    out = np.zeros((len(prompts), max_new_tokens), dtype=np.intp)
+    finished = np.zeros(len(prompts), dtype=bool)
+    steps = 0
+    for steps in range(1, max_new_tokens + 1):
+        tokens = sample(logits, rng, temperature, top_k, top_p)
+        out[:, steps - 1] = tokens
+        if eos_id is not None:
+            finished |= tokens == eos_id
+            if finished.all():
+                break
+        if steps < max_new_tokens:
+            logits = decode(model, cache, tokens)
+
+    results = []
+    for row in out[:, :steps].tolist():
+        if eos_id is not None and eos_id in row:
+            row = row[:row.index(eos_id)]
+        results.append(row)
+    return results
+
+
+def load_model(directory=MODELS_DIR):
+    """A GPT with the parameters of the latest checkpoint in `directory`, read into memory."""
+    checkpoint = latest_checkpoint(directory)
+    if checkpoint is None:
+        raise SystemExit(f"no checkpoint in {directory}; train a model first (python -m app.train)")
+    config = Config(**checkpoint.meta["config"])
+    return GPT(config, param_buffer=np.array(checkpoint["params"])), checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continue a prompt with the latest trained checkpoint.")
+    parser.add_argument("prompt", nargs="+", help="one or more prompts, generated as a batch")
+    parser.add_argument("--models", default=MODELS_DIR, help="checkpoint directory")
+    parser.add_argument("--tokenizer", default=TOKENIZER_FILE, help="tokenizer file")
+    parser.add_argument("--max-new-tokens", type=int, default=200)
+    parser.add_argument("--temperature", type=float, default=0.8, help="0 = greedy")
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--top-p", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    model, checkpoint = load_model(args.models)
+    tokenizer = Tokenizer.load(args.tokenizer)
+    max_new_tokens = min(args.max_new_tokens, model.config.block_size - 1)
+    start = time.perf_counter()
+    completions = generate(model, tokenizer.encode_many(args.prompt), max_new_tokens, args.temperature,
+                           args.top_k, args.top_p, eos_id=tokenizer.eot_id, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    for prompt, ids in zip(args.prompt, completions):
+        print(prompt + tokenizer.decode(ids))
+        print()
+    n_tokens = sum(map(len, completions))
+    print(f"{n_tokens} tokens in {elapsed:.2f}s ({n_tokens / elapsed:.1f} tokens/s) from {checkpoint.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+AdamW over a model's flat parameter buffer.
+"""
+import math
+
+import numpy as np
+
+from app.transformer.transformer import DTYPE
+
+
+class AdamW:
+    """
+    One fused update over the whole flat buffer, or over the slice `shard` of
+    it when the optimizer state is split across data-parallel workers. The
+    moments can live in caller-provided buffers (e.g. shared memory). Weight
+    decay applies to matrices only (a per-element 0/1 mask built from the
+    parameter specs), not to biases or layer-norm gains.
+    """
+    def __init__(self, params, lr=3e-4, betas=(0.9, 0.95), eps=1e-8, weight_decay=0.1, shard=None, m=None, v=None):
+        self.params = params
+        self.lr = lr
+        self.beta1, self.beta2 = betas
+        self.eps = eps
+        self.weight_decay = weight_decay
+        self.shard = shard or slice(0, params.size)
+        size = self.shard.stop - self.shard.start
+        self.m = np.zeros(size, dtype=DTYPE) if m is None else m
+        self.v = np.zeros(size, dtype=DTYPE) if v is None else v
+        self.t = 0
+        decay = np.zeros(params.size, dtype=DTYPE)
+        offset = 0
+        for _, shape in params.specs:
+            n = math.prod(shape)
+            if len(shape) >= 2:
+                decay[offset:offset + n] = 1.0
+            offset += n
+        self.decay = decay[self.shard].copy()
+        self._scratch = np.empty(size, dtype=DTYPE)
+
+    def step(self, grads, lr=None):
+        """Applies one update from `grads`, which covers the optimizer's shard."""
+        lr = self.lr if lr is None else lr
+        self.t += 1
+        p, m, v, tmp = self.params.data[self.shard], self.m, self.v, self._scratch
+
+        m *= self.beta1
+        np.multiply(grads, 1.0 - self.beta1, out=tmp)
+        m += tmp
+        v *= self.beta2
+        np.multiply(grads, grads, out=tmp)
+        tmp *= 1.0 - self.beta2
+        v += tmp
+
+        np.multiply(self.decay, lr * self.weight_decay, out=tmp)
+        np.subtract(1.0, tmp, out=tmp)
+        p *= tmp
+        bias1 = 1.0 - self.beta1 ** self.t
+        bias2 = 1.0 - self.beta2 ** self.t
+        np.sqrt(v, out=tmp)
+        tmp /= math.sqrt(bias2)
+        tmp += self.eps
+        np.divide(m, tmp, out=tmp)
+        tmp *= lr / bias1
+        p -= tmp
+
+    def state_dict(self):
+        return {"m": self.m, "v": self.v, "t": self.t}
+
+    def load_state_dict(self, state):
+        self.m[...] = state["m"]
+        self.v[...] = state["v"]
+        self.t = int(state["t"])
+
+
+def clip_grad_norm(grads, max_norm):
+    """Scales the flat gradient buffer in place so its L2 norm is at most max_norm; returns the norm."""
+    norm = math.sqrt(float(np.dot(grads, grads)))
+    if max_norm and norm > max_norm:
+        grads *= max_norm / (norm + 1e-6)
+    return norm
+
+
+def cosine_lr(step, max_lr, warmup, total, min_ratio=0.1):
+    if step < warmup:
+        return max_lr * (step + 1) / warmup
+    progress = min(1.0, (step - warmup) / max(1, total - warmup))
+    return max_lr * (min_ratio + (1 - min_ratio) * 0.5 * (1 + math.cos(math.pi * progress)))
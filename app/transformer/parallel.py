@@ -0,0 +1,245 @@
+"""
+Data-parallel training over worker processes that share one memory block.
+
+Every worker maps the same multiprocessing.shared_memory block: the flat
+parameters, the AdamW moments, one gradient row per worker and the reduced
+gradient. Nothing is pickled per step. A step is:
+
+  1. each worker runs its rows of the global batch (for accum_steps
+     micro-batches) and accumulates into its own gradient row;
+  2. each worker sums its 1/N slice of the parameter vector across all rows
+     (a reduce-scatter) and the squared norms are combined for clipping;
+  3. each worker applies AdamW to its slice, so together they update the
+     shared parameters exactly once.
+
+Barriers separate the phases. The process that owns a DataParallel drives
+the steps and can read the parameters (evaluate, checkpoint) between them.
+"""
+import os
+import math
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from app.transformer.data import BatchSampler, load_shards
+from app.transformer.optim import AdamW
+from app.transformer.transformer import DTYPE, GPT, Config, param_specs
+
+ALIGN = 64
+THREAD_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+LR, RUN, T = 0, 1, 2
+
+
+class SharedArrays:
+    """Named arrays laid out back to back, cache-line aligned, in one SharedMemory block."""
+    def __init__(self, layout, name=None):
+        self.layout = layout
+        offsets, end = [], 0
+        for _, shape, dtype in layout:
+            offsets.append(end)
+            end += math.prod(shape) * np.dtype(dtype).itemsize
+            end += -end % ALIGN
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(end, ALIGN))
+        else:
+            # The creating process owns cleanup; attaching must not register the block again.
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        self.name = self.shm.name
+        self.arrays = {
+            key: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            for (key, shape, dtype), offset in zip(layout, offsets)
+        }
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self):
+        self.arrays = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # views are still alive elsewhere; the mapping goes away with them
+        if self.owner:
+            self.shm.unlink()
+
+
+def shared_layout(n_params, n_workers):
+    return [
+        ("params", (n_params,), DTYPE),
+        ("m", (n_params,), DTYPE),
+        ("v", (n_params,), DTYPE),
+        ("reduced", (n_params,), DTYPE),
+        ("grads", (n_workers, n_params), DTYPE),
+        ("stats", (n_workers, 2), np.float64),
+        ("control", (3,), np.float64),
+    ]
+
+
+def accumulate_gradients(model, batches, steps):
+    """Adds the gradients of `steps` micro-batches from `batches` to model.grads; returns their mean loss."""
+    loss = 0.0
+    for _ in range(steps):
+        _, _, x, y = next(batches)
+        loss += model.loss(x, y)
+        model.backward()
+    return loss / steps
+
+
+def _worker(rank, options, name, layout, step_barrier, barrier):
+    shared = SharedArrays(layout, name)
+    try:
+        n = options["workers"]
+        model = GPT(Config(**options["config"]), param_buffer=shared["params"], grad_buffer=shared["grads"][rank])
+        shard = slice(rank * model.n_params // n, (rank + 1) * model.n_params // n)
+        optimizer = AdamW(model.params, shard=shard, m=shared["m"][shard], v=shared["v"][shard], **options["optimizer"])
+        rows = options["batch_size"] // n
+        sampler = BatchSampler(load_shards(options["data"], "train"), options["batch_size"],
+                               options["seq_len"], options["seed"])
+        batches = sampler.batches(*options["position"], rows=slice(rank * rows, (rank + 1) * rows))
+        grads, reduced, stats, control = shared["grads"], shared["reduced"][shard], shared["stats"], shared["control"]
+        accum, clip = options["accum_steps"], options["grad_clip"]
+        scale = 1.0 / (n * accum)
+
+        while True:
+            step_barrier.wait()
+            if not control[RUN]:
+                break
+            model.zero_grad()
+            stats[rank, 0] = accumulate_gradients(model, batches, accum)
+            barrier.wait()
+
+            np.copyto(reduced, grads[0, shard])
+            for row in grads[1:, shard]:
+                reduced += row
+            reduced *= scale
+            stats[rank, 1] = float(np.dot(reduced, reduced))
+            barrier.wait()
+
+            norm = math.sqrt(stats[:, 1].sum())
+            if clip and norm > clip:
+                reduced *= clip / (norm + 1e-6)
+            optimizer.t = int(control[T])
+            optimizer.step(reduced, float(control[LR]))
+            step_barrier.wait()
+    except threading.BrokenBarrierError:
+        pass  # another process failed (or is shutting down) and already reported why
+    except BaseException:
+        step_barrier.abort()
+        barrier.abort()
+        raise
+    finally:
+        shared.close()
+
+
+class DataParallel:
+    """
+    Runs `workers` training processes over one shared copy of a freshly
+    initialised model. batch_size is the global micro-batch and must divide
+    evenly among the workers; each step averages the gradients of
+    batch_size * accum_steps sequences. `model` is a GPT over the shared
+    parameters for use between steps (e.g. to load or save them), and
+    `position` (epoch, step) is where the workers start reading the
+    training shards.
+    """
+    def __init__(self, config, workers, data_dir, batch_size, seq_len, accum_steps=1, grad_clip=1.0,
+                 seed=0, position=(0, 0), optimizer=None):
+        if batch_size % workers:
+            raise ValueError(f"batch size {batch_size} does not divide among {workers} workers")
+        self.workers = workers
+        self.tokens_per_step = batch_size * seq_len * accum_steps
+        n_params = sum(math.prod(shape) for _, shape in param_specs(config))
+        self.shared = SharedArrays(shared_layout(n_params, workers))
+        self.model = GPT(config, param_buffer=self.shared["params"], grad_buffer=self.shared["reduced"])
+        self.model.init_weights(seed)
+        self.shared["control"][:] = (0.0, 1.0, 0.0)
+        self.t = 0
+
+        ctx = mp.get_context("spawn")
+        self._step_barrier = ctx.Barrier(workers + 1)
+        # Kept on self: the workers attach to the barriers' semaphores after start() returns.
+        self._barrier = ctx.Barrier(workers)
+        options = {
+            "workers": workers, "config": config.to_dict(), "data": data_dir, "batch_size": batch_size,
+            "seq_len": seq_len, "seed": seed, "position": tuple(position), "accum_steps": accum_steps,
+            "grad_clip": grad_clip, "optimizer": dict(optimizer or {}),
+        }
+        self.processes = [
+            ctx.Process(target=_worker, args=(rank, options, self.shared.name, self.shared.layout,
+                                              self._step_barrier, self._barrier), daemon=True)
+            for rank in range(workers)
+        ]
+        # One BLAS thread pool per worker, sized so the workers together fill the machine.
+        saved = {var: os.environ.get(var) for var in THREAD_VARS}
+        os.environ.update({var: str(max(1, (os.cpu_count() or 1) // workers)) for var in THREAD_VARS})
+        try:
+            for process in self.processes:
+                process.start()
+        finally:
+            for var, value in saved.items():
+                if value is None:
+                    os.environ.pop(var)
+                else:
+                    os.environ[var] = value
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        """Breaks the barriers as soon as any worker dies, so step() fails instead of waiting forever."""
+        pending = {process.sentinel: process for process in self.processes}
+        while pending:
+            for sentinel in wait(list(pending)):
+                process = pending.pop(sentinel)
+                process.join()
+                if process.exitcode:
+                    self._step_barrier.abort()
+                    return
+
+    def step(self, lr):
+        """One synchronized optimizer step; returns (mean loss, gradient norm before clipping)."""
+        control = self.shared["control"]
+        control[LR], control[T] = lr, self.t
+        try:
+            self._step_barrier.wait()
+            self._step_barrier.wait()
+        except threading.BrokenBarrierError:
+            self.close()
+            codes = [process.exitcode for process in self.processes]
+            raise RuntimeError(f"a data-parallel worker failed (exit codes {codes})") from None
+        self.t += 1
+        stats = self.shared["stats"]
+        return float(stats[:, 0].mean()), math.sqrt(stats[:, 1].sum())
+
+    def state_dict(self):
+        """The shared AdamW state, in the same form as AdamW.state_dict()."""
+        return {"m": self.shared["m"], "v": self.shared["v"], "t": self.t}
+
+    def load_state_dict(self, state):
+        self.shared["m"][...] = state["m"]
+        self.shared["v"][...] = state["v"]
+        self.t = int(state["t"])
+
+    def close(self):
+        if not self.shared.arrays:
+            return
+        if not self._step_barrier.broken:
+            self.shared["control"][RUN] = 0.0
+            try:
+                self._step_barrier.wait(timeout=60)
+            except threading.BrokenBarrierError:
+                pass
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.model = None
+        self.shared.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,432 @@
+"""
+HTTP inference server with dynamic batching.
+
+Requests wait in a bounded queue. One engine task owns a KVCache with
+--max-batch slots and admits queued requests into free slots: when it is
+idle it waits up to --max-wait-ms after the first arrival for more to batch
+with, otherwise it takes whatever is already queued without waiting. New
+requests are prefilled together, then every step runs one decode() over all
+slots and samples each row with its own settings, so requests join and leave
+the batch between steps instead of waiting for a whole batch to finish.
+Forward passes run on a worker thread, which keeps the event loop free to
+stream tokens to clients as they are sampled. A full queue is answered with
+503 and Retry-After rather than held open.
+
+    POST /generate  {"prompt": "Mount Etna", "max_new_tokens": 100, "temperature": 0.8,
+                     "top_k": 40, "top_p": null, "seed": null, "stream": true}
+    GET  /metrics   p50/p99 latency and time to first token, tokens/s, queue depth
+    GET  /health
+
+A streamed response is newline-delimited JSON, one {"token", "text"} object
+per token and a final {"done": true, ...} summary.
+
+    python -m app.transformer.serve [--port 8000] [--max-batch 8] [--max-wait-ms 10] [--queue-size 64]
+"""
+import json
+import time
+import codecs
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.transformer.checkpoint import MODELS_DIR
+from app.transformer.generate import KVCache, decode, load_model, prefill, sample
+from app.transformer.tokenizer import TOKENIZER_FILE, Tokenizer
+
+HOST = "127.0.0.1"
+PORT = 8000
+MAX_BATCH = 8
+MAX_WAIT_MS = 10
+QUEUE_SIZE = 64
+MAX_NEW_TOKENS = 200
+LATENCY_WINDOW = 10_000
+THROUGHPUT_WINDOW_S = 10.0
+MAX_BODY = 1 << 20
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class Request:
+    """One generation request; the engine puts sampled token ids on `tokens` and None when it is done."""
+    def __init__(self, prompt, max_new_tokens, temperature=1.0, top_k=None, top_p=None, seed=None):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.rng = np.random.default_rng(seed)
+        self.tokens = asyncio.Queue()
+        self.n_tokens = 0
+        self.last_token = None
+        self.finish_reason = None
+        self.cancelled = False
+        self.submitted = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        token = await self.tokens.get()
+        if token is None:
+            raise StopAsyncIteration
+        return token
+
+
+class Metrics:
+    """Latency percentiles over the last LATENCY_WINDOW requests and tokens/s over the last few seconds."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.latency = deque(maxlen=LATENCY_WINDOW)
+        self.ttft = deque(maxlen=LATENCY_WINDOW)
+        self.steps = deque()
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.total_tokens = 0
+        self.total_steps = 0
+        self.total_rows = 0
+
+    def step(self, tokens, decode=True):
+        """Records `tokens` sampled in one forward pass; only decode steps count towards the mean batch."""
+        now = time.perf_counter()
+        self.steps.append((now, tokens))
+        while self.steps and self.steps[0][0] < now - THROUGHPUT_WINDOW_S:
+            self.steps.popleft()
+        self.total_tokens += tokens
+        if decode:
+            self.total_steps += 1
+            self.total_rows += tokens
+
+    def finish(self, request):
+        if request.cancelled:
+            self.cancelled += 1
+            return
+        self.completed += 1
+        self.latency.append(request.finished_at - request.submitted)
+        if request.first_token_at is not None:
+            self.ttft.append(request.first_token_at - request.submitted)
+
+    def snapshot(self):
+        now = time.perf_counter()
+        recent = sum(tokens for t, tokens in self.steps if t >= now - THROUGHPUT_WINDOW_S)
+        span = min(THROUGHPUT_WINDOW_S, now - self.started)
+
+        def ms(values, q):
+            return round(float(np.percentile(values, q)) * 1000, 2) if values else None
+
+        return {
+            "requests": self.completed,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "tokens": self.total_tokens,
+            "latency_p50_ms": ms(self.latency, 50),
+            "latency_p99_ms": ms(self.latency, 99),
+            "ttft_p50_ms": ms(self.ttft, 50),
+            "ttft_p99_ms": ms(self.ttft, 99),
+            "tokens_per_s": round(recent / span, 1) if span > 0 else 0.0,
+            "mean_batch": round(self.total_rows / self.total_steps, 2) if self.total_steps else None,
+            "uptime_s": round(now - self.started, 1),
+        }
+
+
+class Engine:
+    def __init__(self, model, eos_id=None, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, queue_size=QUEUE_SIZE):
+        self.model = model
+        self.eos_id = eos_id
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.cache = KVCache(model.config, max_batch)
+        self.active = [None] * max_batch
+        self.metrics = Metrics()
+        # One thread: the model's workspaces and the cache are not shared between passes.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="forward")
+
+    def submit(self, request):
+        """Queues a request, or raises asyncio.QueueFull so the caller can push back."""
+        block_size = self.model.config.block_size
+        if not 0 < request.max_new_tokens < block_size:
+            raise BadRequest(f"max_new_tokens must be between 1 and {block_size - 1}")
+        if not request.prompt:
+            raise BadRequest("prompt encodes to no tokens")
+        request.prompt = request.prompt[-(block_size - request.max_new_tokens):]
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.metrics.rejected += 1
+            raise
+
+    @property
+    def n_active(self):
+        return sum(request is not None for request in self.active)
+
+    async def _admit(self, free):
+        """Up to `free` queued requests; waits for the first and the batching window only when idle."""
+        batch = []
+        if not self.n_active:
+            batch.append(await self.queue.get())
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < free and (timeout := deadline - time.perf_counter()) > 0:
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except TimeoutError:
+                    break
+        while len(batch) < free and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        self.metrics.cancelled += sum(request.cancelled for request in batch)
+        return [request for request in batch if not request.cancelled]
+
+    def _emit(self, slot, request, token):
+        now = time.perf_counter()
+        if request.first_token_at is None:
+            request.first_token_at = now
+        if self.eos_id is not None and token == self.eos_id:
+            request.finish_reason = "eos"
+        else:
+            request.tokens.put_nowait(token)
+            request.n_tokens += 1
+            request.last_token = token
+            if request.n_tokens >= request.max_new_tokens:
+                request.finish_reason = "length"
+        if request.finish_reason is not None:
+            self._release(slot, request)
+
+    def _release(self, slot, request):
+        request.finished_at = time.perf_counter()
+        request.tokens.put_nowait(None)
+        self.active[slot] = None
+        self.cache.reset(slot)
+        self.metrics.finish(request)
+
+    def _sample(self, logits, requests):
+        return [int(sample(logits[row:row + 1], r.rng, r.temperature, r.top_k, r.top_p)[0])
+                for row, r in enumerate(requests)]
+
+    def _prefill(self, slots, requests):
+        logits = prefill(self.model, self.cache, slots, [r.prompt for r in requests])
+        return self._sample(logits, requests)
+
+    def _decode(self, slots, tokens):
+        # Free slots stay at length 0 so they do not stretch the attended range.
+        self.cache.reset([s for s, request in enumerate(self.active) if request is None])
+        logits = decode(self.model, self.cache, tokens)
+        return self._sample(logits[slots], [self.active[s] for s in slots])
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            for slot, request in enumerate(self.active):
+                if request is not None and request.cancelled:
+                    self._release(slot, request)
+            free = [slot for slot, request in enumerate(self.active) if request is None]
+            if free:
+                admitted = await self._admit(len(free))
+                if admitted:
+                    slots = free[:len(admitted)]
+                    for slot, request in zip(slots, admitted):
+                        self.active[slot] = request
+                    tokens = await loop.run_in_executor(self._executor, self._prefill, slots, admitted)
+                    for slot, request, token in zip(slots, admitted, tokens):
+                        self._emit(slot, request, token)
+                    self.metrics.step(len(admitted), decode=False)
+
+            slots = [slot for slot, request in enumerate(self.active) if request is not None]
+            if not slots:
+                continue
+            tokens = np.zeros(self.cache.slots, dtype=np.intp)
+            tokens[slots] = [self.active[slot].last_token for slot in slots]
+            sampled = await loop.run_in_executor(self._executor, self._decode, slots, tokens)
+            for slot, token in zip(slots, sampled):
+                self._emit(slot, self.active[slot], token)
+            self.metrics.step(len(slots))
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def read_request(reader):
+    """(method, path, body) of one HTTP/1.1 request."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise BadRequest("malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise BadRequest("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path.split("?", 1)[0], body
+
+
+def _head(status, content_type, extra=()):
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}", f"Content-Type: {content_type}", "Connection: close",
+             *extra]
+    return ("\r\n".join(lines) + "\r\n").encode("latin-1")
+
+
+async def respond(writer, status, payload, extra=()):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(_head(status, "application/json", (*extra, f"Content-Length: {len(body)}")) + b"\r\n" + body)
+    await writer.drain()
+
+
+def _parse_params(body, tokenizer):
+    try:
+        params = json.loads(body or b"{}")
+    except ValueError:
+        raise BadRequest("body is not JSON")
+    if not isinstance(params, dict) or not isinstance(params.get("prompt"), str):
+        raise BadRequest("prompt must be a string")
+    try:
+        request = Request(tokenizer.encode(params["prompt"]),
+                          int(params.get("max_new_tokens", MAX_NEW_TOKENS)),
+                          float(params.get("temperature", 1.0)),
+                          int(params["top_k"]) if params.get("top_k") is not None else None,
+                          float(params["top_p"]) if params.get("top_p") is not None else None,
+                          params.get("seed"))
+    except (TypeError, ValueError) as e:
+        raise BadRequest(f"invalid parameter: {e}")
+    if request.temperature < 0 or (request.top_k is not None and request.top_k < 1) \
+            or (request.top_p is not None and not 0 < request.top_p <= 1):
+        raise BadRequest("temperature must be >= 0, top_k >= 1 and top_p in (0, 1]")
+    return request, bool(params.get("stream", True))
+
+
+class Server:
+    def __init__(self, engine, tokenizer):
+        self.engine = engine
+        self.tokenizer = tokenizer
+
+    def _summary(self, request):
+        return {"done": True, "finish_reason": request.finish_reason, "prompt_tokens": len(request.prompt),
+                "tokens": request.n_tokens,
+                "ttft_ms": round((request.first_token_at - request.submitted) * 1000, 2),
+                "latency_ms": round((request.finished_at - request.submitted) * 1000, 2)}
+
+    async def handle(self, reader, writer):
+        request = None
+        try:
+            try:
+                method, path, body = await read_request(reader)
+            except (BadRequest, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+                return await respond(writer, 400, {"error": str(e) or "bad request"})
+            if path == "/health":
+                return await respond(writer, 200, {"status": "ok"})
+            if path == "/metrics":
+                return await respond(writer, 200, {**self.engine.metrics.snapshot(),
+                                                   "queue_depth": self.engine.queue.qsize(),
+                                                   "active": self.engine.n_active})
+            if path != "/generate":
+                return await respond(writer, 404, {"error": f"no route {path}"})
+            if method != "POST":
+                return await respond(writer, 405, {"error": "use POST"})
+            try:
+                request, stream = _parse_params(body, self.tokenizer)
+                self.engine.submit(request)
+            except BadRequest as e:
+                return await respond(writer, 400, {"error": str(e)})
+            except asyncio.QueueFull:
+                return await respond(writer, 503, {"error": "queue full"}, ("Retry-After: 1",))
+
+            # Tokens are bytes, not characters; the incremental decoder holds back split UTF-8 sequences.
+            utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            vocab = self.tokenizer.vocab
+            if not stream:
+                ids = [token async for token in request]
+                return await respond(writer, 200, {"text": utf8.decode(b"".join(vocab[i] for i in ids), final=True),
+                                                   **self._summary(request)})
+
+            writer.write(_head(200, "application/x-ndjson", ("Transfer-Encoding: chunked",)) + b"\r\n")
+            async for token in request:
+                self._chunk(writer, {"token": token, "text": utf8.decode(vocab[token])})
+                await writer.drain()
+            tail = utf8.decode(b"", final=True)
+            if tail:
+                self._chunk(writer, {"token": None, "text": tail})
+            self._chunk(writer, self._summary(request))
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if request is not None and request.finish_reason is None:
+                # The client went away mid-generation; the engine frees the slot on its next step.
+                request.cancelled = True
+            writer.close()
+
+    @staticmethod
+    def _chunk(writer, payload):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+
+async def report(metrics, interval):
+    while True:
+        await asyncio.sleep(interval)
+        m = metrics.snapshot()
+        print(f"{m['requests']} requests ({m['rejected']} rejected), latency p50 {m['latency_p50_ms']} ms "
+              f"p99 {m['latency_p99_ms']} ms, ttft p50 {m['ttft_p50_ms']} ms p99 {m['ttft_p99_ms']} ms, "
+              f"{m['tokens_per_s']} tokens/s, mean batch {m['mean_batch']}")
+
+
+async def serve(model, tokenizer, host=HOST, port=PORT, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS,
+                queue_size=QUEUE_SIZE, report_interval=None, ready=None):
+    """Runs the engine and the HTTP server until cancelled; `ready` (an asyncio.Event) is set once listening."""
+    engine = Engine(model, tokenizer.eot_id, max_batch, max_wait_ms, queue_size)
+    server = Server(engine, tokenizer)
+    tasks = [asyncio.create_task(engine.run())]
+    if report_interval:
+        tasks.append(asyncio.create_task(report(engine.metrics, report_interval)))
+    try:
+        async with await asyncio.start_server(server.handle, host, port) as listener:
+            print(f"Serving on http://{host}:{port} (batch {max_batch}, wait {max_wait_ms} ms, queue {queue_size})")
+            if ready is not None:
+                ready.set()
+            await asyncio.gather(listener.serve_forever(), *tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        engine.close()
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the latest checkpoint over HTTP with dynamic batching.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--models", default=MODELS_DIR, help="checkpoint directory")
+    parser.add_argument("--tokenizer", default=TOKENIZER_FILE, help="tokenizer file")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="requests decoded together")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="how long an idle server waits for more requests to batch with the first")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="queued requests beyond which new ones get 503")
+    parser.add_argument("--report-interval", type=float, default=30.0, help="seconds between metric lines (0 = off)")
+    args = parser.parse_args()
+
+    model, checkpoint = load_model(args.models)
+    tokenizer = Tokenizer.load(args.tokenizer)
+    print(f"Loaded {checkpoint.path}")
+    try:
+        asyncio.run(serve(model, tokenizer, args.host, args.port, args.max_batch, args.max_wait_ms,
+                          args.queue_size, args.report_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
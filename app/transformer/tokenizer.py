@@ -0,0 +1,261 @@
+"""
+Byte-level BPE tokenizer.
+
+Text is split into pre-tokens (words with their leading space, digit runs,
+punctuation, whitespace), each pre-token is taken as UTF-8 bytes and byte
+pairs are merged by rank. Any string round-trips, so there is no unknown token.
+
+Training counts every distinct pre-token once with its frequency, then keeps
+pair counts up to date incrementally: a merge only revisits the words that
+contain the merged pair, and the next pair comes off a heap with stale entries
+skipped, instead of recounting the corpus after every merge.
+
+    python -m app.transformer.tokenizer train [--input app/dataset/volcanoes.jsonl] [--vocab-size 16000]
+    python -m app.transformer.tokenizer encode "Mount Etna erupted in 1669."
+"""
+import os
+import re
+import sys
+import heapq
+import struct
+import time
+import argparse
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain
+
+import numpy as np
+
+TOKENIZER_FILE = os.path.join(os.path.dirname(__file__), '../../data/tokenizer.bpe')
+
+# GPT-2 style pre-tokenizer; digits are split in runs of up to three.
+PATTERN = r"""'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+"""
+EOT = "<|endoftext|>"
+DEFAULT_VOCAB_SIZE = 16000
+CACHE_SIZE = 1 << 16
+
+MAGIC = b"VBPE"
+VERSION = 1
+# magic, version, merge count, special token count, merge id width in bytes, pattern length
+HEADER = struct.Struct("<4sHIHBH")
+
+
+class Tokenizer:
+    """
+    Merges are (left id, right id) pairs; merge i creates token 256 + i, so a
+    token id is also its merge rank. Special tokens take the ids after the
+    merges and are only produced by explicit ids, never by encode().
+    """
+    def __init__(self, merges=(), special_tokens=(EOT,), pattern=PATTERN, cache_size=CACHE_SIZE):
+        self.merges = [tuple(pair) for pair in merges]
+        self.pattern = pattern
+        self._split = re.compile(pattern).findall
+        self.ranks = {pair: 256 + i for i, pair in enumerate(self.merges)}
+
+        self.vocab = [bytes([i]) for i in range(256)]
+        for left, right in self.merges:
+            self.vocab.append(self.vocab[left] + self.vocab[right])
+        self.special_tokens = {token: len(self.vocab) + i for i, token in enumerate(special_tokens)}
+        for token in special_tokens:
+            self.vocab.append(token.encode("utf-8"))
+
+        self._encode_word = lru_cache(maxsize=cache_size)(self._bpe)
+
+    @property
+    def vocab_size(self):
+        return len(self.vocab)
+
+    @property
+    def eot_id(self):
+        return self.special_tokens[EOT]
+
+    def _bpe(self, word):
+        ids = list(word.encode("utf-8"))
+        ranks = self.ranks
+        while len(ids) > 1:
+            best = min(zip(ids, ids[1:]), key=lambda pair: ranks.get(pair, sys.maxsize))
+            new_id = ranks.get(best)
+            if new_id is None:
+                break
+            merged, i = [], 0
+            while i < len(ids):
+                if i + 1 < len(ids) and ids[i] == best[0] and ids[i + 1] == best[1]:
+                    merged.append(new_id)
+                    i += 2
+                else:
+                    merged.append(ids[i])
+                    i += 1
+            ids = merged
+        return tuple(ids)
+
+    def encode(self, text):
+        return list(chain.from_iterable(map(self._encode_word, self._split(text))))
+
+    def encode_many(self, texts, eot=False):
+        """
+        Encodes a batch of texts. Each distinct pre-token in the batch is merged
+        once, then every text is assembled from the shared results. With
+        eot=True an end-of-text token is appended to each text.
+        """
+        words = [self._split(text) for text in texts]
+        encode_word = self._encode_word
+        lookup = {word: encode_word(word) for word in set().union(*words)}.__getitem__
+        tail = (self.eot_id,) if eot else ()
+        return [list(chain(chain.from_iterable(map(lookup, text_words)), tail)) for text_words in words]
+
+    def decode(self, ids):
+        vocab = self.vocab
+        return b"".join(vocab[i] for i in ids).decode("utf-8", errors="replace")
+
+    def cache_info(self):
+        return self._encode_word.cache_info()
+
+    def save(self, path=TOKENIZER_FILE):
+        """
+        Writes a fixed header, the pre-tokenizer pattern, the special tokens and
+        the merges as one packed little-endian integer array. The vocabulary is
+        rebuilt from the merges on load.
+        """
+        merges = np.array(self.merges, dtype=np.uint32).reshape(-1, 2)
+        width = 2 if self.vocab_size <= 1 << 16 else 4
+        pattern = self.pattern.encode("utf-8")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(merges), len(self.special_tokens), width, len(pattern)))
+            f.write(pattern)
+            for token in self.special_tokens:
+                data = token.encode("utf-8")
+                f.write(struct.pack("<H", len(data)) + data)
+            f.write(merges.astype(f"<u{width}").tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=TOKENIZER_FILE, cache_size=CACHE_SIZE):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, n_merges, n_special, width, pattern_len = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} tokenizer file")
+        pos = HEADER.size
+        pattern = data[pos:pos + pattern_len].decode("utf-8")
+        pos += pattern_len
+        special_tokens = []
+        for _ in range(n_special):
+            (length,) = struct.unpack_from("<H", data, pos)
+            special_tokens.append(data[pos + 2:pos + 2 + length].decode("utf-8"))
+            pos += 2 + length
+        merges = np.frombuffer(data, dtype=f"<u{width}", count=2 * n_merges, offset=pos).reshape(-1, 2)
+        return cls(merges.tolist(), special_tokens, pattern, cache_size)
+
+
+def train(texts, vocab_size=DEFAULT_VOCAB_SIZE, special_tokens=(EOT,), pattern=PATTERN, min_frequency=2, verbose=False):
+    """
+    Learns merges until the vocabulary (bytes + merges + special tokens)
+    reaches vocab_size, or no pair occurs at least min_frequency times.
+    """
+    split = re.compile(pattern).findall
+    word_counts = Counter()
+    for text in texts:
+        word_counts.update(split(text))
+
+    words = [list(word.encode("utf-8")) for word in word_counts]
+    freqs = list(word_counts.values())
+
+    pair_counts = defaultdict(int)
+    where = defaultdict(set)
+    for index, (ids, freq) in enumerate(zip(words, freqs)):
+        for pair in zip(ids, ids[1:]):
+            pair_counts[pair] += freq
+            where[pair].add(index)
+    heap = [(-count, pair) for pair, count in pair_counts.items()]
+    heapq.heapify(heap)
+
+    merges = []
+    n_merges = vocab_size - 256 - len(special_tokens)
+    start = time.perf_counter()
+    while len(merges) < n_merges and heap:
+        neg_count, pair = heapq.heappop(heap)
+        if pair_counts.get(pair, 0) != -neg_count:
+            continue
+        if -neg_count < min_frequency:
+            break
+        new_id = 256 + len(merges)
+        merges.append(pair)
+        left, right = pair
+
+        changed = set()
+        for index in where.pop(pair):
+            ids = words[index]
+            if len(ids) < 2:
+                continue
+            freq = freqs[index]
+            merged, i, found = [], 0, False
+            while i < len(ids):
+                if i + 1 < len(ids) and ids[i] == left and ids[i + 1] == right:
+                    merged.append(new_id)
+                    i += 2
+                    found = True
+                else:
+                    merged.append(ids[i])
+                    i += 1
+            if not found:
+                continue
+            for old in zip(ids, ids[1:]):
+                pair_counts[old] -= freq
+                changed.add(old)
+            for new in zip(merged, merged[1:]):
+                pair_counts[new] += freq
+                where[new].add(index)
+                changed.add(new)
+            words[index] = merged
+
+        pair_counts.pop(pair, None)
+        changed.discard(pair)
+        for p in changed:
+            count = pair_counts[p]
+            if count > 0:
+                heapq.heappush(heap, (-count, p))
+            else:
+                del pair_counts[p]
+        if verbose and len(merges) % 1000 == 0:
+            print(f"{len(merges)} merges, {time.perf_counter() - start:.1f}s")
+
+    return Tokenizer(merges, special_tokens, pattern)
+
+
+def main():
+    from app.corpus.text import RECORDS_FILE, iter_texts
+
+    parser = argparse.ArgumentParser(description="Train or try out the byte-level BPE tokenizer.")
+    parser.add_argument("--tokenizer", default=TOKENIZER_FILE, help="tokenizer file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    tr = sub.add_parser("train", help="learn merges from the volcano records")
+    tr.add_argument("--input", nargs="+", default=[RECORDS_FILE], help="JSONL records, a JSON array or .txt files")
+    tr.add_argument("--vocab-size", type=int, default=DEFAULT_VOCAB_SIZE)
+    enc = sub.add_parser("encode", help="print the tokens for a string")
+    enc.add_argument("text")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        def texts():
+            for path in args.input:
+                if path.endswith(".txt"):
+                    with open(path, encoding="utf-8") as f:
+                        yield f.read()
+                else:
+                    yield from iter_texts(path)
+
+        start = time.perf_counter()
+        tokenizer = train(texts(), args.vocab_size, verbose=True)
+        tokenizer.save(args.tokenizer)
+        print(f"Trained {tokenizer.vocab_size} tokens in {time.perf_counter() - start:.1f}s, saved to {args.tokenizer}")
+    else:
+        tokenizer = Tokenizer.load(args.tokenizer)
+        ids = tokenizer.encode(args.text)
+        print(ids)
+        print(" | ".join(tokenizer.decode([i]) for i in ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+"""
+GPT-style decoder-only transformer in NumPy, with a hand-written backward pass.
+
+Everything runs in float32. Parameters and gradients each live in a single
+flat buffer with named views, so the optimizer, checkpoints and gradient
+exchange work on one array. Every layer owns a Workspace: activations kept
+for the backward pass and scratch arrays are written into buffers that are
+allocated on the first step and reused after that.
+
+Attention computes all heads at once with batched matmuls. In full mode the
+(B, H, T, T) score matrix is masked with a cached causal mask and normalised
+by an in-place, max-shifted softmax. In blockwise mode (attn_block set and
+T > attn_block) queries and keys are processed in tiles with an online
+softmax, so peak memory is O(T * block) and the backward pass recomputes the
+tiles from the saved log-sum-exp instead of storing the score matrix.
+"""
+import math
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+
+import numpy as np
+
+DTYPE = np.float32
+
+
+@dataclass
+class Config:
+    vocab_size: int = 16000
+    block_size: int = 256
+    n_layer: int = 4
+    n_head: int = 4
+    n_embd: int = 256
+    # Tile size for blockwise attention; None always materialises the full score matrix.
+    attn_block: int | None = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class Workspace:
+    """Named scratch arrays reused across steps; a buffer is only reallocated when it has to grow."""
+    def __init__(self, dtype=DTYPE):
+        self.dtype = dtype
+        self.buffers = {}
+
+    def get(self, name, shape):
+        size = math.prod(shape)
+        buf = self.buffers.get(name)
+        if buf is None or buf.size < size:
+            buf = self.buffers[name] = np.empty(size, dtype=self.dtype)
+        return buf[:size].reshape(shape)
+
+    def zeros(self, name, shape):
+        buf = self.get(name, shape)
+        buf.fill(0)
+        return buf
+
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self.buffers.values())
+
+
+@lru_cache(maxsize=16)
+def causal_mask(size):
+    """Additive (size, size) mask: 0 on and below the diagonal, -inf above. Shared and read-only."""
+    mask = np.triu(np.full((size, size), -np.inf, dtype=DTYPE), k=1)
+    mask.flags.writeable = False
+    return mask
+
+
+def softmax_(x):
+    """Numerically stable softmax over the last axis, in place."""
+    x -= x.max(axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=-1, keepdims=True)
+    return x
+
+
+class ParamSet:
+    """Named float32 arrays that are views into one flat buffer, in `specs` order."""
+    def __init__(self, specs, buffer=None):
+        self.specs = list(specs)
+        self.size = sum(math.prod(shape) for _, shape in self.specs)
+        self.data = np.zeros(self.size, dtype=DTYPE) if buffer is None else buffer
+        if self.data.shape != (self.size,) or self.data.dtype != DTYPE:
+            raise ValueError(f"expected a flat {np.dtype(DTYPE).name} buffer of {self.size} values")
+        self.views = {}
+        offset = 0
+        for name, shape in self.specs:
+            n = math.prod(shape)
+            self.views[name] = self.data[offset:offset + n].reshape(shape)
+            offset += n
+
+    def __getitem__(self, name):
+        return self.views[name]
+
+    def items(self):
+        return self.views.items()
+
+
+def _accumulate_matmul(ws, name, grad, a, b):
+    """grad += a @ b through a reused scratch buffer."""
+    out = ws.get(name, grad.shape)
+    np.matmul(a, b, out=out)
+    grad += out
+
+
+class LayerNorm:
+    def __init__(self, params, grads, prefix, eps=1e-5):
+        self.g, self.b = params[f"{prefix}.g"], params[f"{prefix}.b"]
+        self.dg, self.db = grads[f"{prefix}.g"], grads[f"{prefix}.b"]
+        self.eps = eps
+        self.ws = Workspace()
+
+    def forward(self, x):
+        ws = self.ws
+        mean = x.mean(axis=-1, keepdims=True)
+        xhat = ws.get("xhat", x.shape)
+        np.subtract(x, mean, out=xhat)
+        var = np.einsum("...c,...c->...", xhat, xhat)[..., None] / x.shape[-1]
+        self.rstd = 1.0 / np.sqrt(var + self.eps)
+        xhat *= self.rstd
+        self.xhat = xhat
+        out = ws.get("out", x.shape)
+        np.multiply(xhat, self.g, out=out)
+        out += self.b
+        return out
+
+    def backward(self, dout):
+        ws, xhat = self.ws, self.xhat
+        C = xhat.shape[-1]
+        d2 = dout.reshape(-1, C)
+        self.dg += np.einsum("nc,nc->c", d2, xhat.reshape(-1, C))
+        self.db += d2.sum(axis=0)
+        dxhat = ws.get("dxhat", dout.shape)
+        np.multiply(dout, self.g, out=dxhat)
+        mean_d = dxhat.mean(axis=-1, keepdims=True)
+        mean_dx = np.einsum("...c,...c->...", dxhat, xhat)[..., None] / C
+        dx = ws.get("dx", dout.shape)
+        np.multiply(xhat, mean_dx, out=dx)
+        np.subtract(dxhat, dx, out=dx)
+        dx -= mean_d
+        dx *= self.rstd
+        return dx
+
+
+class MultiHeadAttention:
+    """Causal self-attention over all heads at once; see the module docstring for the two modes."""
+    def __init__(self, params, grads, prefix, n_head, attn_block=None):
+        self.w_qkv, self.b_qkv = params[f"{prefix}.w_qkv"], params[f"{prefix}.b_qkv"]
+        self.w_proj, self.b_proj = params[f"{prefix}.w_proj"], params[f"{prefix}.b_proj"]
+        self.dw_qkv, self.db_qkv = grads[f"{prefix}.w_qkv"], grads[f"{prefix}.b_qkv"]
+        self.dw_proj, self.db_proj = grads[f"{prefix}.w_proj"], grads[f"{prefix}.b_proj"]
+        self.n_head = n_head
+        self.attn_block = attn_block
+        self.ws = Workspace()
+
+    def _blockwise(self, T):
+        return self.attn_block is not None and T > self.attn_block
+
+    def forward(self, x):
+        ws = self.ws
+        B, T, C = x.shape
+        H = self.n_head
+        D = C // H
+        self.x = x
+
+        qkv = ws.get("qkv", (B, T, 3 * C))
+        np.matmul(x, self.w_qkv, out=qkv)
+        qkv += self.b_qkv
+        heads = qkv.reshape(B, T, 3, H, D).transpose(2, 0, 3, 1, 4)
+        q, k, v = (ws.get(name, (B, H, T, D)) for name in ("q", "k", "v"))
+        np.copyto(q, heads[0])
+        np.copyto(k, heads[1])
+        np.copyto(v, heads[2])
+        # Folding the 1/sqrt(D) scale into q saves a pass over the scores.
+        q *= 1.0 / math.sqrt(D)
+        self.q, self.k, self.v = q, k, v
+
+        y = ws.get("y", (B, H, T, D))
+        if self._blockwise(T):
+            self._blockwise_forward(q, k, v, y)
+        else:
+            att = ws.get("att", (B, H, T, T))
+            np.matmul(q, k.swapaxes(-1, -2), out=att)
+            att += causal_mask(T)
+            self.att = softmax_(att)
+            np.matmul(att, v, out=y)
+        self.y = y
+
+        merged = ws.get("merged", (B, T, C))
+        np.copyto(merged.reshape(B, T, H, D), y.transpose(0, 2, 1, 3))
+        self.merged = merged
+        out = ws.get("out", (B, T, C))
+        np.matmul(merged, self.w_proj, out=out)
+        out += self.b_proj
+        return out
+
+    def _blockwise_forward(self, q, k, v, y):
+        ws = self.ws
+        B, H, T, D = q.shape
+        blk = self.attn_block
+        lse = ws.get("lse", (B, H, T))
+        for i0 in range(0, T, blk):
+            i1 = min(i0 + blk, T)
+            bq = i1 - i0
+            qi = q[:, :, i0:i1]
+            acc = y[:, :, i0:i1]
+            acc.fill(0)
+            m = np.full((B, H, bq), -np.inf, dtype=DTYPE)
+            l = np.zeros((B, H, bq), dtype=DTYPE)
+            for j0 in range(0, i1, blk):
+                j1 = min(j0 + blk, T)
+                s = ws.get("s", (B, H, bq, j1 - j0))
+                np.matmul(qi, k[:, :, j0:j1].swapaxes(-1, -2), out=s)
+                if j0 == i0:
+                    s += causal_mask(bq)
+                m_new = np.maximum(m, s.max(axis=-1))
+                s -= m_new[..., None]
+                np.exp(s, out=s)
+                correction = np.exp(m - m_new)
+                l *= correction
+                l += s.sum(axis=-1)
+                acc *= correction[..., None]
+                pv = ws.get("pv", (B, H, bq, D))
+                np.matmul(s, v[:, :, j0:j1], out=pv)
+                acc += pv
+                m = m_new
+            acc /= l[..., None]
+            lse[:, :, i0:i1] = m + np.log(l)
+        self.lse = lse
+
+    def backward(self, dout):
+        ws = self.ws
+        B, T, C = dout.shape
+        H = self.n_head
+        D = C // H
+        q, k, v = self.q, self.k, self.v
+
+        d2 = dout.reshape(-1, C)
+        _accumulate_matmul(ws, "g_proj", self.dw_proj, self.merged.reshape(-1, C).T, d2)
+        self.db_proj += d2.sum(axis=0)
+        dmerged = ws.get("dmerged", (B, T, C))
+        np.matmul(dout, self.w_proj.T, out=dmerged)
+        dy = ws.get("dy", (B, H, T, D))
+        np.copyto(dy, dmerged.reshape(B, T, H, D).transpose(0, 2, 1, 3))
+
+        dq, dk, dv = (ws.get(name, (B, H, T, D)) for name in ("dq", "dk", "dv"))
+        if self._blockwise(T):
+            self._blockwise_backward(dy, dq, dk, dv)
+        else:
+            att = self.att
+            np.matmul(att.swapaxes(-1, -2), dy, out=dv)
+            datt = ws.get("datt", (B, H, T, T))
+            np.matmul(dy, v.swapaxes(-1, -2), out=datt)
+            # Softmax backward: dS = P * (dP - sum(dP * P)).
+            datt -= np.einsum("...ij,...ij->...i", datt, att)[..., None]
+            datt *= att
+            np.matmul(datt, k, out=dq)
+            np.matmul(datt.swapaxes(-1, -2), q, out=dk)
+        dq *= 1.0 / math.sqrt(D)
+
+        dqkv = ws.get("dqkv", (B, T, 3 * C))
+        dheads = dqkv.reshape(B, T, 3, H, D).transpose(2, 0, 3, 1, 4)
+        np.copyto(dheads[0], dq)
+        np.copyto(dheads[1], dk)
+        np.copyto(dheads[2], dv)
+        dqkv2 = dqkv.reshape(-1, 3 * C)
+        _accumulate_matmul(ws, "g_qkv", self.dw_qkv, self.x.reshape(-1, C).T, dqkv2)
+        self.db_qkv += dqkv2.sum(axis=0)
+        dx = ws.get("dx", (B, T, C))
+        np.matmul(dqkv, self.w_qkv.T, out=dx)
+        return dx
+
+    def _blockwise_backward(self, dy, dq, dk, dv):
+        ws = self.ws
+        q, k, v, lse = self.q, self.k, self.v, self.lse
+        B, H, T, D = q.shape
+        blk = self.attn_block
+        dq.fill(0)
+        dk.fill(0)
+        dv.fill(0)
+        delta = np.einsum("bhtd,bhtd->bht", dy, self.y)
+        for i0 in range(0, T, blk):
+            i1 = min(i0 + blk, T)
+            bq = i1 - i0
+            qi, dyi = q[:, :, i0:i1], dy[:, :, i0:i1]
+            for j0 in range(0, i1, blk):
+                j1 = min(j0 + blk, T)
+                bk = j1 - j0
+                kj, vj = k[:, :, j0:j1], v[:, :, j0:j1]
+                p = ws.get("s", (B, H, bq, bk))
+                np.matmul(qi, kj.swapaxes(-1, -2), out=p)
+                if j0 == i0:
+                    p += causal_mask(bq)
+                p -= lse[:, :, i0:i1, None]
+                np.exp(p, out=p)
+
+                tile = ws.get("tile", (B, H, bk, D))
+                np.matmul(p.swapaxes(-1, -2), dyi, out=tile)
+                dv[:, :, j0:j1] += tile
+                ds = ws.get("ds", (B, H, bq, bk))
+                np.matmul(dyi, vj.swapaxes(-1, -2), out=ds)
+                ds -= delta[:, :, i0:i1, None]
+                ds *= p
+                qtile = ws.get("qtile", (B, H, bq, D))
+                np.matmul(ds, kj, out=qtile)
+                dq[:, :, i0:i1] += qtile
+                np.matmul(ds.swapaxes(-1, -2), qi, out=tile)
+                dk[:, :, j0:j1] += tile
+
+
+GELU_K = math.sqrt(2.0 / math.pi)
+
+
+class MLP:
+    def __init__(self, params, grads, prefix):
+        self.w_fc, self.b_fc = params[f"{prefix}.w_fc"], params[f"{prefix}.b_fc"]
+        self.w_out, self.b_out = params[f"{prefix}.w_out"], params[f"{prefix}.b_out"]
+        self.dw_fc, self.db_fc = grads[f"{prefix}.w_fc"], grads[f"{prefix}.b_fc"]
+        self.dw_out, self.db_out = grads[f"{prefix}.w_out"], grads[f"{prefix}.b_out"]
+        self.ws = Workspace()
+
+    def forward(self, x):
+        ws = self.ws
+        B, T, C = x.shape
+        self.x = x
+        h = ws.get("h", (B, T, 4 * C))
+        np.matmul(x, self.w_fc, out=h)
+        h += self.b_fc
+        # tanh-approximated GELU; t is kept for the backward pass.
+        t = ws.get("t", h.shape)
+        np.multiply(h, h, out=t)
+        t *= 0.044715
+        t += 1.0
+        t *= h
+        t *= GELU_K
+        np.tanh(t, out=t)
+        a = ws.get("a", h.shape)
+        np.add(t, 1.0, out=a)
+        a *= h
+        a *= 0.5
+        self.h, self.t, self.a = h, t, a
+        out = ws.get("out", (B, T, C))
+        np.matmul(a, self.w_out, out=out)
+        out += self.b_out
+        return out
+
+    def backward(self, dout):
+        ws = self.ws
+        B, T, C = dout.shape
+        h, t = self.h, self.t
+        d2 = dout.reshape(-1, C)
+        _accumulate_matmul(ws, "g_out", self.dw_out, self.a.reshape(-1, 4 * C).T, d2)
+        self.db_out += d2.sum(axis=0)
+        da = ws.get("da", h.shape)
+        np.matmul(dout, self.w_out.T, out=da)
+
+        # d gelu/dh = 0.5 (1 + t) + 0.5 h (1 - t^2) k (1 + 3 * 0.044715 h^2)
+        grad = ws.get("grad", h.shape)
+        np.multiply(h, h, out=grad)
+        grad *= 3 * 0.044715
+        grad += 1.0
+        grad *= GELU_K * 0.5
+        grad *= h
+        tt = ws.get("tt", h.shape)
+        np.multiply(t, t, out=tt)
+        np.subtract(1.0, tt, out=tt)
+        grad *= tt
+        grad += 0.5
+        np.multiply(t, 0.5, out=tt)
+        grad += tt
+        da *= grad
+
+        _accumulate_matmul(ws, "g_fc", self.dw_fc, self.x.reshape(-1, C).T, da.reshape(-1, 4 * C))
+        self.db_fc += da.reshape(-1, 4 * C).sum(axis=0)
+        dx = ws.get("dx", (B, T, C))
+        np.matmul(da, self.w_fc.T, out=dx)
+        return dx
+
+
+class Block:
+    def __init__(self, params, grads, prefix, config):
+        self.ln1 = LayerNorm(params, grads, f"{prefix}.ln1")
+        self.attn = MultiHeadAttention(params, grads, f"{prefix}.attn", config.n_head, config.attn_block)
+        self.ln2 = LayerNorm(params, grads, f"{prefix}.ln2")
+        self.mlp = MLP(params, grads, f"{prefix}.mlp")
+        self.ws = Workspace()
+
+    def forward(self, x):
+        h = self.ws.get("h", x.shape)
+        np.add(x, self.attn.forward(self.ln1.forward(x)), out=h)
+        out = self.ws.get("out", x.shape)
+        np.add(h, self.mlp.forward(self.ln2.forward(h)), out=out)
+        return out
+
+    def backward(self, dout):
+        dh = self.ws.get("dh", dout.shape)
+        np.add(dout, self.ln2.backward(self.mlp.backward(dout)), out=dh)
+        dx = self.ws.get("dx", dout.shape)
+        np.add(dh, self.ln1.backward(self.attn.backward(dh)), out=dx)
+        return dx
+
+
+def param_specs(config):
+    C, V = config.n_embd, config.vocab_size
+    specs = [("wte", (V, C)), ("wpe", (config.block_size, C))]
+    for i in range(config.n_layer):
+        p = f"h{i}"
+        specs += [
+            (f"{p}.ln1.g", (C,)), (f"{p}.ln1.b", (C,)),
+            (f"{p}.attn.w_qkv", (C, 3 * C)), (f"{p}.attn.b_qkv", (3 * C,)),
+            (f"{p}.attn.w_proj", (C, C)), (f"{p}.attn.b_proj", (C,)),
+            (f"{p}.ln2.g", (C,)), (f"{p}.ln2.b", (C,)),
+            (f"{p}.mlp.w_fc", (C, 4 * C)), (f"{p}.mlp.b_fc", (4 * C,)),
+            (f"{p}.mlp.w_out", (4 * C, C)), (f"{p}.mlp.b_out", (C,))
+        ]
+    specs += [("ln_f.g", (C,)), ("ln_f.b", (C,))]
+    return specs
+
+
+class GPT:
+    """
+    Decoder-only transformer with the output projection tied to the token
+    embedding. loss() runs the forward pass and keeps what backward() needs;
+    backward() adds into the gradient buffer, so call zero_grad() between
+    optimizer steps (and not between accumulated micro-batches).
+    """
+    def __init__(self, config, seed=0, param_buffer=None, grad_buffer=None):
+        if config.n_embd % config.n_head:
+            raise ValueError("n_embd must be divisible by n_head")
+        self.config = config
+        specs = param_specs(config)
+        self.params = ParamSet(specs, param_buffer)
+        self.grads = ParamSet(specs, grad_buffer)
+        if param_buffer is None:
+            self.init_weights(seed)
+        self.blocks = [Block(self.params, self.grads, f"h{i}", config) for i in range(config.n_layer)]
+        self.ln_f = LayerNorm(self.params, self.grads, "ln_f")
+        self.ws = Workspace()
+
+    def init_weights(self, seed=0):
+        rng = np.random.default_rng(seed)
+        residual_std = 0.02 / math.sqrt(2 * self.config.n_layer)
+        for name, view in self.params.items():
+            if name.endswith(".g"):
+                view.fill(1.0)
+            elif name.endswith((".w_proj", ".w_out")):
+                view[...] = rng.normal(0.0, residual_std, view.shape)
+            elif view.ndim == 2:
+                view[...] = rng.normal(0.0, 0.02, view.shape)
+            else:
+                view.fill(0.0)
+
+    @property
+    def n_params(self):
+        return self.params.size
+
+    def zero_grad(self):
+        self.grads.data.fill(0)
+
+    def forward(self, idx):
+        """Logits (B, T, vocab_size) for token ids idx (B, T). The array is reused by the next call."""
+        B, T = idx.shape
+        if T > self.config.block_size:
+            raise ValueError(f"sequence length {T} exceeds block_size {self.config.block_size}")
+        ws = self.ws
+        wte = self.params["wte"]
+        self.idx = idx
+        x = ws.get("x", (B, T, self.config.n_embd))
+        np.take(wte, idx, axis=0, out=x)
+        x += self.params["wpe"][:T]
+        for block in self.blocks:
+            x = block.forward(x)
+        self.h = self.ln_f.forward(x)
+        logits = ws.get("logits", (B, T, wte.shape[0]))
+        np.matmul(self.h, wte.T, out=logits)
+        return logits
+
+    def loss(self, idx, targets):
+        """Mean cross-entropy of predicting targets (B, T) from idx (B, T)."""
+        logits = self.forward(idx)
+        logits -= logits.max(axis=-1, keepdims=True)
+        picked = np.take_along_axis(logits, targets[..., None].astype(np.intp), axis=-1)[..., 0]
+        np.exp(logits, out=logits)
+        sums = logits.sum(axis=-1, keepdims=True)
+        loss = float(np.mean(np.log(sums[..., 0]) - picked))
+        logits /= sums
+        self.probs, self.targets = logits, targets
+        return loss
+
+    def backward(self):
+        """Accumulates d(loss)/d(params) for the last loss() call into self.grads."""
+        ws = self.ws
+        probs, targets = self.probs, self.targets
+        B, T, V = probs.shape
+        C = self.config.n_embd
+        wte, dwte = self.params["wte"], self.grads["wte"]
+
+        dlogits = probs.reshape(-1, V)
+        dlogits[np.arange(B * T), targets.reshape(-1)] -= 1.0
+        dlogits /= B * T
+        _accumulate_matmul(ws, "g_wte", dwte, dlogits.T, self.h.reshape(-1, C))
+        dh = ws.get("dh", (B, T, C))
+        np.matmul(probs, wte, out=dh)
+
+        dx = self.ln_f.backward(dh)
+        for block in reversed(self.blocks):
+            dx = block.backward(dx)
+        np.add.at(dwte, self.idx.reshape(-1), dx.reshape(-1, C))
+        self.grads["wpe"][:T] += dx.sum(axis=0)
+
+    def generate(self, prompts, max_new_tokens, **kwargs):
+        """Batched KV-cached generation; see app.transformer.generate.generate for the options."""
+        from app.transformer.generate import generate
+        return generate(self, prompts, max_new_tokens, **kwargs)
+
+    def workspace_bytes(self):
+        layers = [self.ws, self.ln_f.ws]
+        for block in self.blocks:
+            layers += [block.ws, block.ln1.ws, block.attn.ws, block.ln2.ws, block.mlp.ws]
+        return sum(ws.nbytes() for ws in layers)
@@ -0,0 +1,118 @@
+"""
+Attention forward + backward throughput and memory on random float32 inputs.
+
+Compares a straightforward per-head loop that allocates fresh arrays every
+call with MultiHeadAttention in full mode and in blockwise mode, checks they
+agree and reports time per step, workspace size and peak memory allocated
+during a step.
+
+    python -m benchmarks.bench_attention [--seq-len 512] [--block 64] [--repeat 5]
+"""
+import math
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from app.transformer.transformer import MultiHeadAttention, ParamSet
+
+
+def attention_params(n_embd, seed=0):
+    C = n_embd
+    specs = [("attn.w_qkv", (C, 3 * C)), ("attn.b_qkv", (3 * C,)), ("attn.w_proj", (C, C)), ("attn.b_proj", (C,))]
+    params, grads = ParamSet(specs), ParamSet(specs)
+    params.data[:] = np.random.default_rng(seed).normal(0.0, 0.02, params.size)
+    return params, grads
+
+
+def loop_attention(params, x, dout, n_head):
+    """Reference: one head at a time, new arrays everywhere. Returns (out, dx)."""
+    B, T, C = x.shape
+    D = C // n_head
+    w_qkv, b_qkv, w_proj = params["attn.w_qkv"], params["attn.b_qkv"], params["attn.w_proj"]
+    qkv = x @ w_qkv + b_qkv
+    mask = np.triu(np.ones((T, T), dtype=bool), k=1)
+    y = np.zeros((B, T, C), dtype=np.float32)
+    cache = []
+    for h in range(n_head):
+        q = qkv[:, :, h * D:(h + 1) * D]
+        k = qkv[:, :, C + h * D:C + (h + 1) * D]
+        v = qkv[:, :, 2 * C + h * D:2 * C + (h + 1) * D]
+        s = q @ k.transpose(0, 2, 1) / math.sqrt(D)
+        s = np.where(mask, -np.inf, s)
+        p = np.exp(s - s.max(axis=-1, keepdims=True))
+        p = p / p.sum(axis=-1, keepdims=True)
+        y[:, :, h * D:(h + 1) * D] = p @ v
+        cache.append((q, k, v, p))
+    out = y @ w_proj + params["attn.b_proj"]
+
+    dy = dout @ w_proj.T
+    dqkv = np.zeros_like(qkv)
+    for h, (q, k, v, p) in enumerate(cache):
+        dyh = dy[:, :, h * D:(h + 1) * D]
+        dp = dyh @ v.transpose(0, 2, 1)
+        ds = p * (dp - (dp * p).sum(axis=-1, keepdims=True)) / math.sqrt(D)
+        dqkv[:, :, h * D:(h + 1) * D] = ds @ k
+        dqkv[:, :, C + h * D:C + (h + 1) * D] = ds.transpose(0, 2, 1) @ q
+        dqkv[:, :, 2 * C + h * D:2 * C + (h + 1) * D] = p.transpose(0, 2, 1) @ dyh
+    return out, dqkv @ w_qkv.T
+
+
+def measure(step, repeat):
+    """Returns (seconds per step, peak bytes allocated during one warm step, last result)."""
+    result = step()
+    tracemalloc.start()
+    step()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = step()
+    return (time.perf_counter() - start) / repeat, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-head attention forward + backward.")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--seq-len", type=int, default=512)
+    parser.add_argument("--n-embd", type=int, default=256)
+    parser.add_argument("--n-head", type=int, default=8)
+    parser.add_argument("--block", type=int, default=64, help="tile size for blockwise attention")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((args.batch_size, args.seq_len, args.n_embd)).astype(np.float32)
+    dout = rng.standard_normal(x.shape).astype(np.float32)
+    params, grads = attention_params(args.n_embd)
+
+    def module_step(attn):
+        def step():
+            out = attn.forward(x)
+            return out, attn.backward(dout)
+        return step
+
+    full = MultiHeadAttention(params, grads, "attn", args.n_head)
+    blockwise = MultiHeadAttention(params, grads, "attn", args.n_head, attn_block=args.block)
+    rows = [
+        ("per-head loop", lambda: loop_attention(params, x, dout, args.n_head), None),
+        ("vectorized, full", module_step(full), full),
+        (f"vectorized, blockwise {args.block}", module_step(blockwise), blockwise)
+    ]
+
+    print(f"B={args.batch_size} T={args.seq_len} C={args.n_embd} H={args.n_head}, forward + backward")
+    reference = None
+    for name, step, module in rows:
+        seconds, peak, (out, dx) = measure(step, args.repeat)
+        if reference is None:
+            reference = (out.copy(), dx.copy())
+        elif not (np.allclose(out, reference[0], atol=1e-4) and np.allclose(dx, reference[1], atol=1e-4)):
+            raise SystemExit(f"{name} disagrees with the per-head loop")
+        workspace = f"{module.ws.nbytes() / 2**20:7.1f} MiB" if module else "      -    "
+        print(f"{name:<26} {seconds * 1000:8.1f} ms/step   workspace {workspace}   "
+              f"allocated per step {peak / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
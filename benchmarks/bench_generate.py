@@ -0,0 +1,71 @@
+"""
+Per-token generation latency with and without the KV cache.
+
+Generates a long completion from a randomly initialised model and reports the
+mean time per token over successive windows of the sequence. The uncached
+baseline reruns the whole sequence through GPT.forward for every token.
+
+    python -m benchmarks.bench_generate [--tokens 512] [--window 64] [--baseline-tokens 128]
+"""
+import time
+import argparse
+
+import numpy as np
+
+from app.transformer.generate import KVCache, decode, prefill, sample
+from app.transformer.transformer import GPT, Config
+
+
+def cached_latencies(model, prompt, tokens):
+    cache = KVCache(model.config, 1, len(prompt) + tokens)
+    rng = np.random.default_rng(0)
+    times = []
+    start = time.perf_counter()
+    logits = prefill(model, cache, [0], [prompt])
+    for _ in range(tokens):
+        token = sample(logits, rng, temperature=0)
+        logits = decode(model, cache, token)
+        now = time.perf_counter()
+        times.append(now - start)
+        start = now
+    return np.array(times)
+
+
+def uncached_latencies(model, prompt, tokens):
+    seq = list(prompt)
+    times = []
+    for _ in range(tokens):
+        start = time.perf_counter()
+        logits = model.forward(np.array([seq]))[:, -1]
+        seq.append(int(logits.argmax()))
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark KV-cached generation.")
+    parser.add_argument("--tokens", type=int, default=512)
+    parser.add_argument("--window", type=int, default=64)
+    parser.add_argument("--baseline-tokens", type=int, default=128, help="tokens generated without the cache")
+    parser.add_argument("--n-layer", type=int, default=4)
+    parser.add_argument("--n-embd", type=int, default=256)
+    parser.add_argument("--vocab-size", type=int, default=16000)
+    args = parser.parse_args()
+
+    prompt = list(range(1, 17))
+    config = Config(vocab_size=args.vocab_size, block_size=len(prompt) + args.tokens + 1,
+                    n_layer=args.n_layer, n_head=4, n_embd=args.n_embd)
+    model = GPT(config)
+
+    cached = cached_latencies(model, prompt, args.tokens)
+    uncached = uncached_latencies(model, prompt, min(args.baseline_tokens, args.tokens))
+    print(f"{args.tokens} tokens after a {len(prompt)}-token prompt, ms per token")
+    print(f"{'tokens':>12} {'cached':>8} {'uncached':>9}")
+    for start in range(0, args.tokens, args.window):
+        window = slice(start, start + args.window)
+        base = f"{uncached[window].mean() * 1000:9.2f}" if start < len(uncached) else f"{'-':>9}"
+        print(f"{start:>5}-{min(start + args.window, args.tokens):<6} {cached[window].mean() * 1000:8.2f} {base}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Data-parallel training throughput and scaling efficiency.
+
+Trains the same model with 1, 2, 4, ... worker processes on a fixed global
+batch and reports tokens per second, the speedup over one worker and the
+scaling efficiency (speedup / workers). Without --data the shards are random
+tokens written to a temporary directory.
+
+    python -m benchmarks.bench_parallel [--workers 1,2,4] [--batch-size 16] [--seq-len 128] [--steps 20]
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from app.transformer.data import ShardWriter, shard_path
+from app.transformer.parallel import DataParallel
+from app.transformer.transformer import Config
+
+
+def random_shards(directory, vocab_size, n_tokens, seed=0):
+    rng = np.random.default_rng(seed)
+    with ShardWriter(shard_path(directory, "train", 0)) as writer:
+        for _ in range(0, n_tokens, 4096):
+            writer.add(rng.integers(0, vocab_size, 4096))
+
+
+def throughput(config, workers, data_dir, args):
+    with DataParallel(config, workers, data_dir, args.batch_size, args.seq_len, args.accum_steps) as trainer:
+        for _ in range(args.warmup):
+            trainer.step(1e-4)
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            trainer.step(1e-4)
+        return args.steps * trainer.tokens_per_step / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data-parallel training.")
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts (default: powers of two up to the core count)")
+    parser.add_argument("--data", default=None, help="token shard directory (default: random tokens)")
+    parser.add_argument("--batch-size", type=int, default=16, help="global micro-batch")
+    parser.add_argument("--seq-len", type=int, default=128)
+    parser.add_argument("--accum-steps", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--n-layer", type=int, default=4)
+    parser.add_argument("--n-embd", type=int, default=256)
+    parser.add_argument("--vocab-size", type=int, default=16000)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(n) for n in args.workers.split(",")]
+    else:
+        counts = [1 << i for i in range(cores.bit_length()) if 1 << i <= cores]
+    config = Config(vocab_size=args.vocab_size, block_size=args.seq_len, n_layer=args.n_layer,
+                    n_head=4, n_embd=args.n_embd, attn_block=64)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data or tmp
+        if not args.data:
+            random_shards(tmp, args.vocab_size, 4 * args.batch_size * (args.seq_len + 1) * args.accum_steps
+                          * (args.steps + args.warmup))
+        print(f"{cores} cores, global batch {args.batch_size} x {args.seq_len} x {args.accum_steps} accumulation steps")
+        print(f"{'workers':>7} {'tok/s':>9} {'tok/s/worker':>13} {'speedup':>8} {'efficiency':>11}")
+        base = None
+        for workers in counts:
+            rate = throughput(config, workers, data_dir, args)
+            base = base or rate / workers
+            speedup = rate / base
+            print(f"{workers:>7} {rate:>9.0f} {rate / workers:>13.0f} {speedup:>8.2f} {speedup / workers:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
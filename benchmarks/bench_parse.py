@@ -0,0 +1,111 @@
+"""
+GVP parse throughput on the saved pages in benchmarks/fixtures/gvp.
+
+Compares the multi-pass parser (full trees, one table lookup and row scan per
+section) with the single-pass get_gvp_data, checks both produce identical
+records and reports pages per second for each.
+
+    python -m benchmarks.bench_parse [--repeat 20] [--parser lxml]
+
+The fixtures are synthetic pages modelled on GVP markup, padded with the
+navigation, bibliography and gallery boilerplate real pages carry.
+"""
+import os
+import json
+import time
+import argparse
+from contextlib import contextmanager
+
+from bs4 import BeautifulSoup
+
+from app.scraper import scraper
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "gvp")
+
+
+def load_fixtures(path=FIXTURES):
+    with open(os.path.join(path, "volcanoes.json"), encoding="utf-8") as f:
+        volcanoes = json.load(f)
+    pages = []
+    for volcano in volcanoes:
+        with open(os.path.join(path, f"{volcano['gvp_id']}.html"), encoding="utf-8") as f:
+            html = f.read()
+        with open(os.path.join(path, f"{volcano['gvp_id']}_history.html"), encoding="utf-8") as f:
+            history_html = f.read()
+        pages.append((volcano, html, history_html))
+    return pages
+
+
+@contextmanager
+def full_trees():
+    """Parses whole documents with html.parser, as the scraper did before the strainers."""
+    saved = scraper.HTML_PARSER, scraper.GVP_PAGE_STRAINER, scraper.HISTORY_STRAINER
+    scraper.HTML_PARSER, scraper.GVP_PAGE_STRAINER, scraper.HISTORY_STRAINER = "html.parser", None, None
+    try:
+        yield
+    finally:
+        scraper.HTML_PARSER, scraper.GVP_PAGE_STRAINER, scraper.HISTORY_STRAINER = saved
+
+
+def parse_multipass(volcano, html, history_html):
+    """The previous get_gvp_data: each section looks up its table and rescans its rows."""
+    soup = BeautifulSoup(html, "html.parser")
+    data = scraper.init_data()
+    data["name"] = volcano.get("name")
+    data["gvp_id"] = volcano.get("gvp_id")
+    data["source"] = scraper.gvp_url(volcano["gvp_id"])
+
+    scraper.parse_volcano_info_table(soup, data)
+    content_areas = soup.find_all("div", class_="tabbed-content")
+    if not content_areas:
+        return data
+
+    basic_table = scraper.get_fact_table_by_heading(content_areas, "Basic Data")
+    if basic_table:
+        scraper.parse_basic_data(basic_table, data)
+        scraper.parse_rock_types(basic_table, data)
+        scraper.parse_morphology(basic_table, data)
+    summary_table = scraper.get_fact_table_by_heading(content_areas, "Geological Summary")
+    if summary_table:
+        scraper.parse_geological_summary(summary_table, data)
+    scraper.parse_synonyms(soup, data)
+    scraper.parse_features(soup, data)
+    with full_trees():
+        scraper.parse_eruption_history(volcano, data, history_html)
+    return data
+
+
+def parse_singlepass(volcano, html, history_html):
+    return scraper.get_gvp_data(volcano, html, history_html)
+
+
+def measure(parse, pages, repeat):
+    """Returns (pages per second, records from the last round)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        records = [parse(*page) for page in pages]
+    elapsed = time.perf_counter() - start
+    return 2 * len(pages) * repeat / elapsed, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GVP page parsing.")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the fixtures")
+    parser.add_argument("--parser", default=scraper.HTML_PARSER, help="tree builder for the single-pass parser")
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    scraper.HTML_PARSER = args.parser
+    before, expected = measure(parse_multipass, pages, args.repeat)
+    after, records = measure(parse_singlepass, pages, args.repeat)
+    if records != expected:
+        raise SystemExit("single-pass parser output differs from the multi-pass parser")
+
+    print(f"{len(pages)} volcanoes, {2 * len(pages)} pages x {args.repeat}")
+    print(f"multi-pass,  html.parser, full tree: {before:8.1f} pages/s")
+    print(f"single-pass, {args.parser}, strained: {after:8.1f} pages/s")
+    print(f"speedup: {after / before:.2f}x, records identical")
+
+
+if __name__ == "__main__":
+    main()
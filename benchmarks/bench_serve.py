@@ -0,0 +1,118 @@
+"""
+Load test of the batching inference server.
+
+Starts app.transformer.serve in-process with a randomly initialised model and
+a byte-level tokenizer, sends --requests streamed generations from
+--concurrency clients at once, and reports client-side time to first token,
+latency percentiles and tokens/s, first with --max-batch 1 (one request at a
+time) and then with dynamic batching.
+
+    python -m benchmarks.bench_serve [--requests 64] [--concurrency 16] [--max-batch 16] [--tokens 64]
+"""
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+from app.transformer.serve import serve
+from app.transformer.tokenizer import Tokenizer
+from app.transformer.transformer import GPT, Config
+
+HOST = "127.0.0.1"
+
+
+async def post(port, payload):
+    """Streams one generation; returns (status, time to first token, latency, tokens)."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(HOST, port)
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(f"POST /generate HTTP/1.1\r\nHost: {HOST}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    await reader.readuntil(b"\r\n\r\n")
+    first, tokens = None, 0
+    if status == 200:
+        while size := int(await reader.readline(), 16):
+            line = json.loads(await reader.readexactly(size))
+            await reader.readexactly(2)
+            if first is None:
+                first = time.perf_counter() - start
+            if not line.get("done"):
+                tokens += 1
+    writer.close()
+    return status, first, time.perf_counter() - start, tokens
+
+
+async def get(port, path):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {HOST}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return json.loads(data.split(b"\r\n\r\n", 1)[1])
+
+
+async def load(model, tokenizer, args, max_batch):
+    ready = asyncio.Event()
+    server = asyncio.create_task(serve(model, tokenizer, HOST, args.port, max_batch, args.max_wait_ms,
+                                       args.requests, ready=ready))
+    await ready.wait()
+    limit = asyncio.Semaphore(args.concurrency)
+    prompts = [f"Volcano number {i} erupted in" for i in range(args.requests)]
+
+    async def client(prompt):
+        async with limit:
+            return await post(args.port, {"prompt": prompt, "max_new_tokens": args.tokens, "temperature": 0.8,
+                                          "top_k": 40, "seed": 0})
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*map(client, prompts))
+    elapsed = time.perf_counter() - start
+    metrics = await get(args.port, "/metrics")
+    server.cancel()
+    try:
+        await server
+    except asyncio.CancelledError:
+        pass
+    return results, elapsed, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the batching inference server.")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--tokens", type=int, default=64, help="new tokens per request")
+    parser.add_argument("--n-layer", type=int, default=4)
+    parser.add_argument("--n-embd", type=int, default=256)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    tokenizer = Tokenizer()
+    # No end-of-text stopping: the model is random, so every request runs to --tokens.
+    config = Config(vocab_size=tokenizer.eot_id, block_size=128 + args.tokens, n_layer=args.n_layer, n_head=4,
+                    n_embd=args.n_embd)
+    model = GPT(config)
+
+    print(f"{args.requests} requests x {args.tokens} tokens, {args.concurrency} concurrent clients")
+    print(f"{'max batch':>9} {'ttft p50':>9} {'ttft p99':>9} {'lat p50':>9} {'lat p99':>9} {'tokens/s':>9} "
+          f"{'mean batch':>10}")
+    for max_batch in sorted({1, args.max_batch}):
+        results, elapsed, metrics = asyncio.run(load(model, tokenizer, args, max_batch))
+        ok = [r for r in results if r[0] == 200]
+        ttft = np.array([r[1] for r in ok]) * 1000
+        latency = np.array([r[2] for r in ok]) * 1000
+        tokens = sum(r[3] for r in ok)
+        print(f"{max_batch:>9} {np.percentile(ttft, 50):7.1f}ms {np.percentile(ttft, 99):7.1f}ms "
+              f"{np.percentile(latency, 50):7.1f}ms {np.percentile(latency, 99):7.1f}ms {tokens / elapsed:9.1f} "
+              f"{metrics['mean_batch']:>10}")
+        if len(ok) < len(results):
+            print(f"  {len(results) - len(ok)} requests rejected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Offline benchmark suite with machine-readable results.
+
+Every case runs on the checked-in fixtures or on seeded random inputs, so no
+network or prepared data is needed. `run` times each case (a warm-up call,
+then --repeat timed calls) and writes JSON; `compare` checks a result file
+against a stored baseline and exits with status 1 if any case got slower by
+more than --threshold.
+
+    python -m benchmarks.suite list
+    python -m benchmarks.suite run [--output benchmarks/results/current.json] [--filter model] [--quick] [--parser lxml]
+    python -m benchmarks.suite compare BASELINE CURRENT [--threshold 0.1] [--stat min]
+
+To keep a baseline, run the suite on the reference commit and keep the JSON,
+e.g. as benchmarks/results/baseline.json. Results are only comparable when
+they come from the same machine.
+"""
+import os
+import sys
+import json
+import time
+import fnmatch
+import platform
+import argparse
+import subprocess
+import statistics
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+BENCHMARKS = {}
+
+
+def benchmark(name, unit, repeat=5):
+    """
+    Registers a case. The decorated function takes `quick` and returns
+    (run, units): run() is one timed call and units is the work it does
+    (pages, tokens, steps...), from which the rate is derived.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, unit, repeat)
+        return setup
+    return register
+
+
+def _gvp_pages():
+    from benchmarks.bench_parse import load_fixtures
+    return load_fixtures()
+
+
+def _fixture_text():
+    """
+    GVP prose from the fixtures: each record's fact sheet plus the text of
+    every saved page, parsed with the scraper's tree builder (run --parser).
+    """
+    from bs4 import BeautifulSoup
+    from app.corpus.text import record_text
+    from app.scraper import scraper
+    texts = []
+    for volcano, html, history_html in _gvp_pages():
+        texts.append(record_text(scraper.get_gvp_data(volcano, html, history_html)))
+        for page in (html, history_html):
+            texts.append(BeautifulSoup(page, scraper.HTML_PARSER).get_text(" ", strip=True))
+    return texts
+
+
+@benchmark("parse.get_gvp_data", "pages", repeat=10)
+def bench_get_gvp_data(quick):
+    from app.scraper import scraper
+    pages = _gvp_pages()
+    return lambda: [scraper.get_gvp_data(*page) for page in pages], 2 * len(pages)
+
+
+@benchmark("parse.parse_eruption_history", "pages", repeat=10)
+def bench_parse_eruption_history(quick):
+    from app.scraper import scraper
+    pages = _gvp_pages()
+
+    def run():
+        for volcano, _, history_html in pages:
+            scraper.parse_eruption_history(volcano, scraper.init_data(), history_html)
+    return run, len(pages)
+
+
+@benchmark("tokenizer.train", "merges", repeat=3)
+def bench_tokenizer_train(quick):
+    from app.transformer.tokenizer import train
+    texts = _fixture_text()
+    vocab_size = 600 if quick else 2000
+    # Training stops early once no pair is frequent enough, so count the merges it actually makes.
+    merges = len(train(texts, vocab_size).merges)
+    return lambda: train(texts, vocab_size), merges
+
+
+@benchmark("tokenizer.encode_cold", "chars")
+def bench_tokenizer_encode_cold(quick):
+    from app.transformer.tokenizer import Tokenizer, train
+    texts = _fixture_text()
+    merges = train(texts, 600 if quick else 2000).merges
+    # A fresh tokenizer per call, so every word goes through the BPE merge loop.
+    return lambda: Tokenizer(merges).encode_many(texts), sum(map(len, texts))
+
+
+@benchmark("tokenizer.encode_warm", "chars")
+def bench_tokenizer_encode_warm(quick):
+    from app.transformer.tokenizer import train
+    texts = _fixture_text()
+    tokenizer = train(texts, 600 if quick else 2000)
+    return lambda: [tokenizer.encode(text) for text in texts], sum(map(len, texts))
+
+
+def _attention_case(seq_len, attn_block):
+    def setup(quick):
+        from app.transformer.transformer import MultiHeadAttention
+        from benchmarks.bench_attention import attention_params
+        B, C, H = (2 if quick else 4), 256, 4
+        params, grads = attention_params(C)
+        attn = MultiHeadAttention(params, grads, "attn", H, attn_block)
+        rng = np.random.default_rng(0)
+        x = rng.standard_normal((B, seq_len, C)).astype(np.float32)
+        dout = rng.standard_normal((B, seq_len, C)).astype(np.float32)
+
+        def run():
+            attn.forward(x)
+            attn.backward(dout)
+        return run, B * seq_len
+    return setup
+
+
+def _model_case(n_layer, n_embd, seq_len, batch_size):
+    def setup(quick):
+        from app.transformer.transformer import GPT, Config
+        config = Config(vocab_size=4096, block_size=seq_len, n_layer=n_layer, n_head=4, n_embd=n_embd,
+                        attn_block=64)
+        model = GPT(config)
+        rng = np.random.default_rng(0)
+        B = max(1, batch_size // 2) if quick else batch_size
+        x = rng.integers(0, config.vocab_size, (B, seq_len))
+        y = rng.integers(0, config.vocab_size, (B, seq_len))
+
+        def run():
+            model.zero_grad()
+            model.loss(x, y)
+            model.backward()
+        return run, B * seq_len
+    return setup
+
+
+for _seq_len in (128, 512, 1024):
+    for _mode, _block in (("full", None), ("blockwise", 64)):
+        benchmark(f"attention.{_mode}.T{_seq_len}", "tokens")(_attention_case(_seq_len, _block))
+benchmark("model.step.small", "tokens")(_model_case(2, 128, 128, 8))
+benchmark("model.step.base", "tokens", repeat=3)(_model_case(4, 256, 256, 8))
+
+
+@benchmark("generate.decode", "tokens", repeat=3)
+def bench_generate(quick):
+    from app.transformer.generate import KVCache, decode, prefill
+    from app.transformer.transformer import GPT, Config
+    slots, tokens = 4, (32 if quick else 128)
+    config = Config(vocab_size=4096, block_size=16 + tokens + 1, n_layer=4, n_head=4, n_embd=256)
+    model = GPT(config)
+    cache = KVCache(config, slots)
+    prompts = [list(range(1, 17))] * slots
+
+    def run():
+        logits = prefill(model, cache, range(slots), prompts)
+        for _ in range(tokens):
+            logits = decode(model, cache, logits.argmax(axis=-1))
+    return run, slots * tokens
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__), timeout=10).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_case(name, quick, repeat=None):
+    setup, unit, default_repeat = BENCHMARKS[name]
+    run, units = setup(quick)
+    run()
+    times = []
+    for _ in range(repeat or default_repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        "min": min(times),
+        "median": median,
+        "repeat": len(times),
+        "unit": unit,
+        "rate": units / median,
+    }
+
+
+def select(patterns):
+    if not patterns:
+        return list(BENCHMARKS)
+    return [name for name in BENCHMARKS if any(fnmatch.fnmatch(name, f"*{p}*") for p in patterns)]
+
+
+def compare(baseline, current, threshold, stat="min"):
+    """Rows of (name, baseline seconds, current seconds, ratio, status) for the cases in both files."""
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            rows.append((name, None, result[stat], None, "new"))
+            continue
+        ratio = result[stat] / base[stat]
+        if ratio > 1 + threshold:
+            status = "REGRESSION"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, base[stat], result[stat], ratio, status))
+    for name in baseline["results"].keys() - current["results"].keys():
+        rows.append((name, baseline["results"][name][stat], None, None, "missing"))
+    return rows
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:10.2f}" if seconds is not None else f"{'-':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite or compare two result files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="list the benchmark cases")
+    run_parser = sub.add_parser("run", help="run the suite and write JSON results")
+    run_parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "current.json"))
+    run_parser.add_argument("--filter", action="append", help="only cases whose name contains this (repeatable)")
+    run_parser.add_argument("--repeat", type=int, default=None, help="timed calls per case (default: per case)")
+    run_parser.add_argument("--quick", action="store_true", help="smaller inputs, for a fast smoke run")
+    run_parser.add_argument("--parser", default=None,
+                            help="BeautifulSoup tree builder for the parse and tokenizer cases, e.g. lxml "
+                                 "(default: the scraper's, html.parser unless VOLCANOZ_HTML_PARSER is set)")
+    compare_parser = sub.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown (0.10 = 10%%)")
+    compare_parser.add_argument("--stat", choices=("min", "median"), default="min")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, (_, unit, repeat) in BENCHMARKS.items():
+            print(f"{name:32} {unit:8} x{repeat}")
+        return
+
+    if args.command == "run":
+        names = select(args.filter)
+        if not names:
+            raise SystemExit("no benchmark matches the filter")
+        from app.scraper import scraper
+        if args.parser:
+            scraper.HTML_PARSER = args.parser
+        results = {}
+        for name in names:
+            result = results[name] = run_case(name, args.quick, args.repeat)
+            print(f"{name:32} {_ms(result['min'])} ms min {_ms(result['median'])} ms median "
+                  f"{result['rate']:12.1f} {result['unit']}/s", flush=True)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "quick": args.quick, "parser": scraper.HTML_PARSER,
+                       "results": results}, f, indent=2)
+        print(f"Wrote {len(results)} results to {args.output}")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get("quick") != current.get("quick"):
+        print("warning: comparing a --quick run with a full run")
+    if baseline.get("parser") != current.get("parser"):
+        print(f"warning: the runs parsed HTML with different tree builders "
+              f"({baseline.get('parser')} and {current.get('parser')})")
+    print(f"{'benchmark':32} {'baseline':>10} {'current':>10} {'change':>8}  ({args.stat} ms)")
+    rows = compare(baseline, current, args.threshold, args.stat)
+    for name, base, cur, ratio, status in rows:
+        change = f"{ratio - 1:+8.1%}" if ratio is not None else f"{'':>8}"
+        print(f"{name:32} {_ms(base)} {_ms(cur)} {change}  {status}")
+    regressions = [row[0] for row in rows if row[4] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,102 @@
-def main():
-    print("Hello from volcanoz!")
+"""
+volcanoz: one command line for the whole pipeline.
+
+    volcanoz COMMAND [ARGS...]            (installed by `uv sync` or `pip install -e .`)
+    python main.py COMMAND [ARGS...]
+    volcanoz COMMAND --help
+
+Each command is the main() of one module, imported only when that command
+runs, so `--help` and `status` load nothing beyond the standard library and
+start in a few milliseconds on top of the interpreter itself. `status` is
+meant for cron jobs and container health checks.
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import importlib
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# command -> (module with a main(), arguments put before the user's, help)
+COMMANDS = {
+    "scrape": ("app.scraper.scraper", (), "scrape GVP and Wikipedia into the dataset in one pass"),
+    "fetch": ("app.scraper.pipeline", ("fetch",), "download raw GVP and Wikipedia pages into the page archive"),
+    "parse": ("app.scraper.pipeline", ("parse",), "parse the page archive into the dataset (offline)"),
+    "archive": ("app.scraper.archive", (), "inspect or maintain the page archive"),
+    "validate": ("app.dataset.validator", (), "check the dataset against volcano.schema.json"),
+    "index": ("app.dataset.index", (), "build or query the spatial and name index"),
+    "eruptions": ("app.dataset.eruptions", (), "build or query the columnar eruption store"),
+    "tokenizer": ("app.transformer.tokenizer", (), "train or try out the BPE tokenizer"),
+    "dedup": ("app.corpus.dedup", (), "report near-duplicate documents and paragraphs"),
+    "build-corpus": ("app.corpus.build", (), "tokenize the dataset into train/val shards"),
+    "data": ("app.transformer.data", (), "inspect token shards and time the batch sampler"),
+    "train": ("app.train", (), "train the model, resuming from the latest checkpoint"),
+    "generate": ("app.transformer.generate", (), "continue prompts with the latest checkpoint"),
+    "serve": ("app.transformer.serve", (), "serve the latest checkpoint over HTTP with dynamic batching"),
+    "bench": ("benchmarks.suite", (), "run the benchmark suite or compare results"),
+}
+
+# name -> glob (relative to the repository) of the files that make up that pipeline output
+ARTIFACTS = {
+    "dataset": "app/dataset/volcanoes.json",
+    "archive": os.environ.get("VOLCANOZ_ARCHIVE", "app/dataset/pages.arc.gz"),
+    "tokenizer": "data/tokenizer.bpe",
+    "shards": "data/*.tok",
+    "checkpoint": "models/step-*[0-9]",
+}
+
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def status(argv):
+    parser = argparse.ArgumentParser(prog="volcanoz status",
+                                     description="Show which pipeline outputs exist, their size and age.")
+    parser.add_argument("--require", nargs="+", choices=ARTIFACTS, default=[], metavar="OUTPUT",
+                        help=f"exit with status 1 if any of these is missing ({', '.join(ARTIFACTS)})")
+    args = parser.parse_args(argv)
+
+    missing = []
+    now = time.time()
+    for name, pattern in ARTIFACTS.items():
+        paths = sorted(glob.glob(os.path.join(ROOT, pattern)))
+        if not paths:
+            missing.append(name)
+            print(f"{name:12} missing")
+            continue
+        newest = max(paths, key=os.path.getmtime)
+        age_h = (now - os.path.getmtime(newest)) / 3600
+        size_mb = sum(map(_size, paths)) / 1e6
+        print(f"{name:12} {len(paths):>4} file(s) {size_mb:>10.1f} MB   newest {os.path.relpath(newest, ROOT)} "
+              f"({age_h:.1f} h old)")
+    failed = [name for name in args.require if name in missing]
+    if failed:
+        print(f"missing required output(s): {', '.join(failed)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    epilog = "commands:\n" + "\n".join(f"  {name:14} {text}" for name, (_, _, text) in COMMANDS.items())
+    epilog += f"\n  {'status':14} show which pipeline outputs exist (for cron and health checks)"
+    parser = argparse.ArgumentParser(prog="volcanoz", description="Scrape, build, train and sample VolcanoZ.",
+                                     epilog=epilog, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=[*COMMANDS, "status"], metavar="COMMAND")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="arguments for the command (see COMMAND --help)")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        return status(args.args)
+    module_name, prefix, _ = COMMANDS[args.command]
+    # The command's own parser reads sys.argv; its usage line then reads "volcanoz <command> ...".
+    sys.argv = ["volcanoz" if prefix else f"volcanoz {args.command}", *prefix, *args.args]
+    return importlib.import_module(module_name).main()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Local stand-ins for the GVP site and the MediaWiki API.
+
+StubServer serves the saved GVP pages in benchmarks/fixtures/gvp, plus a
+Holocene volcano list built from its volcanoes.json, and answers api.php
+queries from an in-memory wiki of pages, redirects and disambiguation pages
+in the API's formatversion=2 JSON. Like the real API it handles at most
+MAX_TITLES titles per query (warning about the rest) and at most
+MAX_EXTRACTS extracts per response, continuing with `excontinue`. Every wiki
+query is logged in `wiki_queries`, and `max_in_flight` records the most GVP
+requests that were served at the same time. Set `wiki_fails` to a predicate
+on a logged query to answer matching queries with HTTP 500.
+"""
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+GVP_FIXTURES = os.path.join(os.path.dirname(__file__), "../benchmarks/fixtures/gvp")
+MAX_TITLES = 50
+MAX_EXTRACTS = 20
+
+
+class StubServer:
+    def __init__(self, fixtures=GVP_FIXTURES, pages=None, redirects=None, disambiguation=(), delay=0.0):
+        """
+        pages maps wiki titles to their wikitext, redirects maps titles to
+        their targets and disambiguation lists titles of disambiguation pages.
+        delay (seconds) is added to every GVP response.
+        """
+        self.fixtures = fixtures
+        self.pages = dict(pages or {})
+        self.redirects = dict(redirects or {})
+        self.disambiguation = set(disambiguation)
+        self.delay = delay
+        self.wiki_queries = []
+        self.wiki_fails = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def wiki_url(self):
+        return f"{self.url}/w/api.php"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def volcanoes(self):
+        with open(os.path.join(self.fixtures, "volcanoes.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _handle(self, request):
+        url = urlsplit(request.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path.endswith("api.php"):
+            body = self._wiki(query)
+            if body is None:
+                return self._send(request, 500, b"internal error", "text/plain")
+            return self._send(request, 200, json.dumps(body).encode("utf-8"), "application/json")
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            body = self._gvp(url.path, query)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if body is None:
+            return self._send(request, 404, b"not found", "text/plain")
+        self._send(request, 200, body, "text/html; charset=utf-8")
+
+    @staticmethod
+    def _send(request, status, body, content_type):
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _gvp(self, path, query):
+        if path.endswith("volcanolist_holocene.cfm"):
+            rows = "".join(f'<tr><td><a href="volcano.cfm?vn={v["gvp_id"]}">{v["name"]}</a></td><td></td></tr>'
+                           for v in self.volcanoes())
+            return (f'<html><body><div class="TableSearchResults"><table>'
+                    f'<tr><th>Volcano Name</th><th>Country</th></tr>{rows}</table></div></body></html>').encode("utf-8")
+        if path.endswith("volcano.cfm") and "vn" in query:
+            name = f"{query['vn']}_history.html" if query.get("tab") == "1" else f"{query['vn']}.html"
+            try:
+                with open(os.path.join(self.fixtures, os.path.basename(name)), "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+        return None
+
+    def _wiki(self, query):
+        titles = query.get("titles", "").split("|")
+        props = query.get("prop", "").split("|")
+        logged = {"titles": titles, "prop": props, "continue": query.get("excontinue")}
+        with self._lock:
+            self.wiki_queries.append(logged)
+        if self.wiki_fails and self.wiki_fails(logged):
+            return None
+        body = {"batchcomplete": True, "query": {}}
+        if len(titles) > MAX_TITLES:
+            body["warnings"] = {"main": {"warnings": f"Too many values supplied for parameter \"titles\". "
+                                                     f"The limit is {MAX_TITLES}."}}
+            titles = titles[:MAX_TITLES]
+
+        normalized, redirects, targets = [], [], []
+        for title in titles:
+            target = title[:1].upper() + title[1:]
+            if target != title:
+                normalized.append({"from": title, "to": target})
+            if "redirects" in query and target in self.redirects:
+                redirects.append({"from": target, "to": self.redirects[target]})
+                target = self.redirects[target]
+            if target not in targets:
+                targets.append(target)
+
+        start = int(query.get("excontinue", 0))
+        pages = []
+        for i, title in enumerate(targets):
+            if title not in self.pages:
+                pages.append({"ns": 0, "title": title, "missing": True})
+                continue
+            page = {"pageid": 1000 + i, "ns": 0, "title": title}
+            if "pageprops" in props and title in self.disambiguation:
+                page["pageprops"] = {"disambiguation": ""}
+            if "extracts" in props and start <= i < start + MAX_EXTRACTS:
+                page["extract"] = f"{title} is a volcano."
+            if "revisions" in props and not start:
+                page["revisions"] = [{"slots": {"main": {"contentmodel": "wikitext", "content": self.pages[title]}}}]
+            pages.append(page)
+        if "extracts" in props and start + MAX_EXTRACTS < len(targets):
+            body["continue"] = {"excontinue": start + MAX_EXTRACTS, "continue": "||revisions"}
+            del body["batchcomplete"]
+        body["query"] = {"normalized": normalized, "redirects": redirects, "pages": pages}
+        return body
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.scraper.archive import ArchiveReader, ArchiveWriter, rebuild_index
+
+
+class ArchiveCrashTest(unittest.TestCase):
+    """Reopening an archive after a crash in the middle of add()."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, "pages.arc.gz")
+        with ArchiveWriter(self.path) as writer:
+            for i in range(3):
+                writer.add(f"page/{i}", f"body {i}" * 100)
+
+    def read_all(self):
+        with ArchiveReader(self.path) as reader:
+            return {key: reader.get_text(key) for key in reader.keys()}
+
+    def test_torn_index_line_is_dropped(self):
+        # The last member is complete but its index line was cut short.
+        with open(self.path + ".idx", "rb+") as f:
+            f.truncate(f.seek(0, os.SEEK_END) - 20)
+        with ArchiveWriter(self.path) as writer:
+            self.assertEqual(writer.keys, {"page/0", "page/1"})
+            writer.add("page/3", "body 3")
+
+        self.assertEqual(self.read_all(), {"page/0": "body 0" * 100, "page/1": "body 1" * 100, "page/3": "body 3"})
+        # The unindexed member was cut off too, so the data and the index still agree.
+        self.assertEqual(rebuild_index(self.path), 3)
+        self.assertEqual(set(self.read_all()), {"page/0", "page/1", "page/3"})
+
+    def test_torn_member_is_dropped(self):
+        # The crash hit while the member itself was being written.
+        with open(self.path, "ab") as f:
+            f.write(b"\x1f\x8b\x08\x00partial")
+        with ArchiveWriter(self.path) as writer:
+            writer.add("page/3", "body 3")
+
+        self.assertEqual(self.read_all()["page/3"], "body 3")
+        self.assertEqual(rebuild_index(self.path), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
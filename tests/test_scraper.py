@@ -0,0 +1,117 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from contextlib import redirect_stdout
+from unittest import mock
+
+from app.scraper import pipeline, scraper
+from app.scraper.archive import ArchiveReader, page_key
+from app.scraper.session import CachedSession
+from app.scraper.throttle import HostRateLimiter
+from app.scraper.wiki import WikiClient
+from tests.stub import StubServer
+
+INFOBOX = "{{Infobox mountain\n| name = %s\n| elevation_m = {{convert|%d|m}} %s m\n" \
+          "| coordinates = 37.751°N 14.993°E\n| last_eruption = 2023\n}}\n'''%s''' is a volcano."
+
+
+def wiki_page(title, elevation):
+    return INFOBOX % (title, elevation, f"{elevation:,}", title)
+
+
+class ScrapeAllTest(unittest.TestCase):
+    """scrape_all against the stub server, sequentially and on a thread pool."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = StubServer(
+            pages={"Mount Etna": wiki_page("Mount Etna", 3357), "Mount Vesuvius": wiki_page("Mount Vesuvius", 1281),
+                   "Chimborazo": "", "Chimborazo (volcano)": wiki_page("Chimborazo", 6263)},
+            redirects={"Etna": "Mount Etna"},
+            disambiguation={"Chimborazo"},
+            delay=0.02,
+        ).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+
+    def stubbed(self, workers):
+        """Points the scraper's URLs, output files and HTTP clients at the stub and a temp directory."""
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        limiter = HostRateLimiter(default_rate=1000.0, burst=workers)
+        session = CachedSession(os.path.join(self.tmp, "http_cache"), rate_limiter=limiter, pool_size=workers,
+                                max_retries=0)
+        wiki = WikiClient(session, api_url=self.stub.wiki_url,
+                          cache_file=os.path.join(self.tmp, "wiki_titles.json"))
+        self.stub.max_in_flight = 0
+        return mock.patch.multiple(scraper, GVP_BASE=self.stub.url,
+                                   OUTPUT_FILE=os.path.join(self.tmp, "volcanoes.json"),
+                                   RECORDS_FILE=os.path.join(self.tmp, "volcanoes.jsonl"),
+                                   FAILED_FILE=os.path.join(self.tmp, "volcanoes.failed.jsonl"),
+                                   rate_limiter=lambda: limiter, session=lambda: session, wiki=lambda: wiki)
+
+    def scrape(self, workers):
+        with self.stubbed(workers), redirect_stdout(io.StringIO()):
+            scraper.scrape_all(workers=workers)
+        with open(os.path.join(self.tmp, "volcanoes.json"), encoding="utf-8") as f:
+            records = json.load(f)
+        for record in records:
+            scraped_at = record.pop("scraped_at")
+            self.assertTrue(scraped_at.endswith("Z") and "+" not in scraped_at, scraped_at)
+            datetime.fromisoformat(scraped_at)
+        return records
+
+    def test_concurrent_output_matches_sequential(self):
+        sequential = self.scrape(workers=1)
+        self.assertEqual(self.stub.max_in_flight, 1)
+        concurrent = self.scrape(workers=4)
+        self.assertGreater(self.stub.max_in_flight, 1)
+
+        self.assertEqual([r["id"] for r in sequential], [v["gvp_id"] for v in self.stub.volcanoes()])
+        self.assertEqual(concurrent, sequential)
+
+    def test_records_merge_gvp_and_wikipedia(self):
+        records = {r["name"]: r for r in self.scrape(workers=4)}
+        self.assertEqual(records["Etna"]["elevation_m"], 3357)
+        self.assertEqual(records["Etna"]["summary"], "Mount Etna is a volcano.")
+        self.assertEqual(records["Chimborazo"]["elevation_m"], 6263)
+        # No Wikipedia page: the GVP summary and elevation are kept.
+        self.assertTrue(records["Eyjafjallajokull"]["summary"])
+        self.assertEqual(records["Eyjafjallajokull"]["status"], "unknown")
+        self.assertTrue(records["Etna"]["eruption_history"])
+
+    def test_failed_wikipedia_prefetch_falls_back_to_lookups(self):
+        expected = self.scrape(workers=2)
+        # Batched queries fail; the per-volcano lookups page() falls back to still work.
+        self.stub.wiki_fails = lambda q: len(q["titles"]) > 1
+        try:
+            records = self.scrape(workers=2)
+        finally:
+            self.stub.wiki_fails = None
+        self.assertEqual(records, expected)
+
+    def test_fetch_archives_wikipedia_provenance(self):
+        stubbed = self.stubbed(workers=2)
+        archive = os.path.join(self.tmp, "pages.arc.gz")
+        with stubbed, redirect_stdout(io.StringIO()):
+            pipeline.fetch_stage(workers=2, archive=archive)
+            wiki = scraper.wiki()
+        with ArchiveReader(archive) as reader:
+            etna = reader.meta(page_key("211060", "wiki"))
+            self.assertEqual((etna["url"], etna["status"]), (wiki.content_url("Mount Etna"), None))
+            meta = reader.get_json(page_key("211060", "meta"))
+            self.assertEqual(meta["pages"]["wiki"], {"url": etna["url"], "status": None,
+                                                     "fetched_at": etna["fetched_at"]})
+            # No page for this name, so nothing was downloaded for it.
+            missing = reader.meta(page_key("372020", "wiki"))
+            self.assertEqual((missing["url"], missing["status"]), (self.stub.wiki_url, None))
+            self.assertEqual(reader.meta(page_key("211060", "page"))["status"], 200)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from app.scraper import wiki
+from app.scraper.session import CachedSession
+from app.scraper.wiki import CONTENT_BATCH, RESOLVE_BATCH, WikiClient
+from tests.stub import MAX_TITLES, StubServer
+
+
+class WikiClientTest(unittest.TestCase):
+    """WikiClient against the stub MediaWiki API."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.stub = StubServer(
+            pages={"Mount Etna": "{{Infobox mountain}}", "Chimborazo": "", "Chimborazo (volcano)": "volcano",
+                   **{f"Volcano {i}": f"text {i}" for i in range(120)}},
+            redirects={"Etna": "Mount Etna"},
+            disambiguation={"Chimborazo"},
+        ).start()
+        self.addCleanup(self.stub.stop)
+        self.cache_file = os.path.join(self.tmp, "wiki_titles.json")
+
+    def client(self):
+        # No retries: the stub's 500s are deliberate and retrying them only sleeps.
+        session = CachedSession(os.path.join(self.tmp, "http_cache"), max_retries=0)
+        return WikiClient(session, api_url=self.stub.wiki_url, cache_file=self.cache_file)
+
+    def queries(self, prop):
+        return [q for q in self.stub.wiki_queries if prop in q["prop"]]
+
+    def test_resolve_batches_titles(self):
+        names = [f"Volcano {i}" for i in range(120)]
+        resolved = self.client().resolve(names)
+        self.assertEqual(resolved, {name: name for name in names})
+        sizes = [len(q["titles"]) for q in self.queries("pageprops")]
+        self.assertEqual(sizes, [RESOLVE_BATCH, RESOLVE_BATCH, 20])
+        self.assertLessEqual(max(sizes), MAX_TITLES)
+
+    def test_resolve_follows_redirects_and_skips_disambiguation(self):
+        resolved = self.client().resolve(["Etna", "etna", "Chimborazo"])
+        self.assertEqual(resolved, {"Etna": "Mount Etna", "etna": "Mount Etna", "Chimborazo": "Chimborazo (volcano)"})
+
+    def test_negative_result_is_persisted(self):
+        client = self.client()
+        self.assertIsNone(client.resolve(["Eyjafjallajokull"])["Eyjafjallajokull"])
+        # Every candidate title was tried, in one query each.
+        self.assertEqual([q["titles"] for q in self.queries("pageprops")],
+                         [["Eyjafjallajokull"], ["Eyjafjallajokull (volcano)"], ["Mount Eyjafjallajokull"]])
+        client.save()
+
+        self.stub.wiki_queries.clear()
+        client = self.client()
+        self.assertIsNone(client.resolve(["Eyjafjallajokull"])["Eyjafjallajokull"])
+        self.assertFalse(client.page("Eyjafjallajokull")["exists"])
+        self.assertEqual(self.stub.wiki_queries, [])
+
+    def test_prefetch_chunks_content_requests(self):
+        names = [f"Volcano {i}" for i in range(45)] + ["Etna"]
+        client = self.client()
+        client.prefetch(names)
+        sizes = [len(q["titles"]) for q in self.queries("extracts")]
+        self.assertEqual(sizes, [CONTENT_BATCH, CONTENT_BATCH, 6])
+
+        self.stub.wiki_queries.clear()
+        page = client.page("Etna")
+        self.assertEqual(page, {"title": "Mount Etna", "exists": True, "text": "{{Infobox mountain}}",
+                                "summary": "Mount Etna is a volcano."})
+        self.assertEqual(client.page("Volcano 44")["summary"], "Volcano 44 is a volcano.")
+        self.assertEqual(self.stub.wiki_queries, [])
+
+    def test_content_query_follows_continue(self):
+        names = [f"Volcano {i}" for i in range(45)]
+        with mock.patch.object(wiki, "CONTENT_BATCH", 50):
+            client = self.client()
+            client.prefetch(names)
+        self.assertEqual([q["continue"] for q in self.queries("extracts")], [None, "20", "40"])
+        for i in range(45):
+            page = client.page(f"Volcano {i}")
+            self.assertEqual((page["text"], page["summary"]), (f"text {i}", f"Volcano {i} is a volcano."))
+
+    def test_failed_resolve_batch_is_not_cached(self):
+        names = [f"Volcano {i}" for i in range(120)]
+        self.stub.wiki_fails = lambda q: "pageprops" in q["prop"] and "Volcano 60" in q["titles"]
+        client = self.client()
+        client.prefetch(names)
+        self.assertEqual(client.failed_batches, 1)
+        # The batch holding names 50-99 failed: neither resolved nor remembered as missing.
+        self.assertEqual(sorted(client.titles), sorted(names[:50] + names[100:]))
+        self.assertEqual(len(client.pages), 70)
+        fetched = {t for q in self.queries("extracts") for t in q["titles"]}
+        self.assertNotIn("Volcano 60 (volcano)", {t for q in self.stub.wiki_queries for t in q["titles"]})
+        self.assertNotIn("Volcano 60", fetched)
+
+        self.stub.wiki_fails = None
+        self.assertEqual(self.client().resolve(["Volcano 60"]), {"Volcano 60": "Volcano 60"})
+        self.assertEqual(client.page("Volcano 60")["text"], "text 60")
+
+    def test_failed_content_batch_is_fetched_again(self):
+        names = [f"Volcano {i}" for i in range(45)]
+        self.stub.wiki_fails = lambda q: "extracts" in q["prop"] and "Volcano 5" in q["titles"]
+        client = self.client()
+        client.prefetch(names)
+        self.assertEqual(client.failed_batches, 1)
+        self.assertEqual(sorted(client.pages), sorted(names[20:]))
+
+        self.stub.wiki_fails = None
+        self.stub.wiki_queries.clear()
+        self.assertEqual(client.page("Volcano 5"), {"title": "Volcano 5", "exists": True, "text": "text 5",
+                                                    "summary": "Volcano 5 is a volcano."})
+        self.assertEqual([q["titles"] for q in self.stub.wiki_queries], [["Volcano 5"]])
+
+    def test_source_reports_where_a_page_came_from(self):
+        client = self.client()
+        client.prefetch(["Etna"])
+        self.assertEqual(client.source("Etna"), (client.content_url("Mount Etna"), None))
+        client.page("Chimborazo")
+        self.assertEqual(client.source("Chimborazo"), (client.content_url("Chimborazo (volcano)"), 200))
+        client.page("Eyjafjallajokull")
+        self.assertEqual(client.source("Eyjafjallajokull"), (self.stub.wiki_url, None))
+        # The recorded URL is the query page() sent, and fetching it again returns the page.
+        body = client.session.get(client.content_url("Mount Etna")).text
+        self.assertIn("{{Infobox mountain}}", body)
+
+
+if __name__ == "__main__":
+    unittest.main()